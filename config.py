@@ -4,6 +4,7 @@ class BaseConfig(object):
     ARCHITECTURES_DIRECTORY = "architectures"
     DATASET_DIRECTORY = "dataset"
     CHARSET_DIRECTORY = "charset"
+    CHARSET_FILE = "charsets/chars.txt"
     ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
     ALLOWED_LABELS_FILE_EXTENSIONS = {'txt', 'csv'}
     ALLOWED_ZIP_EXTENSIONS = {'gz', 'rar', 'zip'}
@@ -13,6 +14,19 @@ class BaseConfig(object):
     MODEL_ZIP_FILENAME = "model_files.gz"
     SERVING_MODEL_CONFIG_FILENAME = "serving_model_config.json"
     IMAGE_CONFIG_FILENAME = "image_config.json"
+    DATASET_CACHE_MAX_SIZE = 50 * 1024 ** 3
+    DATASET_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+    NUM_PREPROCESSING_WORKERS = None
+    PREPROCESSING_CHUNK_SIZE = 256
+    TFRECORD_EXAMPLES_PER_SHARD = 10000
+    KEEP_DATASET_ARCHIVES = True
+    DATASET_SPLIT_SEED = 0
+    APPENDED_LABELS_FILENAME = "appended_labels.txt"
+    SYNTHETIC_CORPUS_DIRECTORY = "synthetic/corpora"
+    SYNTHETIC_FONTS_DIRECTORY = "synthetic/fonts"
+    NUM_SYNTHETIC_WORKERS = None
+    DECODER_LEXICON_DIRECTORY = "lexicons"
+    PREFLIGHT_VALIDATION = True
 
 
 class DevelopmentConfig(BaseConfig):
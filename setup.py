@@ -8,6 +8,7 @@ setup(
         'flask',
         'tensorflow',
         'cv2',
+        'Pillow',
         'numpy',
         'werkzeug',
         'six',
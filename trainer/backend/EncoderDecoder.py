@@ -1,20 +1,42 @@
+import numpy as np
+
+
 class EncoderDecoder:
     def __init__(self):
         self.charset = ""
         self.eos_token = '`'
         self.encode_map = {}
         self.decode_map = {}
+        self.lookup_table = np.full(1, -1, dtype=np.int32)
 
     def initialize_encode_and_decode_maps_from(self, charset_string):
         for index, char in enumerate(list(charset_string)):
             self._add_to_encode_decode_maps(char, index)
+        self._build_lookup_table()
 
     def _add_to_encode_decode_maps(self, char, index):
         self.encode_map[char] = index
         self.decode_map[index] = char
 
+    def _build_lookup_table(self):
+        max_codepoint = max([ord(char) for char in self.encode_map] + [0])
+        self.lookup_table = np.full(max_codepoint + 2, -1, dtype=np.int32)
+        for char, index in self.encode_map.items():
+            self.lookup_table[ord(char)] = index
+
     def encode(self, string_to_encode):
         return [self.encode_map[c] for c in list(string_to_encode)]
 
+    def encode_ragged(self, strings_to_encode):
+        lengths = np.fromiter((len(s) for s in strings_to_encode), dtype=np.int32,
+                              count=len(strings_to_encode))
+        codepoints = np.frombuffer(''.join(strings_to_encode).encode('utf-32-le'), dtype=np.uint32)
+        codepoints = np.minimum(codepoints, len(self.lookup_table) - 1)
+        encoded = self.lookup_table[codepoints]
+        unknown = np.flatnonzero(encoded < 0)
+        if unknown.size:
+            raise KeyError(''.join(strings_to_encode)[unknown[0]])
+        return encoded.astype(np.int32), lengths
+
     def decode(self, encoded_string_to_decode):
         return ''.join([self.decode_map[i] for i in encoded_string_to_decode])
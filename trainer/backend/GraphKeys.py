@@ -9,6 +9,10 @@ class LayerTypes(Enum):
     L2_NORMALIZE = "l2_normalize"
     BATCH_NORM = "batch_norm"
     DROPOUT = "dropout"
+    SEPARABLE_CONV2D = "separable_conv2d"
+    BOTTLENECK_BLOCK = "bottleneck_block"
+    STRIDED_CONV2D = "strided_conv2d"
+    TEMPORAL_CONV = "temporal_conv"
 
 class PaddingTypes(Enum):
     SAME = "same"
@@ -18,6 +22,11 @@ class CellTypes(Enum):
     LSTM = "LSTM"
     GRU = "GRU"
     GLSTM = "GLSTM"
+    LSTM_BLOCK_FUSED = "LSTMBlockFused"
+
+class MDRNNImplementations(Enum):
+    SEQUENTIAL = "sequential"
+    BATCHED = "batched"
 
 class ActivationFunctions(Enum):
     TANH = "tanh"
@@ -39,3 +48,26 @@ class Losses(Enum):
 
 class OutputLayers(Enum):
     CTC_DECODER = "ctc_decoder"
+    CTC_GREEDY_DECODER = "ctc_greedy_decoder"
+    CTC_CONSTRAINED_DECODER = "ctc_constrained_decoder"
+
+class InputPipelines(Enum):
+    IN_MEMORY = "in_memory"
+    STREAMING = "streaming"
+    TFRECORD = "tfrecord"
+
+
+class BatchBuckets(Enum):
+    NONE = "none"
+    IMAGE_WIDTH = "image_width"
+    LABEL_LENGTH = "label_length"
+    LABEL_LENGTH_AND_IMAGE_WIDTH = "label_length_and_image_width"
+
+
+class Augmentations(Enum):
+    ELASTIC_DISTORTION = "elastic_distortion"
+    SCALE = "scale"
+    SHEAR = "shear"
+    STROKE_WIDTH = "stroke_width"
+    BLUR = "blur"
+    NOISE = "noise"
@@ -4,3 +4,5 @@ from trainer.backend.GraphKeys import PaddingTypes
 from trainer.backend.tf.util_ops import visualize
 from trainer.backend.tf.experiment_ops import create_serving_model
 from trainer.backend.tf.experiment_ops import create_optimized_graph
+from trainer.backend.tf import convert_to_tfrecords
+from trainer.backend.tf import append_to_tfrecords
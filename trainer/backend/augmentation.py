@@ -0,0 +1,101 @@
+import cv2
+import numpy as np
+
+from trainer.backend.GraphKeys import Augmentations
+
+DEFAULT_PARAMETERS = {
+    Augmentations.ELASTIC_DISTORTION.value: {'max_displacement': 0.05, 'smoothness': 0.08},
+    Augmentations.SCALE.value: {'min_scale': 0.85, 'max_scale': 1.1},
+    Augmentations.SHEAR.value: {'max_shear': 0.3},
+    Augmentations.STROKE_WIDTH.value: {'max_kernel_size': 3},
+    Augmentations.BLUR.value: {'min_sigma': 0.3, 'max_sigma': 1.2},
+    Augmentations.NOISE.value: {'max_stddev': 40.0}
+}
+
+
+def get_augmentation_params(probabilities, seed, parameters=None):
+    augmentation_parameters = {name: dict(values) for name, values in DEFAULT_PARAMETERS.items()}
+    for name, values in (parameters or {}).items():
+        augmentation_parameters[name].update(values)
+    return {
+        'seed': int(seed),
+        'probabilities': {name: float(probability) for name, probability in probabilities.items()
+                          if float(probability) > 0},
+        'parameters': {name: augmentation_parameters[name] for name in probabilities
+                       if float(probabilities[name]) > 0}
+    }
+
+
+def create_batch_augmenter(augmentation_params):
+    seed = augmentation_params['seed']
+    probabilities = augmentation_params['probabilities']
+    parameters = augmentation_params['parameters']
+
+    def _augment_batch(images, batch_index):
+        rng = np.random.RandomState((seed * 1000003 + int(batch_index)) % (2 ** 32))
+        augmented = np.empty_like(images)
+        for index, image in enumerate(images):
+            augmented[index, :, :, 0] = augment_image(image[:, :, 0], rng, probabilities, parameters)
+        return augmented
+
+    return _augment_batch
+
+
+def augment_image(image, rng, probabilities, parameters):
+    def _is_applied(name):
+        return name in probabilities and rng.uniform() < probabilities[name]
+
+    scale = 1.0
+    shear = 0.0
+    if _is_applied(Augmentations.SCALE.value):
+        scale_parameters = parameters[Augmentations.SCALE.value]
+        scale = rng.uniform(scale_parameters['min_scale'], scale_parameters['max_scale'])
+    if _is_applied(Augmentations.SHEAR.value):
+        max_shear = parameters[Augmentations.SHEAR.value]['max_shear']
+        shear = rng.uniform(-max_shear, max_shear)
+    if scale != 1.0 or shear != 0.0:
+        image = _scale_and_shear(image, scale, shear)
+    if _is_applied(Augmentations.ELASTIC_DISTORTION.value):
+        image = _elastic_distortion(image, rng, **parameters[Augmentations.ELASTIC_DISTORTION.value])
+    if _is_applied(Augmentations.STROKE_WIDTH.value):
+        image = _change_stroke_width(image, rng, **parameters[Augmentations.STROKE_WIDTH.value])
+    if _is_applied(Augmentations.BLUR.value):
+        blur_parameters = parameters[Augmentations.BLUR.value]
+        sigma = rng.uniform(blur_parameters['min_sigma'], blur_parameters['max_sigma'])
+        image = cv2.GaussianBlur(image, (0, 0), sigma)
+    if _is_applied(Augmentations.NOISE.value):
+        stddev = rng.uniform(0, parameters[Augmentations.NOISE.value]['max_stddev'])
+        image = np.clip(image + rng.normal(0, stddev, image.shape), 0, 255).astype(np.uint8)
+    return image
+
+
+def _scale_and_shear(image, scale, shear):
+    height, width = image.shape
+    center_x, center_y = width / 2.0, height / 2.0
+    matrix = np.array([[scale, shear * scale, 0],
+                       [0, scale, 0]], dtype=np.float32)
+    matrix[0, 2] = center_x - scale * center_x - shear * scale * center_y
+    matrix[1, 2] = center_y - scale * center_y
+    return cv2.warpAffine(image, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+
+def _elastic_distortion(image, rng, max_displacement, smoothness):
+    height, width = image.shape
+    size = min(height, width)
+    displacements = []
+    for _ in range(2):
+        field = cv2.GaussianBlur(rng.uniform(-1, 1, image.shape).astype(np.float32), (0, 0), smoothness * size)
+        field *= max_displacement * size / max(np.abs(field).max(), 1e-6)
+        displacements.append(field)
+    grid_x, grid_y = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+    return cv2.remap(image, grid_x + displacements[0], grid_y + displacements[1],
+                     interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+
+def _change_stroke_width(image, rng, max_kernel_size):
+    kernel_size = rng.randint(2, max_kernel_size + 1)
+    kernel = np.ones((kernel_size, kernel_size), dtype=np.uint8)
+    if rng.uniform() < 0.5:
+        return cv2.dilate(image, kernel)
+    return cv2.erode(image, kernel)
@@ -0,0 +1,231 @@
+import gzip
+import json
+import os
+import shutil
+import struct
+import tarfile
+import zipfile
+import zlib
+
+import numpy as np
+
+INDEX_DIRECTORY = ".archive_index"
+INDEX_INFO_FILENAME = "archive_info.json"
+ARCHIVE_BASENAME = "images"
+ZIP_FORMAT = "zip"
+TAR_FORMAT = "tar"
+
+_ZIP_LOCAL_HEADER = struct.Struct('<4sHHHHHLLLHH')
+_ZIP_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+_INDEX_ARRAYS = ('names', 'offsets', 'sizes', 'compress_types')
+_open_archives = {}
+
+
+class DatasetArchive(object):
+    def __init__(self, dataset_dir):
+        index_dir = os.path.join(dataset_dir, INDEX_DIRECTORY)
+        info = read_info(dataset_dir)
+        self.parts = [_ArchivePart(os.path.join(dataset_dir, part['archive_filename']),
+                                   os.path.join(index_dir, part['index_name']),
+                                   part['format'])
+                      for part in reversed(info['parts'])]
+
+    def __contains__(self, name):
+        return any(name in part for part in self.parts)
+
+    def __len__(self):
+        return sum(len(part) for part in self.parts)
+
+    def read(self, name):
+        for part in self.parts:
+            if name in part:
+                return part.read(name)
+        raise KeyError(name)
+
+    def close(self):
+        for part in self.parts:
+            part.close()
+
+
+class _ArchivePart(object):
+    def __init__(self, archive_path, index_dir, archive_format):
+        self.format = archive_format
+        self.archive_path = archive_path
+        self.names, self.offsets, self.sizes, self.compress_types = [
+            np.load(os.path.join(index_dir, array_name + '.npy'), mmap_mode='r')
+            for array_name in _INDEX_ARRAYS]
+        self._fd = os.open(archive_path, os.O_RDONLY)
+
+    def __contains__(self, name):
+        return self._find(name) is not None
+
+    def __len__(self):
+        return len(self.names)
+
+    def read(self, name):
+        index = self._find(name)
+        if index is None:
+            raise KeyError(name)
+        offset = int(self.offsets[index])
+        size = int(self.sizes[index])
+        if self.format == ZIP_FORMAT:
+            offset = self._get_zip_data_offset(offset)
+        data = _pread(self._fd, size, offset)
+        compress_type = int(self.compress_types[index])
+        if compress_type == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(data, -zlib.MAX_WBITS)
+        if compress_type != zipfile.ZIP_STORED:
+            raise ValueError("Unsupported compression method for " + name)
+        return data
+
+    def close(self):
+        os.close(self._fd)
+
+    def _find(self, name):
+        key = _normalize_name(name).encode('utf-8')
+        index = int(np.searchsorted(self.names, key))
+        if index < len(self.names) and self.names[index] == key:
+            return index
+        return None
+
+    def _get_zip_data_offset(self, header_offset):
+        header = _ZIP_LOCAL_HEADER.unpack(_pread(self._fd, _ZIP_LOCAL_HEADER.size, header_offset))
+        if header[0] != _ZIP_LOCAL_HEADER_SIGNATURE:
+            raise ValueError("Corrupt zip archive: " + self.archive_path)
+        name_length, extra_length = header[9], header[10]
+        return header_offset + _ZIP_LOCAL_HEADER.size + name_length + extra_length
+
+
+def _pread(fd, size, offset):
+    data = os.pread(fd, size, offset)
+    if len(data) != size:
+        raise IOError("Unexpected end of archive")
+    return data
+
+
+def _normalize_name(name):
+    name = name.replace('\\', '/')
+    while name.startswith('./'):
+        name = name[2:]
+    return name.lstrip('/')
+
+
+def has_member(archive_path, name):
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zip_file:
+            names = zip_file.namelist()
+    else:
+        try:
+            with tarfile.open(archive_path, 'r:*') as tar_file:
+                names = tar_file.getnames()
+        except tarfile.TarError:
+            return False
+    return _normalize_name(name) in set(_normalize_name(member) for member in names)
+
+
+def is_archived(dataset_dir):
+    return os.path.exists(_get_info_path(dataset_dir))
+
+
+def read_info(dataset_dir):
+    with open(_get_info_path(dataset_dir)) as f:
+        return json.load(f)
+
+
+def _get_info_path(dataset_dir):
+    return os.path.join(dataset_dir, INDEX_DIRECTORY, INDEX_INFO_FILENAME)
+
+
+def open_archive(dataset_dir):
+    key = (os.path.abspath(dataset_dir), os.getpid())
+    info_mtime = os.path.getmtime(_get_info_path(dataset_dir)) if is_archived(dataset_dir) else None
+    cached = _open_archives.get(key)
+    if cached is None or cached[0] != info_mtime:
+        if cached is not None and cached[1] is not None:
+            cached[1].close()
+        _open_archives[key] = (info_mtime, DatasetArchive(dataset_dir) if info_mtime is not None else None)
+    return _open_archives[key][1]
+
+
+def add(archive_path, dataset_dir, extract_members=None):
+    if extract_members is None:
+        extract_members = {'labels.txt': 'labels.txt'}
+    info = read_info(dataset_dir) if is_archived(dataset_dir) else {'parts': []}
+    part_name = _get_part_name(len(info['parts']))
+    if zipfile.is_zipfile(archive_path):
+        archive_format = ZIP_FORMAT
+        stored_path = os.path.join(dataset_dir, part_name + ".zip")
+        shutil.move(archive_path, stored_path)
+        entries = _index_zip(stored_path)
+    else:
+        archive_format = TAR_FORMAT
+        stored_path = os.path.join(dataset_dir, part_name + ".tar")
+        _decompress_tar(archive_path, stored_path)
+        os.remove(archive_path)
+        entries = _index_tar(stored_path)
+    _write_index(os.path.join(dataset_dir, INDEX_DIRECTORY, part_name), entries)
+    part = _ArchivePart(stored_path, os.path.join(dataset_dir, INDEX_DIRECTORY, part_name), archive_format)
+    for member, destination in extract_members.items():
+        if member in part:
+            with open(os.path.join(dataset_dir, destination), 'wb') as f:
+                f.write(part.read(member))
+    part.close()
+    info['parts'].append({
+        'format': archive_format,
+        'archive_filename': os.path.basename(stored_path),
+        'index_name': part_name
+    })
+    _write_info(dataset_dir, info)
+    return stored_path
+
+
+def _get_part_name(part_index):
+    if part_index == 0:
+        return ARCHIVE_BASENAME
+    return "{}-{:04d}".format(ARCHIVE_BASENAME, part_index)
+
+
+def _write_info(dataset_dir, info):
+    info_path = _get_info_path(dataset_dir)
+    with open(info_path + ".tmp", 'w') as f:
+        json.dump(info, f)
+    os.rename(info_path + ".tmp", info_path)
+
+
+def _index_zip(archive_path):
+    with zipfile.ZipFile(archive_path) as zip_file:
+        return [(info.filename, info.header_offset, info.compress_size, info.compress_type)
+                for info in zip_file.infolist() if not info.filename.endswith('/')]
+
+
+def _decompress_tar(archive_path, tar_path):
+    with open(archive_path, 'rb') as f:
+        is_gzip = f.read(2) == b'\x1f\x8b'
+    if not is_gzip:
+        shutil.copyfile(archive_path, tar_path)
+        return
+    with gzip.open(archive_path, 'rb') as f_in, open(tar_path, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out, 1 << 20)
+
+
+def _index_tar(tar_path):
+    entries = []
+    with tarfile.open(tar_path, 'r:') as tar_file:
+        for member in tar_file:
+            if member.isfile() and not member.issparse():
+                entries.append((member.name, member.offset_data, member.size, zipfile.ZIP_STORED))
+            tar_file.members = []
+    return entries
+
+
+def _write_index(index_dir, entries):
+    if os.path.exists(index_dir):
+        shutil.rmtree(index_dir)
+    os.makedirs(index_dir)
+    entries = sorted((_normalize_name(name).encode('utf-8'), offset, size, compress_type)
+                     for name, offset, size, compress_type in entries)
+    names, offsets, sizes, compress_types = zip(*entries) if entries else ([], [], [], [])
+    np.save(os.path.join(index_dir, 'names.npy'), np.array(names, dtype=bytes))
+    np.save(os.path.join(index_dir, 'offsets.npy'), np.array(offsets, dtype=np.int64))
+    np.save(os.path.join(index_dir, 'sizes.npy'), np.array(sizes, dtype=np.int64))
+    np.save(os.path.join(index_dir, 'compress_types.npy'), np.array(compress_types, dtype=np.int8))
@@ -0,0 +1,85 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import tensorflow as tf
+
+from trainer.backend import dataset_archive
+
+_MEMBERS = {
+    'labels.txt': b'images/a A\nimages/b B\n',
+    'images/a.png': b'first image',
+    'images/b.png': b'second image' * 100
+}
+
+
+class DatasetArchiveTest(tf.test.TestCase):
+    def _create_dataset(self, name, write_archive):
+        dataset_dir = os.path.join(self.get_temp_dir(), name)
+        os.makedirs(dataset_dir)
+        archive_path = os.path.join(self.get_temp_dir(), name + '.upload')
+        write_archive(archive_path)
+        dataset_archive.add(archive_path, dataset_dir)
+        return dataset_dir
+
+    def _assertReadsAllMembers(self, dataset_dir):
+        archive = dataset_archive.DatasetArchive(dataset_dir)
+        self.assertEqual(len(archive), len(_MEMBERS))
+        for name, data in _MEMBERS.items():
+            self.assertEqual(archive.read(name), data)
+        self.assertEqual(archive.read('./images/a.png'), _MEMBERS['images/a.png'])
+        with self.assertRaises(KeyError):
+            archive.read('images/c.png')
+        archive.close()
+        with open(os.path.join(dataset_dir, 'labels.txt'), 'rb') as f:
+            self.assertEqual(f.read(), _MEMBERS['labels.txt'])
+
+    def testZipArchive(self):
+        def _write_zip(path):
+            with zipfile.ZipFile(path, 'w') as zip_file:
+                for name, data in _MEMBERS.items():
+                    compress_type = zipfile.ZIP_DEFLATED if name.endswith('b.png') else zipfile.ZIP_STORED
+                    zip_file.writestr(name, data, compress_type=compress_type)
+
+        self._assertReadsAllMembers(self._create_dataset('zipped', _write_zip))
+
+    def testTarGzArchive(self):
+        def _write_tar_gz(path):
+            with tarfile.open(path, 'w:gz') as tar_file:
+                for name, data in _MEMBERS.items():
+                    info = tarfile.TarInfo(name)
+                    info.size = len(data)
+                    tar_file.addfile(info, io.BytesIO(data))
+
+        self._assertReadsAllMembers(self._create_dataset('tarred', _write_tar_gz))
+
+    def testAppendedArchiveIsReadAlongsideTheFirst(self):
+        def _write_zip(path, members):
+            with zipfile.ZipFile(path, 'w') as zip_file:
+                for name, data in members.items():
+                    zip_file.writestr(name, data)
+
+        dataset_dir = self._create_dataset('appended', lambda path: _write_zip(path, _MEMBERS))
+        appended_path = os.path.join(self.get_temp_dir(), 'appended.zip')
+        _write_zip(appended_path, {'labels.txt': b'images/c C\n', 'images/c.png': b'third image'})
+        dataset_archive.add(appended_path, dataset_dir, {'labels.txt': 'appended_labels.txt'})
+        archive = dataset_archive.open_archive(dataset_dir)
+        self.assertEqual(archive.read('images/a.png'), _MEMBERS['images/a.png'])
+        self.assertEqual(archive.read('images/c.png'), b'third image')
+        with open(os.path.join(dataset_dir, 'labels.txt'), 'rb') as f:
+            self.assertEqual(f.read(), _MEMBERS['labels.txt'])
+
+    def testHasMemberChecksZipAndTarArchives(self):
+        zip_path = os.path.join(self.get_temp_dir(), 'members.zip')
+        with zipfile.ZipFile(zip_path, 'w') as zip_file:
+            zip_file.writestr('./labels.txt', b'')
+        tar_path = os.path.join(self.get_temp_dir(), 'members.tar.gz')
+        with tarfile.open(tar_path, 'w:gz') as tar_file:
+            tar_file.addfile(tarfile.TarInfo('images/a.png'), io.BytesIO(b''))
+        self.assertTrue(dataset_archive.has_member(zip_path, 'labels.txt'))
+        self.assertFalse(dataset_archive.has_member(tar_path, 'labels.txt'))
+
+
+if __name__ == '__main__':
+    tf.test.main()
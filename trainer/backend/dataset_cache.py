@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+CACHE_DIRECTORY = ".cache"
+CACHE_INFO_FILENAME = "cache_info.json"
+IMAGES_FILENAME = "images.npy"
+LABEL_VALUES_FILENAME = "label_values.npy"
+LABEL_LENGTHS_FILENAME = "label_lengths.npy"
+PREPROCESSING_VERSION = 4
+
+
+def get_preprocessing_settings(desired_image_size, labels_delimiter=' ', image_extension='png'):
+    return {
+        'version': PREPROCESSING_VERSION,
+        'desired_image_size': desired_image_size,
+        'labels_delimiter': labels_delimiter,
+        'image_extension': image_extension,
+        'binarize': 'otsu',
+        'invert': True,
+        'dtype': 'uint8',
+        'packed': True
+    }
+
+
+def create_key(labels_file, charset_file, preprocessing_settings):
+    key = hashlib.sha1()
+    key.update(hash_file(labels_file).encode())
+    key.update(hash_file(charset_file).encode())
+    key.update(json.dumps(preprocessing_settings, sort_keys=True).encode())
+    return key.hexdigest()
+
+
+def hash_file(filename, size=None, block_size=1 << 20):
+    file_hash = hashlib.sha1()
+    remaining = os.path.getsize(filename) if size is None else size
+    with open(filename, 'rb') as f:
+        while remaining > 0:
+            block = f.read(min(block_size, remaining))
+            if not block:
+                break
+            file_hash.update(block)
+            remaining -= len(block)
+    return file_hash.hexdigest()
+
+
+def load(dataset_dir, key):
+    entry_dir = _get_entry_dir(dataset_dir, key)
+    info = _read_info(entry_dir)
+    if info is None:
+        return None
+    try:
+        images = np.load(os.path.join(entry_dir, IMAGES_FILENAME), mmap_mode='r')
+        label_values = np.load(os.path.join(entry_dir, LABEL_VALUES_FILENAME), mmap_mode='r')
+        label_lengths = np.load(os.path.join(entry_dir, LABEL_LENGTHS_FILENAME))
+    except (IOError, ValueError):
+        _remove_entry(entry_dir)
+        return None
+    if images.shape[0] != info['num_examples'] or label_lengths.shape[0] != info['num_examples'] \
+            or label_values.shape[0] != label_lengths.sum():
+        _remove_entry(entry_dir)
+        return None
+    os.utime(os.path.join(entry_dir, CACHE_INFO_FILENAME), None)
+    return images, (label_values, label_lengths), info['num_classes']
+
+
+def save(dataset_dir, key, labels_file, charset_file, preprocessing_settings, images, labels, num_classes):
+    temp_dir = _create_temp_dir(dataset_dir, key)
+    _write_array(os.path.join(temp_dir, IMAGES_FILENAME), images, np.uint8)
+    _write_labels(temp_dir, *labels)
+    info = _create_info(key, labels_file, charset_file, preprocessing_settings, len(images), num_classes)
+    _commit_entry(dataset_dir, key, temp_dir, info)
+    return load(dataset_dir, key)
+
+
+def find_base_entry(dataset_dir, labels_file, charset_file, preprocessing_settings):
+    labels_size = os.path.getsize(labels_file)
+    charset_sha1 = hash_file(charset_file)
+    candidates = []
+    for entry_dir, info in _list_entries(_get_cache_dir(dataset_dir)):
+        if info is not None and info['labels_file'] == os.path.abspath(labels_file) \
+                and info['preprocessing_settings'] == preprocessing_settings \
+                and info.get('charset_sha1') == charset_sha1 \
+                and info.get('labels_size_bytes', labels_size) < labels_size:
+            candidates.append(info)
+    for info in sorted(candidates, key=lambda candidate: -candidate['labels_size_bytes']):
+        if hash_file(labels_file, info['labels_size_bytes']) == info['labels_sha1']:
+            return info
+    return None
+
+
+def extend(dataset_dir, base_info, key, labels_file, charset_file, preprocessing_settings,
+           new_images, new_labels, num_classes, chunk_size=4096):
+    base_images, (base_label_values, base_label_lengths), _ = load(dataset_dir, base_info['key'])
+    new_label_values, new_label_lengths = new_labels
+    num_examples = len(base_images) + len(new_images)
+    temp_dir = _create_temp_dir(dataset_dir, key)
+    images = np.lib.format.open_memmap(os.path.join(temp_dir, IMAGES_FILENAME), mode='w+', dtype=np.uint8,
+                                       shape=(num_examples,) + base_images.shape[1:])
+    for start in range(0, len(base_images), chunk_size):
+        end = min(start + chunk_size, len(base_images))
+        images[start:end] = base_images[start:end]
+    images[len(base_images):] = new_images
+    images.flush()
+    _write_labels(temp_dir,
+                  np.concatenate([base_label_values, new_label_values]),
+                  np.concatenate([base_label_lengths, new_label_lengths]))
+    del images, base_images, base_label_values
+    info = _create_info(key, labels_file, charset_file, preprocessing_settings, num_examples, num_classes)
+    _commit_entry(dataset_dir, key, temp_dir, info)
+    return load(dataset_dir, key)
+
+
+def _create_info(key, labels_file, charset_file, preprocessing_settings, num_examples, num_classes):
+    return {
+        'key': key,
+        'labels_file': os.path.abspath(labels_file),
+        'labels_size_bytes': os.path.getsize(labels_file),
+        'labels_sha1': hash_file(labels_file),
+        'charset_sha1': hash_file(charset_file),
+        'preprocessing_settings': preprocessing_settings,
+        'num_examples': num_examples,
+        'num_classes': num_classes,
+        'created': time.time()
+    }
+
+
+def _create_temp_dir(dataset_dir, key):
+    temp_dir = _get_entry_dir(dataset_dir, key) + ".tmp"
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+    os.makedirs(temp_dir)
+    return temp_dir
+
+
+def _commit_entry(dataset_dir, key, temp_dir, info):
+    entry_dir = _get_entry_dir(dataset_dir, key)
+    with open(os.path.join(temp_dir, CACHE_INFO_FILENAME), 'w') as f:
+        json.dump(info, f)
+    _remove_stale_entries(dataset_dir, info)
+    if os.path.exists(entry_dir):
+        shutil.rmtree(entry_dir)
+    os.rename(temp_dir, entry_dir)
+
+
+def _write_array(filename, values, dtype):
+    first_value = np.asarray(values[0])
+    array = np.lib.format.open_memmap(filename, mode='w+', dtype=dtype,
+                                      shape=(len(values),) + first_value.shape)
+    if isinstance(values, np.ndarray):
+        array[:] = values
+    else:
+        for index, value in enumerate(values):
+            array[index] = value
+    array.flush()
+    del array
+
+
+def _write_labels(entry_dir, label_values, label_lengths):
+    np.save(os.path.join(entry_dir, LABEL_VALUES_FILENAME), np.asarray(label_values, dtype=np.int32))
+    np.save(os.path.join(entry_dir, LABEL_LENGTHS_FILENAME), np.asarray(label_lengths, dtype=np.int32))
+
+
+def _remove_stale_entries(dataset_dir, info):
+    for entry_dir, entry_info in _list_entries(_get_cache_dir(dataset_dir)):
+        if entry_info is None:
+            _remove_entry(entry_dir)
+        elif entry_info['key'] != info['key'] \
+                and entry_info['labels_file'] == info['labels_file'] \
+                and entry_info['preprocessing_settings'] == info['preprocessing_settings']:
+            _remove_entry(entry_dir)
+
+
+def evict(datasets_dir, max_size=None, max_age=None):
+    entries = []
+    for dataset_name in os.listdir(datasets_dir):
+        cache_dir = _get_cache_dir(os.path.join(datasets_dir, dataset_name))
+        for entry_dir, info in _list_entries(cache_dir):
+            if info is None:
+                continue
+            last_used = os.path.getmtime(os.path.join(entry_dir, CACHE_INFO_FILENAME))
+            entries.append((last_used, entry_dir, _get_size(entry_dir)))
+    entries.sort()
+    now = time.time()
+    total_size = sum(size for _, _, size in entries)
+    for last_used, entry_dir, size in entries:
+        too_old = max_age is not None and now - last_used > max_age
+        too_large = max_size is not None and total_size > max_size
+        if too_old or too_large:
+            _remove_entry(entry_dir)
+            total_size -= size
+
+
+def _list_entries(cache_dir):
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = []
+    for entry_name in os.listdir(cache_dir):
+        entry_dir = os.path.join(cache_dir, entry_name)
+        if os.path.isdir(entry_dir) and not entry_name.endswith(".tmp"):
+            entries.append((entry_dir, _read_info(entry_dir)))
+    return entries
+
+
+def _read_info(entry_dir):
+    info_path = os.path.join(entry_dir, CACHE_INFO_FILENAME)
+    if not os.path.exists(info_path):
+        return None
+    try:
+        with open(info_path) as f:
+            return json.load(f)
+    except ValueError:
+        return None
+
+
+def _get_size(entry_dir):
+    return sum(os.path.getsize(os.path.join(entry_dir, filename))
+               for filename in os.listdir(entry_dir))
+
+
+def _remove_entry(entry_dir):
+    shutil.rmtree(entry_dir, ignore_errors=True)
+
+
+def _get_cache_dir(dataset_dir):
+    return os.path.join(dataset_dir, CACHE_DIRECTORY)
+
+
+def _get_entry_dir(dataset_dir, key):
+    return os.path.join(_get_cache_dir(dataset_dir), key)
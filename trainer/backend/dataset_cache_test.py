@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from trainer.backend import dataset_cache
+
+
+class StaleEntriesTest(tf.test.TestCase):
+    def setUp(self):
+        self.dataset_dir = os.path.join(self.get_temp_dir(), 'dataset')
+        os.makedirs(self.dataset_dir)
+        self.charset_file = os.path.join(self.dataset_dir, 'charset.txt')
+        with open(self.charset_file, 'w') as f:
+            f.write('a\nb\n')
+        self.settings = dataset_cache.get_preprocessing_settings(8)
+
+    def _write_labels(self, report_name, lines):
+        report_dir = os.path.join(self.get_temp_dir(), report_name)
+        if not os.path.isdir(report_dir):
+            os.makedirs(report_dir)
+        labels_file = os.path.join(report_dir, 'validated_train.csv')
+        with open(labels_file, 'w') as f:
+            f.write(''.join(line + '\n' for line in lines))
+        return labels_file
+
+    def _save(self, labels_file, num_examples):
+        key = dataset_cache.create_key(labels_file, self.charset_file, self.settings)
+        images = np.zeros((num_examples, 8, 1), dtype=np.uint8)
+        labels = (np.zeros(num_examples, dtype=np.int32), np.ones(num_examples, dtype=np.int32))
+        dataset_cache.save(self.dataset_dir, key, labels_file, self.charset_file, self.settings,
+                           images, labels, 2)
+        return key
+
+    def testReportDirsSharingDatasetKeepTheirEntries(self):
+        first_labels = self._write_labels('first', ['images/0 a', 'images/1 b'])
+        second_labels = self._write_labels('second', ['images/0 a'])
+        first_key = self._save(first_labels, 2)
+        second_key = self._save(second_labels, 1)
+        self.assertIsNotNone(dataset_cache.load(self.dataset_dir, first_key))
+        self.assertIsNotNone(dataset_cache.load(self.dataset_dir, second_key))
+
+    def testChangedLabelsFileReplacesItsEntry(self):
+        labels_file = self._write_labels('first', ['images/0 a'])
+        old_key = self._save(labels_file, 1)
+        labels_file = self._write_labels('first', ['images/0 a', 'images/1 b'])
+        new_key = self._save(labels_file, 2)
+        self.assertIsNone(dataset_cache.load(self.dataset_dir, old_key))
+        self.assertIsNotNone(dataset_cache.load(self.dataset_dir, new_key))
+
+
+if __name__ == '__main__':
+    tf.test.main()
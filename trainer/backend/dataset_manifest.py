@@ -0,0 +1,183 @@
+import json
+import os
+import time
+from collections import Counter
+
+import numpy as np
+
+from trainer.backend import dataset_cache
+from trainer.backend import dataset_utils
+
+MANIFEST_FILENAME = "dataset_manifest.json"
+MANIFEST_VERSION = 2
+SPLITS = ('train', 'test')
+
+
+def get(dataset_dir, charset, labels_delimiter=' ', image_extension='png'):
+    manifest = load(dataset_dir)
+    if manifest is None:
+        manifest = create(dataset_dir, charset, labels_delimiter, image_extension)
+    return manifest
+
+
+def load(dataset_dir):
+    manifest = _read(dataset_dir)
+    if manifest is None:
+        return None
+    if manifest.get('version') != MANIFEST_VERSION or not _is_up_to_date(dataset_dir, manifest):
+        return None
+    return manifest
+
+
+def _is_up_to_date(dataset_dir, manifest):
+    for split_name in SPLITS:
+        labels_file = os.path.join(dataset_dir, split_name + ".csv")
+        split = manifest['splits'].get(split_name)
+        if split is None and not os.path.exists(labels_file):
+            continue
+        if split is None or not os.path.exists(labels_file):
+            return False
+        stat = os.stat(labels_file)
+        if split['mtime'] != stat.st_mtime or split['size_bytes'] != stat.st_size:
+            return False
+    return True
+
+
+def create(dataset_dir, charset, labels_delimiter=' ', image_extension='png', max_image_samples=256):
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'created': time.time(),
+        'splits': {},
+        'character_counts': {},
+        'label_length_histogram': {}
+    }
+    image_paths = []
+    for split_name in SPLITS:
+        labels_file = os.path.join(dataset_dir, split_name + ".csv")
+        if not os.path.exists(labels_file):
+            continue
+        split_image_paths, labels = dataset_utils.read_dataset_list(labels_file, delimiter=labels_delimiter)
+        manifest['splits'][split_name] = {'num_examples': 0}
+        _add_examples(manifest, split_name, labels_file, labels)
+        image_paths.extend(split_image_paths)
+    manifest['image_stats'] = _get_image_stats(dataset_dir, image_paths, image_extension, max_image_samples)
+    return _write(dataset_dir, manifest, charset)
+
+
+def update(dataset_dir, charset, split_examples, labels_delimiter=' ', image_extension='png',
+           max_image_samples=256):
+    manifest = _read(dataset_dir)
+    if manifest is None or manifest.get('version') != MANIFEST_VERSION:
+        return create(dataset_dir, charset, labels_delimiter, image_extension, max_image_samples)
+    image_paths = []
+    for split_name, (split_image_paths, labels) in split_examples.items():
+        manifest['splits'].setdefault(split_name, {'num_examples': 0})
+        _add_examples(manifest, split_name, os.path.join(dataset_dir, split_name + ".csv"), labels)
+        image_paths.extend(split_image_paths)
+    num_examples = sum(split['num_examples'] for split in manifest['splits'].values())
+    num_samples = int(np.ceil(max_image_samples * float(len(image_paths)) / max(num_examples, 1)))
+    image_stats = _get_image_stats(dataset_dir, image_paths, image_extension, num_samples)
+    manifest['image_stats'] = _merge_image_stats(manifest['image_stats'], image_stats)
+    return _write(dataset_dir, manifest, charset)
+
+
+def _read(dataset_dir):
+    manifest_path = os.path.join(dataset_dir, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except ValueError:
+        return None
+
+
+def _add_examples(manifest, split_name, labels_file, labels):
+    split = manifest['splits'][split_name]
+    stat = os.stat(labels_file)
+    split['num_examples'] += len(labels)
+    split['sha1'] = dataset_cache.hash_file(labels_file)
+    split['mtime'] = stat.st_mtime
+    split['size_bytes'] = stat.st_size
+    character_counts = Counter(manifest['character_counts'])
+    label_lengths = Counter({int(length): count for length, count in manifest['label_length_histogram'].items()})
+    for label in labels:
+        character_counts.update(label)
+        label_lengths[len(label)] += 1
+    manifest['character_counts'] = dict(character_counts)
+    manifest['label_length_histogram'] = {str(length): count for length, count in sorted(label_lengths.items())}
+
+
+def _write(dataset_dir, manifest, charset):
+    manifest['num_examples'] = sum(split['num_examples'] for split in manifest['splits'].values())
+    manifest['charset_coverage'] = _get_charset_coverage(manifest['character_counts'], charset)
+    manifest_path = os.path.join(dataset_dir, MANIFEST_FILENAME)
+    with open(manifest_path + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=0)
+    os.rename(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+
+def _get_charset_coverage(character_counts, charset):
+    charset = set(charset)
+    used_characters = set(character_counts)
+    return {
+        'num_characters': len(used_characters),
+        'num_charset_characters_used': len(used_characters & charset),
+        'coverage': float(len(used_characters & charset)) / len(charset) if charset else 0.0,
+        'unknown_characters': sorted(used_characters - charset)
+    }
+
+
+def _get_image_stats(dataset_dir, image_paths, image_extension, max_image_samples):
+    sample_indices = np.unique(np.linspace(0, len(image_paths) - 1, min(len(image_paths), max_image_samples))
+                               .astype(np.int64)) if image_paths else []
+    heights = []
+    widths = []
+    num_unreadable = 0
+    for index in sample_indices:
+        try:
+            image = dataset_utils.read_image(dataset_dir, image_paths[index], image_extension, grayscale=True)
+        except (IOError, KeyError):
+            image = None
+        if image is None:
+            num_unreadable += 1
+            continue
+        heights.append(image.shape[0])
+        widths.append(image.shape[1])
+    stats = {'num_sampled': len(sample_indices), 'num_unreadable': num_unreadable}
+    if heights:
+        stats['height'] = _summarize(heights)
+        stats['width'] = _summarize(widths)
+        stats['aspect_ratio'] = _summarize(np.asarray(widths, dtype=np.float64) / np.asarray(heights))
+    return stats
+
+
+def _summarize(values):
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'mean': float(values.mean())
+    }
+
+
+def _merge_image_stats(stats, new_stats):
+    merged = {
+        'num_sampled': stats['num_sampled'] + new_stats['num_sampled'],
+        'num_unreadable': stats['num_unreadable'] + new_stats['num_unreadable']
+    }
+    num_read = stats['num_sampled'] - stats['num_unreadable']
+    num_new_read = new_stats['num_sampled'] - new_stats['num_unreadable']
+    for key in ('height', 'width', 'aspect_ratio'):
+        if key not in stats or key not in new_stats:
+            if key in stats or key in new_stats:
+                merged[key] = stats.get(key, new_stats.get(key))
+            continue
+        merged[key] = {
+            'min': min(stats[key]['min'], new_stats[key]['min']),
+            'max': max(stats[key]['max'], new_stats[key]['max']),
+            'mean': (stats[key]['mean'] * num_read + new_stats[key]['mean'] * num_new_read)
+                    / (num_read + num_new_read)
+        }
+    return merged
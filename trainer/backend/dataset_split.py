@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from trainer.backend import dataset_cache
+
+NUM_SPLIT_BUCKETS = 10000
+TEST_SPLIT = "test"
+VALIDATION_SPLIT = "validation"
+SPLIT_INFO_FILENAME = "split_info.json"
+TRAIN_SPLIT_FILENAME = "train_split.csv"
+VALIDATION_SPLIT_FILENAME = "validation_split.csv"
+ASSIGNMENT_FILENAME = "validation_assignment.npy"
+_SKIPPED = -1
+_TRAIN = 0
+_HOLDOUT = 1
+
+
+def get_split_bucket(image_path, split_name):
+    return _hash_to_bucket("{}:{}".format(split_name, image_path))
+
+
+def get_bucket_offset(seed):
+    return _hash_to_bucket(str(seed))
+
+
+def _hash_to_bucket(key):
+    return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:8], 16) % NUM_SPLIT_BUCKETS
+
+
+def get_num_holdout_buckets(holdout_size):
+    return int(round(holdout_size * NUM_SPLIT_BUCKETS))
+
+
+def is_holdout(image_path, holdout_size, seed, split_name):
+    bucket = (get_split_bucket(image_path, split_name) + get_bucket_offset(seed)) % NUM_SPLIT_BUCKETS
+    return bucket < get_num_holdout_buckets(holdout_size)
+
+
+def split_labels_file(labels_file, train_file, holdout_file, holdout_size, seed, split_name,
+                      delimiter=' ', assignment_file=None, start_offset=0, append=False, excluded=None):
+    num_train = 0
+    num_holdout = 0
+    assignment = bytearray()
+    mode = 'a' if append else 'w'
+    with open(labels_file, 'rb') as f_in, open(train_file, mode) as f_train, open(holdout_file, mode) as f_holdout:
+        f_in.seek(start_offset)
+        for line in f_in:
+            line = line.decode('utf-8').strip()
+            if not line:
+                assignment.append(_SKIPPED & 0xff)
+                continue
+            image_path = line.split(delimiter)[0]
+            if excluded and image_path in excluded:
+                assignment.append(_SKIPPED & 0xff)
+                continue
+            in_holdout = is_holdout(image_path, holdout_size, seed, split_name)
+            if in_holdout:
+                f_holdout.write(line + '\n')
+                num_holdout += 1
+            else:
+                f_train.write(line + '\n')
+                num_train += 1
+            assignment.append(_HOLDOUT if in_holdout else _TRAIN)
+    if assignment_file:
+        assignment = np.frombuffer(bytes(assignment), dtype=np.int8)
+        if append and os.path.exists(assignment_file):
+            assignment = np.concatenate([np.load(assignment_file), assignment])
+        np.save(assignment_file, assignment)
+    return num_train, num_holdout
+
+
+def write_split_info(split_dir, info):
+    with open(os.path.join(split_dir, SPLIT_INFO_FILENAME), 'w') as f:
+        json.dump(info, f, indent=0)
+
+
+def read_split_info(split_dir):
+    split_info_path = os.path.join(split_dir, SPLIT_INFO_FILENAME)
+    if not os.path.exists(split_info_path):
+        return None
+    with open(split_info_path) as f:
+        return json.load(f)
+
+
+def get_validation_split(checkpoint_dir, labels_file, validation_size, seed, delimiter=' '):
+    split = {
+        'train_file': os.path.join(checkpoint_dir, TRAIN_SPLIT_FILENAME),
+        'validation_file': os.path.join(checkpoint_dir, VALIDATION_SPLIT_FILENAME),
+        'assignment_file': os.path.join(checkpoint_dir, ASSIGNMENT_FILENAME)
+    }
+    info = read_split_info(checkpoint_dir)
+    expected_info = {
+        'split_name': VALIDATION_SPLIT,
+        'labels_file': os.path.abspath(labels_file),
+        'validation_size': validation_size,
+        'seed': seed
+    }
+    labels_size = os.path.getsize(labels_file)
+    is_reusable = info is not None and all(info.get(key) == value for key, value in expected_info.items()) \
+        and all(os.path.exists(path) for path in split.values()) \
+        and info.get('labels_size_bytes', 0) <= labels_size \
+        and info.get('labels_sha1') == dataset_cache.hash_file(labels_file, info.get('labels_size_bytes', 0))
+    if not is_reusable:
+        info = dict(expected_info, labels_size_bytes=0, num_train_examples=0, num_validation_examples=0)
+    if info['labels_size_bytes'] < labels_size:
+        num_train, num_validation = split_labels_file(labels_file,
+                                                      split['train_file'],
+                                                      split['validation_file'],
+                                                      validation_size, seed, VALIDATION_SPLIT,
+                                                      delimiter=delimiter,
+                                                      assignment_file=split['assignment_file'],
+                                                      start_offset=info['labels_size_bytes'],
+                                                      append=is_reusable)
+        info['labels_size_bytes'] = labels_size
+        info['labels_sha1'] = dataset_cache.hash_file(labels_file)
+        info['num_train_examples'] += num_train
+        info['num_validation_examples'] += num_validation
+        write_split_info(checkpoint_dir, info)
+        print('Split', labels_file, 'into', num_train, 'train and', num_validation, 'validation examples.')
+    split['num_train_examples'] = info['num_train_examples']
+    split['num_validation_examples'] = info['num_validation_examples']
+    return split
+
+
+def get_split_indices(split):
+    assignment = np.load(split['assignment_file'])
+    return np.flatnonzero(assignment == _TRAIN), np.flatnonzero(assignment == _HOLDOUT)
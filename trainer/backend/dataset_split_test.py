@@ -0,0 +1,41 @@
+import os
+
+import tensorflow as tf
+
+from trainer.backend import dataset_split
+
+
+class ValidationSplitTest(tf.test.TestCase):
+    def setUp(self):
+        self.labels_file = os.path.join(self.get_temp_dir(), 'train.csv')
+        with open(self.labels_file, 'w') as f:
+            for index in range(1000):
+                f.write('images/{0} label{0}\n'.format(index))
+
+    def _read_lines(self, filename):
+        with open(filename) as f:
+            return f.read().splitlines()
+
+    def testSplitIsDeterministicAndComplete(self):
+        first_dir = os.path.join(self.get_temp_dir(), 'first')
+        second_dir = os.path.join(self.get_temp_dir(), 'second')
+        os.makedirs(first_dir)
+        os.makedirs(second_dir)
+        first = dataset_split.get_validation_split(first_dir, self.labels_file, 0.2, seed=3)
+        second = dataset_split.get_validation_split(second_dir, self.labels_file, 0.2, seed=3)
+        self.assertEqual(self._read_lines(first['validation_file']), self._read_lines(second['validation_file']))
+        self.assertEqual(first['num_train_examples'] + first['num_validation_examples'], 1000)
+        self.assertNear(first['num_validation_examples'] / 1000.0, 0.2, 0.05)
+
+    def testSplitIndicesMatchSplitFiles(self):
+        split = dataset_split.get_validation_split(self.get_temp_dir(), self.labels_file, 0.1, seed=0)
+        train_indices, validation_indices = dataset_split.get_split_indices(split)
+        lines = self._read_lines(self.labels_file)
+        self.assertEqual([lines[index] for index in validation_indices],
+                         self._read_lines(split['validation_file']))
+        self.assertEqual([lines[index] for index in train_indices],
+                         self._read_lines(split['train_file']))
+
+
+if __name__ == '__main__':
+    tf.test.main()
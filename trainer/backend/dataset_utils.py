@@ -1,16 +1,20 @@
 import cv2
+import itertools
+import multiprocessing
 import numpy as np
 import os
 
+from trainer.backend import dataset_archive
 from trainer.backend.EncoderDecoder import EncoderDecoder
 
 
-def read_dataset_list(dataset_list_file, delimiter=' '):
+def read_dataset_list(dataset_list_file, delimiter=' ', start_offset=0):
     features = []
     labels = []
-    with open(dataset_list_file) as f:
+    with open(dataset_list_file, 'rb') as f:
+        f.seek(start_offset)
         data = f.readlines()
-    data = [x.strip() for x in data]
+    data = [x.decode('utf-8').strip() for x in data]
     for example in data:
         example = example.split(delimiter)
         features.append(example[0])
@@ -18,38 +22,174 @@ def read_dataset_list(dataset_list_file, delimiter=' '):
     return features, labels
 
 
+def count_examples(dataset_list_file):
+    counter = 0
+    with open(dataset_list_file) as f:
+        for line in f:
+            if line.strip():
+                counter += 1
+    return counter
+
+
 def read_images(data_dir, image_paths, image_extension='png'):
     print('Reading images...')
     images = []
     for image_name in image_paths:
-        images.append(cv2.imread(os.path.join(data_dir, image_name) + '.' + image_extension))
+        images.append(read_image(data_dir, image_name, image_extension))
     print('Done reading images. Number of images read:', len(image_paths))
     return images
 
 
+def read_image(data_dir, image_name, image_extension='png', grayscale=False):
+    flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    archive = dataset_archive.open_archive(data_dir)
+    if archive is not None:
+        data = archive.read(image_name + '.' + image_extension)
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+    return cv2.imread(os.path.join(data_dir, image_name) + '.' + image_extension, flags)
+
+
+def preprocess_image(image, desired_image_size, out=None):
+    if out is None:
+        out = np.empty((desired_image_size, desired_image_size, 1), dtype=np.uint8)
+    canvas = out[:, :, 0]
+    raw_height, raw_width = image.shape[:2]
+    ratio = float(desired_image_size) / max(raw_height, raw_width)
+    scaled_width = int(raw_width * ratio)
+    scaled_height = int(raw_height * ratio)
+    top = (desired_image_size - scaled_height) // 2
+    left = (desired_image_size - scaled_width) // 2
+    canvas.fill(255)
+    canvas[top:top + scaled_height, left:left + scaled_width] = cv2.resize(image, (scaled_width, scaled_height))
+    _binarize_and_invert(canvas)
+    return out
+
+
+def preprocess_line_image(image, desired_height, max_width=None):
+    raw_height, raw_width = image.shape[:2]
+    ratio = float(desired_height) / raw_height
+    scaled_width = max(1, int(raw_width * ratio))
+    scaled_height = desired_height
+    if max_width and scaled_width > max_width:
+        ratio = float(max_width) / raw_width
+        scaled_width = max_width
+        scaled_height = max(1, int(raw_height * ratio))
+    canvas = np.full((desired_height, scaled_width), 255, dtype=np.uint8)
+    top = (desired_height - scaled_height) // 2
+    canvas[top:top + scaled_height] = cv2.resize(image, (scaled_width, scaled_height))
+    _binarize_and_invert(canvas)
+    return canvas[:, :, np.newaxis]
+
+
+def _binarize_and_invert(image):
+    cv2.threshold(image, 128, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU, dst=image)
+
+
+def preprocess_images(data_dir, image_paths, desired_image_size, image_extension='png',
+                      num_workers=None, chunk_size=256, packed=False):
+    print('Preprocessing images...')
+    pool, images = create_preprocessing_pool(data_dir, len(image_paths), desired_image_size,
+                                             image_extension=image_extension, num_workers=num_workers,
+                                             packed=packed)
+    try:
+        images = preprocess_images_in(pool, images, image_paths, chunk_size=chunk_size)
+    finally:
+        pool.close()
+        pool.join()
+    print('Done preprocessing images. Number of images preprocessed:', len(image_paths))
+    return images
+
+
+def create_preprocessing_pool(data_dir, max_num_images, desired_image_size, image_extension='png',
+                              num_workers=None, packed=False):
+    shape = get_images_shape(max_num_images, desired_image_size, packed)
+    shared_images = multiprocessing.RawArray('B', int(np.prod(shape)))
+    pool = multiprocessing.Pool(num_workers or multiprocessing.cpu_count(),
+                                initializer=_init_preprocessing_worker,
+                                initargs=(shared_images, shape, data_dir,
+                                          desired_image_size, image_extension, packed))
+    return pool, np.frombuffer(shared_images, dtype=np.uint8).reshape(shape)
+
+
+def preprocess_images_in(pool, images, image_paths, chunk_size=256):
+    chunks = [(start, image_paths[start:start + chunk_size])
+              for start in range(0, len(image_paths), chunk_size)]
+    pool.map(_preprocess_chunk, chunks, chunksize=1)
+    return images[:len(image_paths)]
+
+
+def get_images_shape(num_images, desired_image_size, packed=False):
+    if packed:
+        return num_images, desired_image_size, get_packed_width(desired_image_size)
+    return num_images, desired_image_size, desired_image_size, 1
+
+
+def get_packed_width(image_width):
+    return (image_width + 7) // 8
+
+
+def pack_image(image, out=None):
+    packed_image = np.packbits(image[:, :, 0] > 127, axis=-1)
+    if out is None:
+        return packed_image
+    out[...] = packed_image
+    return out
+
+
+_worker_state = {}
+
+
+def _init_preprocessing_worker(shared_images, shape, data_dir, desired_image_size, image_extension, packed):
+    _worker_state['images'] = np.frombuffer(shared_images, dtype=np.uint8).reshape(shape)
+    _worker_state['data_dir'] = data_dir
+    _worker_state['desired_image_size'] = desired_image_size
+    _worker_state['image_extension'] = image_extension
+    _worker_state['packed'] = packed
+
+
+def _preprocess_chunk(chunk):
+    start, image_paths = chunk
+    images = _worker_state['images']
+    desired_image_size = _worker_state['desired_image_size']
+    buffer = np.empty((desired_image_size, desired_image_size, 1), dtype=np.uint8)
+    for offset, image_name in enumerate(image_paths):
+        image = read_image(_worker_state['data_dir'], image_name, _worker_state['image_extension'],
+                           grayscale=True)
+        if _worker_state['packed']:
+            pack_image(preprocess_image(image, desired_image_size, out=buffer), out=images[start + offset])
+        else:
+            preprocess_image(image, desired_image_size, out=images[start + offset])
+
+
 def binarize(images):
     print('Binarizing images...')
     binarized_images = []
     for image in images:
-        gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        _, binarized_image = cv2.threshold(gray_image, 128, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
-        binarized_image = binarized_image[:, :, np.newaxis]
-        binarized_images.append(binarized_image)
+        binarized_images.append(_binarize(image))
     print('Done binarizing images.')
     return binarized_images
 
 
+def _binarize(image):
+    gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, binarized_image = cv2.threshold(gray_image, 128, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return binarized_image[:, :, np.newaxis]
+
+
 def invert(images):
     print('Inverting color of images...')
     inverted_images = []
     for image in images:
-        inverted_image = cv2.bitwise_not(image)
-        inverted_image = inverted_image[:, :, np.newaxis]
-        inverted_images.append(inverted_image)
+        inverted_images.append(_invert(image))
     print('Done inverting color of images.')
     return inverted_images
 
 
+def _invert(image):
+    inverted_image = cv2.bitwise_not(image)
+    return inverted_image[:, :, np.newaxis]
+
+
 def images_as_float32(images):
     float32_images = []
     for image in images:
@@ -113,10 +253,47 @@ def encode(labels, classes):
     return encoded_labels
 
 
+def encode_ragged(labels, classes):
+    encoder_decoder = EncoderDecoder()
+    encoder_decoder.initialize_encode_and_decode_maps_from(
+        classes
+    )
+    return encoder_decoder.encode_ragged(labels)
+
+
+def get_label_offsets(label_lengths):
+    offsets = np.zeros(len(label_lengths) + 1, dtype=np.int64)
+    np.cumsum(label_lengths, out=offsets[1:])
+    return offsets
+
+
+def gather_labels(label_values, label_offsets, indices):
+    starts = label_offsets[indices]
+    lengths = label_offsets[indices + 1] - starts
+    batch_starts = np.cumsum(lengths) - lengths
+    positions = np.repeat(starts - batch_starts, lengths) + np.arange(lengths.sum())
+    return np.asarray(label_values[positions], dtype=np.int32), lengths.astype(np.int32)
+
+
+def ragged_to_dense(label_values, label_lengths, max_label_length=None):
+    label_lengths = np.asarray(label_lengths, dtype=np.int64)
+    if max_label_length is None:
+        max_label_length = int(label_lengths.max()) if label_lengths.size else 0
+    if label_lengths.size and label_lengths.max() > max_label_length:
+        raise ValueError("Label of length " + str(label_lengths.max()) +
+                         " does not fit max_label_length " + str(max_label_length) + ".")
+    dense_labels = np.full((len(label_lengths), max_label_length), -1, dtype=np.int32)
+    rows = np.repeat(np.arange(len(label_lengths)), label_lengths)
+    columns = np.arange(label_lengths.sum()) - np.repeat(np.cumsum(label_lengths) - label_lengths, label_lengths)
+    dense_labels[rows, columns] = label_values
+    return dense_labels
+
+
+def encode_dense(encoder_decoder, labels, max_label_length=None):
+    return ragged_to_dense(*encoder_decoder.encode_ragged(labels), max_label_length=max_label_length)
+
+
 def pad(labels, max_label_length=120):
-    padded_labels = []
-    for label in labels:
-        while len(label) < max_label_length:
-            label = np.append(label, [-1])
-        padded_labels.append(label)
-    return padded_labels
+    label_lengths = np.fromiter((len(label) for label in labels), dtype=np.int64, count=len(labels))
+    label_values = np.fromiter(itertools.chain.from_iterable(labels), dtype=np.int32, count=label_lengths.sum())
+    return ragged_to_dense(label_values, label_lengths, max_label_length)
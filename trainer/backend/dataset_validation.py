@@ -0,0 +1,178 @@
+import json
+import multiprocessing
+import os
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from trainer.backend import dataset_cache
+from trainer.backend import dataset_utils
+from trainer.backend import network_utils
+
+REPORT_FILENAME = "validation_report.json"
+EXCLUSIONS_FILENAME = "excluded_samples.txt"
+UNREADABLE_IMAGE = "unreadable_image"
+EMPTY_LABEL = "empty_label"
+UNKNOWN_CHARACTERS = "unknown_characters"
+LABEL_TOO_LONG = "label_too_long"
+MAX_REPORTED_EXAMPLES = 100
+
+_worker_state = {}
+
+
+def validate_dataset(dataset_dir, labels_file, charset, report_dir, network=None, desired_image_size=None,
+                     variable_width=False, max_image_width=None, labels_delimiter=' ', image_extension='png',
+                     num_workers=None, chunk_size=256, append=False):
+    settings = OrderedDict([
+        ('labels_file', os.path.abspath(labels_file)),
+        ('labels_sha1', dataset_cache.hash_file(labels_file)),
+        ('charset', ''.join(charset)),
+        ('network', network),
+        ('desired_image_size', desired_image_size),
+        ('variable_width', variable_width),
+        ('max_image_width', max_image_width)
+    ])
+    report = read_report(report_dir)
+    if not append and report is not None and report['settings'] == settings:
+        print('Reusing the validation report of', labels_file)
+        return read_exclusions(report_dir)
+    image_paths, labels = dataset_utils.read_dataset_list(labels_file, delimiter=labels_delimiter)
+    print('Validating', len(image_paths), 'examples of', labels_file)
+    image_sizes = _read_image_sizes(dataset_dir, image_paths, image_extension, num_workers, chunk_size)
+    charset = set(charset)
+    excluded = OrderedDict()
+    examples = {}
+    for image_path, label, (height, width) in zip(image_paths, labels, image_sizes):
+        issues = _get_issues(label, height, width, charset, network, desired_image_size,
+                             variable_width, max_image_width)
+        if not issues:
+            continue
+        excluded[image_path] = [issue for issue, _ in issues]
+        for issue, details in issues:
+            reported = examples.setdefault(issue, [])
+            if len(reported) < MAX_REPORTED_EXAMPLES:
+                reported.append(dict(details, image_path=image_path, label=label))
+    issue_counts = Counter(issue for issues in excluded.values() for issue in issues)
+    num_examples = len(image_paths)
+    num_excluded = len(excluded)
+    if append and report is not None:
+        issue_counts.update(report['issue_counts'])
+        for issue, reported in report['examples'].items():
+            examples[issue] = (reported + examples.get(issue, []))[:MAX_REPORTED_EXAMPLES]
+        num_examples += report['num_examples']
+        num_excluded += report['num_excluded']
+    report = OrderedDict([
+        ('settings', settings),
+        ('num_examples', num_examples),
+        ('num_excluded', num_excluded),
+        ('issue_counts', dict(issue_counts)),
+        ('examples', examples)
+    ])
+    _write_report(report_dir, report)
+    _write_exclusions(report_dir, excluded, append)
+    print('Excluded', len(excluded), 'of', len(image_paths), 'examples:', dict(issue_counts))
+    return read_exclusions(report_dir) if append else excluded
+
+
+def _get_issues(label, height, width, charset, network, desired_image_size, variable_width, max_image_width):
+    issues = []
+    if width == 0:
+        issues.append((UNREADABLE_IMAGE, {}))
+    if not label:
+        issues.append((EMPTY_LABEL, {}))
+    unknown_characters = sorted(set(label) - charset)
+    if unknown_characters:
+        issues.append((UNKNOWN_CHARACTERS, {'characters': ''.join(unknown_characters)}))
+    if network and desired_image_size and width:
+        input_width = desired_image_size
+        if variable_width:
+            input_width = _get_scaled_width(height, width, desired_image_size, max_image_width)
+        time_steps = network_utils.get_output_width(network, input_width)
+        required_time_steps = network_utils.get_min_ctc_time_steps(label)
+        if required_time_steps > time_steps:
+            issues.append((LABEL_TOO_LONG, {'time_steps': int(time_steps),
+                                            'required_time_steps': required_time_steps}))
+    return issues
+
+
+def _get_scaled_width(height, width, desired_height, max_width=None):
+    scaled_width = max(1, int(width * float(desired_height) / height))
+    if max_width:
+        scaled_width = min(scaled_width, max_width)
+    return scaled_width
+
+
+def _read_image_sizes(dataset_dir, image_paths, image_extension, num_workers, chunk_size):
+    chunks = [image_paths[start:start + chunk_size] for start in range(0, len(image_paths), chunk_size)]
+    pool = multiprocessing.Pool(num_workers or multiprocessing.cpu_count(),
+                                initializer=_init_validation_worker,
+                                initargs=(dataset_dir, image_extension))
+    try:
+        chunk_sizes = pool.map(_read_chunk_image_sizes, chunks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    if not chunk_sizes:
+        return np.zeros((0, 2), dtype=np.int32)
+    return np.concatenate(chunk_sizes)
+
+
+def _init_validation_worker(dataset_dir, image_extension):
+    _worker_state['dataset_dir'] = dataset_dir
+    _worker_state['image_extension'] = image_extension
+
+
+def _read_chunk_image_sizes(image_paths):
+    image_sizes = np.zeros((len(image_paths), 2), dtype=np.int32)
+    for index, image_path in enumerate(image_paths):
+        try:
+            image = dataset_utils.read_image(_worker_state['dataset_dir'], image_path,
+                                             _worker_state['image_extension'], grayscale=True)
+        except (IOError, KeyError, ValueError):
+            image = None
+        if image is not None and image.size:
+            image_sizes[index] = image.shape[:2]
+    return image_sizes
+
+
+def read_report(report_dir):
+    report_path = os.path.join(report_dir, REPORT_FILENAME)
+    if not os.path.exists(report_path):
+        return None
+    with open(report_path) as f:
+        return json.load(f, object_pairs_hook=OrderedDict)
+
+
+def _write_report(report_dir, report):
+    report_path = os.path.join(report_dir, REPORT_FILENAME)
+    with open(report_path + ".tmp", 'w') as f:
+        json.dump(report, f, indent=0)
+    os.rename(report_path + ".tmp", report_path)
+
+
+def read_exclusions(report_dir):
+    exclusions = OrderedDict()
+    exclusions_path = os.path.join(report_dir, EXCLUSIONS_FILENAME)
+    if not os.path.exists(exclusions_path):
+        return exclusions
+    with open(exclusions_path, 'rb') as f:
+        for line in f:
+            image_path, _, issues = line.decode('utf-8').rstrip('\n').rpartition('\t')
+            if image_path:
+                exclusions[image_path] = issues.split(',')
+    return exclusions
+
+
+def _write_exclusions(report_dir, excluded, append=False):
+    with open(os.path.join(report_dir, EXCLUSIONS_FILENAME), 'ab' if append else 'wb') as f:
+        for image_path, issues in excluded.items():
+            f.write(u'{}\t{}\n'.format(image_path, ','.join(issues)).encode('utf-8'))
+
+
+def write_filtered_labels(labels_file, filtered_labels_file, excluded, delimiter=' '):
+    with open(labels_file, 'rb') as f_in, open(filtered_labels_file, 'wb') as f_out:
+        for line in f_in:
+            stripped = line.decode('utf-8').strip()
+            if stripped and stripped.split(delimiter)[0] not in excluded:
+                f_out.write((stripped + '\n').encode('utf-8'))
+    return filtered_labels_file
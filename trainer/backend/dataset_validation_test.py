@@ -0,0 +1,62 @@
+import os
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+from trainer.backend import dataset_validation
+from trainer.backend import network_utils
+
+_NETWORK = [
+    {"layer_type": "conv2d", "num_filters": 4, "kernel_size": 3, "padding": "same"},
+    {"layer_type": "max_pool2d", "pool_size": 2, "stride": 2, "padding": "valid"},
+    {"layer_type": "collapse_to_rnn_dims"}
+]
+
+
+class DatasetValidationTest(tf.test.TestCase):
+    def testOutputWidthFollowsPoolingStrides(self):
+        self.assertEqual(network_utils.get_output_width(_NETWORK, 32), 16)
+        self.assertEqual(network_utils.get_output_width(_NETWORK, 33), 16)
+
+    def testOutputWidthFollowsConvolutionStrides(self):
+        network = [
+            {"layer_type": "strided_conv2d", "num_filters": 4, "kernel_size": 3, "stride": 2},
+            {"layer_type": "separable_conv2d", "num_filters": 8, "kernel_size": 3, "padding": "valid"},
+            {"layer_type": "bottleneck_block", "num_filters": 8},
+            {"layer_type": "collapse_to_rnn_dims"},
+            {"layer_type": "temporal_conv", "num_filters": 8, "kernel_size": 3}
+        ]
+        self.assertEqual(network_utils.get_output_width(network, 33), 15)
+
+    def testRepeatedCharactersNeedABlankInBetween(self):
+        self.assertEqual(network_utils.get_min_ctc_time_steps('abc'), 3)
+        self.assertEqual(network_utils.get_min_ctc_time_steps('aab'), 4)
+
+    def testInvalidExamplesAreExcluded(self):
+        dataset_dir = self.get_temp_dir()
+        cv2.imwrite(os.path.join(dataset_dir, 'valid.png'), np.full((16, 64), 255, dtype=np.uint8))
+        cv2.imwrite(os.path.join(dataset_dir, 'long.png'), np.full((16, 16), 255, dtype=np.uint8))
+        with open(os.path.join(dataset_dir, 'corrupt.png'), 'wb') as f:
+            f.write(b'not an image')
+        labels_file = os.path.join(dataset_dir, 'labels.txt')
+        with open(labels_file, 'w') as f:
+            f.write('valid abc\nlong abcdefghij\ncorrupt abc\nunknown ab?\n')
+        report_dir = os.path.join(dataset_dir, 'report')
+        os.makedirs(report_dir)
+
+        excluded = dataset_validation.validate_dataset(dataset_dir, labels_file, 'abcdefghij', report_dir,
+                                                       network=_NETWORK, desired_image_size=16,
+                                                       variable_width=True, num_workers=2)
+
+        self.assertEqual(dict(excluded), {
+            'long': [dataset_validation.LABEL_TOO_LONG],
+            'corrupt': [dataset_validation.UNREADABLE_IMAGE],
+            'unknown': [dataset_validation.UNREADABLE_IMAGE, dataset_validation.UNKNOWN_CHARACTERS]
+        })
+        self.assertEqual(dataset_validation.read_exclusions(report_dir), excluded)
+        self.assertEqual(dataset_validation.read_report(report_dir)['num_excluded'], 3)
+
+
+if __name__ == '__main__':
+    tf.test.main()
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+from collections import Counter
+
+import numpy as np
+
+from trainer.backend import dataset_cache
+
+CACHE_DIRECTORY = ".decoder_tables"
+BACKOFF_LOG_PROBABILITY = float(np.log(0.4))
+_MAX_KEY = 2 ** 62
+
+
+def get_decoder_tables(charset, lexicon_file=None, corpus_file=None, lm_order=3, cache_dir=None):
+    if not lexicon_file and not corpus_file:
+        raise ValueError("A lexicon or a language model corpus is needed for constrained decoding.")
+    source_file = lexicon_file or corpus_file
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(source_file)), CACHE_DIRECTORY)
+    key = _create_key(charset, lexicon_file, corpus_file, lm_order)
+    tables_path = os.path.join(cache_dir, key + ".npz")
+    if os.path.exists(tables_path):
+        with np.load(tables_path) as tables:
+            return {name: tables[name] for name in tables.files}
+    words = _read_lines(lexicon_file) if lexicon_file else None
+    lines = _read_lines(corpus_file) if corpus_file else words
+    tables = build_decoder_tables(charset, words, lines, lm_order)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    with open(tables_path + ".tmp", 'wb') as f:
+        np.savez(f, **tables)
+    os.rename(tables_path + ".tmp", tables_path)
+    print('Cached decoder tables in', tables_path)
+    return tables
+
+
+def _create_key(charset, lexicon_file, corpus_file, lm_order):
+    return hashlib.sha1(json.dumps({
+        'charset': charset,
+        'lexicon_sha1': dataset_cache.hash_file(lexicon_file) if lexicon_file else None,
+        'corpus_sha1': dataset_cache.hash_file(corpus_file) if corpus_file else None,
+        'lm_order': lm_order
+    }, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _read_lines(filename):
+    with open(filename, 'rb') as f:
+        return [line.decode('utf-8').strip() for line in f if line.strip()]
+
+
+def build_decoder_tables(charset, words=None, lines=None, lm_order=3):
+    num_characters = len(charset)
+    base = num_characters + 1
+    if base ** lm_order >= _MAX_KEY:
+        raise ValueError("The charset is too large for a language model of order " + str(lm_order))
+    char_ids = {char: index for index, char in enumerate(charset)}
+    tables = {
+        'lm_order': np.int32(lm_order),
+        'space_id': np.int32(char_ids.get(' ', -1)),
+        'has_lexicon': np.bool_(words is not None)
+    }
+    tables.update(_build_trie(words or [], char_ids))
+    tables.update(_build_language_model(lines or [], char_ids, lm_order))
+    return tables
+
+
+def _build_trie(words, char_ids):
+    num_characters = len(char_ids)
+    children = {}
+    word_ends = [False]
+    for word in words:
+        if any(char not in char_ids or char == ' ' for char in word):
+            continue
+        node = 0
+        for char in word:
+            key = node * num_characters + char_ids[char]
+            if key not in children:
+                children[key] = len(word_ends)
+                word_ends.append(False)
+            node = children[key]
+        word_ends[node] = True
+    trie_keys = np.array(sorted(children), dtype=np.int64)
+    return {
+        'trie_keys': trie_keys,
+        'trie_values': np.array([children[key] for key in trie_keys], dtype=np.int32),
+        'word_ends': np.array(word_ends, dtype=np.bool_)
+    }
+
+
+def _build_language_model(lines, char_ids, lm_order):
+    num_characters = len(char_ids)
+    bos_id = num_characters
+    base = num_characters + 1
+    ngram_counts = [Counter() for _ in range(lm_order)]
+    for line in lines:
+        ids = [char_ids[char] for char in line if char in char_ids]
+        padded = [bos_id] * (lm_order - 1) + ids
+        for position in range(lm_order - 1, len(padded)):
+            for order in range(1, lm_order + 1):
+                ngram_counts[order - 1][tuple(padded[position - order + 1:position + 1])] += 1
+    unigram_counts = np.zeros(num_characters, dtype=np.float64)
+    for (char_id,), count in ngram_counts[0].items():
+        unigram_counts[char_id] = count
+    tables = {
+        'unigram_log_probs': np.log((unigram_counts + 1) / (unigram_counts.sum() + num_characters)).astype(np.float32)
+    }
+    for order in range(2, lm_order + 1):
+        context_counts = Counter()
+        for ngram, count in ngram_counts[order - 1].items():
+            context_counts[ngram[:-1]] += count
+        ngrams = sorted((_encode_ngram(ngram, base), ngram) for ngram in ngram_counts[order - 1])
+        tables['lm_keys_{}'.format(order)] = np.array([key for key, _ in ngrams], dtype=np.int64)
+        tables['lm_values_{}'.format(order)] = np.array(
+            [np.log(float(ngram_counts[order - 1][ngram]) / context_counts[ngram[:-1]]) for _, ngram in ngrams],
+            dtype=np.float32)
+    return tables
+
+
+def _encode_ngram(ngram, base):
+    key = 0
+    for char_id in ngram:
+        key = key * base + char_id
+    return key
@@ -0,0 +1,57 @@
+import numpy as np
+import tensorflow as tf
+
+from trainer.backend import dataset_utils
+from trainer.backend.EncoderDecoder import EncoderDecoder
+
+
+def _create_encoder_decoder(charset):
+    encoder_decoder = EncoderDecoder()
+    encoder_decoder.initialize_encode_and_decode_maps_from(charset)
+    return encoder_decoder
+
+
+class EncodeRaggedTest(tf.test.TestCase):
+    def setUp(self):
+        self.encoder_decoder = _create_encoder_decoder("abc|")
+
+    def testEncodeRaggedMatchesEncode(self):
+        labels = ["ab", "c|ca", "b"]
+        values, lengths = self.encoder_decoder.encode_ragged(labels)
+        self.assertAllEqual(lengths, [2, 4, 1])
+        self.assertAllEqual(values, sum([self.encoder_decoder.encode(label) for label in labels], []))
+
+    def testEncodeRaggedConcatenatesLabels(self):
+        values, lengths = self.encoder_decoder.encode_ragged(["ab", "", "c|"])
+        self.assertAllEqual(values, [0, 1, 2, 3])
+        self.assertAllEqual(lengths, [2, 0, 2])
+        self.assertEqual(values.dtype, np.int32)
+
+    def testEncodeRaggedRaisesOnUnknownCharacter(self):
+        with self.assertRaises(KeyError):
+            self.encoder_decoder.encode_ragged(["ab", "z"])
+
+
+class EncodeDenseTest(tf.test.TestCase):
+    def setUp(self):
+        self.encoder_decoder = _create_encoder_decoder("abc|")
+
+    def testEncodeDenseMatchesPad(self):
+        labels = ["ab", "c|ca", "", "b"]
+        dense_labels = dataset_utils.encode_dense(self.encoder_decoder, labels, max_label_length=6)
+        expected = dataset_utils.pad([self.encoder_decoder.encode(label) for label in labels], 6)
+        self.assertAllEqual(dense_labels, expected)
+        self.assertAllEqual(dense_labels[1], [2, 3, 2, 0, -1, -1])
+        self.assertEqual(dense_labels.dtype, np.int32)
+
+    def testEncodeDenseDefaultsToLongestLabel(self):
+        dense_labels = dataset_utils.encode_dense(self.encoder_decoder, ["ab", "abc"])
+        self.assertAllEqual(dense_labels, [[0, 1, -1], [0, 1, 2]])
+
+    def testPadRaisesOnLabelLongerThanMaxLength(self):
+        with self.assertRaises(ValueError):
+            dataset_utils.pad([[0, 1, 2]], max_label_length=2)
+
+
+if __name__ == "__main__":
+    tf.test.main()
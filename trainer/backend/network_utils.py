@@ -0,0 +1,42 @@
+from trainer.backend.GraphKeys import LayerTypes
+from trainer.backend.GraphKeys import PaddingTypes
+
+
+def get_output_width(network, input_width):
+    width = input_width
+    for layer in network:
+        if layer["layer_type"] == LayerTypes.COLLAPSE_TO_RNN_DIMS.value:
+            break
+        width = get_layer_output_width(layer, width)
+    return width
+
+
+def get_layer_output_width(layer, width):
+    layer_type = layer["layer_type"]
+    if layer_type in (LayerTypes.CONV2D.value, LayerTypes.SEPARABLE_CONV2D.value):
+        return _get_window_output_width(width, _get_width(layer["kernel_size"]), 1,
+                                        layer.get("padding") or PaddingTypes.SAME.value)
+    if layer_type == LayerTypes.STRIDED_CONV2D.value:
+        return _get_window_output_width(width, _get_width(layer["kernel_size"]), layer.get("stride") or 2,
+                                        layer.get("padding") or PaddingTypes.SAME.value)
+    if layer_type == LayerTypes.MAX_POOL2D.value:
+        return _get_window_output_width(width, _get_width(layer["pool_size"]), layer.get("stride") or 2,
+                                        layer.get("padding") or PaddingTypes.VALID.value)
+    return width
+
+
+def _get_width(size):
+    if isinstance(size, (list, tuple)):
+        return size[-1]
+    return size
+
+
+def _get_window_output_width(width, window_size, stride, padding):
+    if padding.lower() == PaddingTypes.VALID.value:
+        return (width - window_size) // stride + 1
+    return (width + stride - 1) // stride
+
+
+def get_min_ctc_time_steps(label):
+    num_repeats = sum(1 for previous, current in zip(label, label[1:]) if previous == current)
+    return len(label) + num_repeats
@@ -0,0 +1,153 @@
+import collections
+import glob
+import multiprocessing
+import os
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from trainer.backend import dataset_utils
+from trainer.backend.EncoderDecoder import EncoderDecoder
+
+FONT_EXTENSIONS = ('ttf', 'otf')
+DEFAULT_PARAMETERS = {
+    'min_font_size': 24,
+    'max_font_size': 48,
+    'min_words': 1,
+    'max_words': 6,
+    'max_padding': 0.3,
+    'max_text_gray': 96,
+    'min_background_gray': 192
+}
+
+_worker_state = {}
+
+
+def get_font_files(fonts_dir):
+    font_files = []
+    for extension in FONT_EXTENSIONS:
+        font_files.extend(glob.glob(os.path.join(fonts_dir, '*.' + extension)))
+        font_files.extend(glob.glob(os.path.join(fonts_dir, '*.' + extension.upper())))
+    return sorted(set(font_files))
+
+
+def get_synthetic_params(corpus_file, fonts_dir, ratio, seed, parameters=None):
+    font_files = get_font_files(fonts_dir)
+    if not font_files:
+        raise ValueError("No font files found in " + fonts_dir)
+    if not 0 < float(ratio) < 1:
+        raise ValueError("The synthetic data ratio must be between 0 and 1.")
+    return {
+        'corpus_file': corpus_file,
+        'font_files': font_files,
+        'ratio': float(ratio),
+        'seed': int(seed),
+        'parameters': dict(DEFAULT_PARAMETERS, **(parameters or {}))
+    }
+
+
+def read_corpus(corpus_file, charset):
+    charset = set(charset)
+    lines = []
+    with open(corpus_file, 'rb') as f:
+        for line in f:
+            words = [word for word in line.decode('utf-8').split() if set(word) <= charset]
+            if words:
+                lines.append(words)
+    if not lines:
+        raise ValueError(corpus_file + " has no text that can be written with the charset.")
+    return lines
+
+
+def create_render_pool(corpus_file, font_files, charset, desired_image_size,
+                       variable_width=False, max_image_width=None, seed=0, parameters=None,
+                       num_workers=None, chunk_size=64):
+    return multiprocessing.Pool(num_workers or multiprocessing.cpu_count(),
+                                initializer=_init_synthetic_worker,
+                                initargs=(corpus_file, font_files, charset, desired_image_size,
+                                          variable_width, max_image_width, seed,
+                                          dict(DEFAULT_PARAMETERS, **(parameters or {})), chunk_size))
+
+
+def close_render_pool(pool):
+    pool.terminate()
+    pool.join()
+
+
+def generate_examples(pool, num_workers=None):
+    num_workers = num_workers or multiprocessing.cpu_count()
+    pending = collections.deque()
+    chunk_index = 0
+    while True:
+        while len(pending) < 2 * num_workers:
+            pending.append(pool.apply_async(_render_chunk, (chunk_index,)))
+            chunk_index += 1
+        for example in pending.popleft().get():
+            yield example
+
+
+def _init_synthetic_worker(corpus_file, font_files, charset, desired_image_size,
+                           variable_width, max_image_width, seed, parameters, chunk_size):
+    encoder_decoder = EncoderDecoder()
+    encoder_decoder.initialize_encode_and_decode_maps_from(charset)
+    _worker_state['corpus'] = read_corpus(corpus_file, charset)
+    _worker_state['separator'] = ' ' if ' ' in charset else ''
+    _worker_state['encoder_decoder'] = encoder_decoder
+    _worker_state['font_files'] = font_files
+    _worker_state['fonts'] = {}
+    _worker_state['desired_image_size'] = desired_image_size
+    _worker_state['variable_width'] = variable_width
+    _worker_state['max_image_width'] = max_image_width
+    _worker_state['seed'] = seed
+    _worker_state['parameters'] = parameters
+    _worker_state['chunk_size'] = chunk_size
+
+
+def _render_chunk(chunk_index):
+    rng = np.random.RandomState((_worker_state['seed'] * 1000003 + chunk_index) % (2 ** 32))
+    examples = []
+    while len(examples) < _worker_state['chunk_size']:
+        text = _sample_text(rng)
+        image = render_text(text, _get_font(rng), rng, _worker_state['parameters'])
+        if image is None:
+            continue
+        if _worker_state['variable_width']:
+            image = dataset_utils.preprocess_line_image(image, _worker_state['desired_image_size'],
+                                                        _worker_state['max_image_width'])
+        else:
+            image = dataset_utils.preprocess_image(image, _worker_state['desired_image_size'])
+        label = np.array(_worker_state['encoder_decoder'].encode(text), dtype=np.int32)
+        examples.append((image, np.int32(image.shape[1]), label))
+    return examples
+
+
+def _sample_text(rng):
+    parameters = _worker_state['parameters']
+    words = _worker_state['corpus'][rng.randint(len(_worker_state['corpus']))]
+    num_words = min(len(words), rng.randint(parameters['min_words'], parameters['max_words'] + 1))
+    start = rng.randint(len(words) - num_words + 1)
+    return _worker_state['separator'].join(words[start:start + num_words])
+
+
+def _get_font(rng):
+    parameters = _worker_state['parameters']
+    font_file = _worker_state['font_files'][rng.randint(len(_worker_state['font_files']))]
+    font_size = rng.randint(parameters['min_font_size'], parameters['max_font_size'] + 1)
+    key = (font_file, font_size)
+    if key not in _worker_state['fonts']:
+        _worker_state['fonts'][key] = ImageFont.truetype(font_file, font_size)
+    return _worker_state['fonts'][key]
+
+
+def render_text(text, font, rng, parameters):
+    left, top, right, bottom = font.getbbox(text)
+    text_width, text_height = right - left, bottom - top
+    if text_width <= 0 or text_height <= 0:
+        return None
+    padding = [int(rng.uniform(0, parameters['max_padding']) * text_height) for _ in range(4)]
+    background = int(rng.randint(parameters['min_background_gray'], 256))
+    text_gray = int(rng.randint(0, parameters['max_text_gray'] + 1))
+    image = Image.new('L', (text_width + padding[0] + padding[2], text_height + padding[1] + padding[3]),
+                      background)
+    ImageDraw.Draw(image).text((padding[0] - left, padding[1] - top), text, font=font, fill=text_gray)
+    return np.asarray(image, dtype=np.uint8)
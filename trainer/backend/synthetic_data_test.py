@@ -0,0 +1,33 @@
+import os
+
+import numpy as np
+import tensorflow as tf
+from PIL import ImageFont
+
+from trainer.backend import synthetic_data
+
+
+class SyntheticDataTest(tf.test.TestCase):
+    def testReadCorpusDropsWordsOutsideTheCharset(self):
+        corpus_file = os.path.join(self.get_temp_dir(), 'corpus.txt')
+        with open(corpus_file, 'wb') as f:
+            f.write(u'abc abÿ\ncab\nÿ\n'.encode('utf-8'))
+        self.assertEqual(synthetic_data.read_corpus(corpus_file, 'abc'), [['abc'], ['cab']])
+
+    def testRenderTextDrawsDarkTextOnLightBackground(self):
+        rng = np.random.RandomState(0)
+        image = synthetic_data.render_text('abc', ImageFont.load_default(), rng,
+                                           synthetic_data.DEFAULT_PARAMETERS)
+        self.assertEqual(image.dtype, np.uint8)
+        self.assertEqual(image.ndim, 2)
+        self.assertGreaterEqual(image.max(), synthetic_data.DEFAULT_PARAMETERS['min_background_gray'])
+        self.assertLessEqual(image.min(), synthetic_data.DEFAULT_PARAMETERS['max_text_gray'])
+
+    def testRenderTextSkipsEmptyText(self):
+        rng = np.random.RandomState(0)
+        self.assertIsNone(synthetic_data.render_text('', ImageFont.load_default(), rng,
+                                                     synthetic_data.DEFAULT_PARAMETERS))
+
+
+if __name__ == '__main__':
+    tf.test.main()
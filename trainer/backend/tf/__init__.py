@@ -1,2 +1,12 @@
 from trainer.backend.tf.experiment_ops import train
 from trainer.backend.tf.experiment_ops import test
+from trainer.backend.tf.experiment_ops import predict
+from trainer.backend.tf.input_ops import array_input_fn
+from trainer.backend.tf.input_ops import streaming_input_fn
+from trainer.backend.tf.input_ops import tfrecord_input_fn
+from trainer.backend.tf.input_ops import synthetic_input_fn
+from trainer.backend.tf.input_ops import mixed_input_fn
+from trainer.backend.tf.input_ops import concatenated_input_fn
+from trainer.backend.tf.tfrecord_ops import convert_to_tfrecords
+from trainer.backend.tf.tfrecord_ops import append_to_tfrecords
+from trainer.backend.tf.tfrecord_ops import read_manifest as read_tfrecord_manifest
@@ -0,0 +1,94 @@
+import json
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+import tensorflow as tf
+
+from trainer.backend import network_utils
+from trainer.backend.GraphKeys import LayerTypes
+from trainer.backend.GraphKeys import Losses
+from trainer.backend.GraphKeys import Metrics
+from trainer.backend.GraphKeys import Optimizers
+from trainer.backend.tf import experiment_ops
+
+
+def benchmark_train_step(params, batch_size=16, image_size=64, max_label_length=None, num_classes=80,
+                         num_steps=20, num_warmup_steps=3, seed=0):
+    params = dict(params)
+    params.setdefault("loss", Losses.CTC.value)
+    params.setdefault("metrics", [Metrics.LABEL_ERROR_RATE.value])
+    params.setdefault("optimizer", Optimizers.ADAM.value)
+    params.setdefault("learning_rate", 0.001)
+    params["num_classes"] = num_classes
+    params["log_step_count_steps"] = num_steps
+    if max_label_length is None:
+        max_label_length = max(1, network_utils.get_output_width(params["network"], image_size) // 2)
+    rng = np.random.RandomState(seed)
+    images = rng.randint(0, 2, (batch_size, image_size, image_size, 1)).astype(np.uint8) * 255
+    labels = _create_labels(rng, batch_size, max_label_length, num_classes)
+    with tf.Graph().as_default() as graph:
+        tf.set_random_seed(seed)
+        spec = experiment_ops._train_model_fn({'features': tf.constant(images)}, tf.constant(labels),
+                                              tf.estimator.ModeKeys.TRAIN, params)
+        with tf.Session() as sess:
+            sess.run([tf.global_variables_initializer(), tf.local_variables_initializer()])
+            for _ in range(num_warmup_steps):
+                sess.run(spec.train_op)
+            step_times = []
+            for _ in range(num_steps):
+                start = time.time()
+                sess.run(spec.train_op)
+                step_times.append(time.time() - start)
+    return OrderedDict([
+        ('mean_step_seconds', float(np.mean(step_times))),
+        ('median_step_seconds', float(np.median(step_times))),
+        ('num_decoder_ops', count_ops(graph, ('CTCBeamSearchDecoder', 'CTCGreedyDecoder'))),
+        ('num_trainable_variables', len(graph.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES)))
+    ])
+
+
+def _create_labels(rng, batch_size, label_length, num_classes):
+    # Consecutive labels never repeat, so every label fits the CTC time steps without blanks in between.
+    num_labels = num_classes - 1
+    steps = np.concatenate([rng.randint(0, num_labels, (batch_size, 1)),
+                            rng.randint(1, num_labels, (batch_size, label_length - 1))], axis=1)
+    return (np.cumsum(steps, axis=1) % num_labels).astype(np.int32)
+
+
+def compare_cell_types(architecture_file, cell_types=("LSTM", "LSTMBlockFused"), **kwargs):
+    return compare_layer_options(architecture_file, "cell_type", cell_types,
+                                 (LayerTypes.BIRNN.value, LayerTypes.MDRNN.value), **kwargs)
+
+
+def compare_mdrnn_implementations(architecture_file, implementations=("sequential", "batched"), **kwargs):
+    return compare_layer_options(architecture_file, "implementation", implementations,
+                                 (LayerTypes.MDRNN.value,), **kwargs)
+
+
+def compare_layer_options(architecture_file, option, values, layer_types, **kwargs):
+    with open(architecture_file) as f:
+        params = json.load(f, object_pairs_hook=OrderedDict)
+    results = OrderedDict()
+    for value in values:
+        network = [dict(layer, **{option: value}) if layer["layer_type"] in layer_types else layer
+                   for layer in params["network"]]
+        results[value] = benchmark_train_step(dict(params, network=network), **kwargs)
+        print(option, value, dict(results[value]))
+    return results
+
+
+def count_ops(graph, op_types):
+    return sum(1 for op in graph.get_operations() if op.type in op_types)
+
+
+def benchmark_architectures(architecture_files, **kwargs):
+    results = OrderedDict()
+    for architecture_file in architecture_files:
+        with open(architecture_file) as f:
+            params = json.load(f, object_pairs_hook=OrderedDict)
+        name = os.path.splitext(os.path.basename(architecture_file))[0]
+        results[name] = benchmark_train_step(params, **kwargs)
+        print(name, dict(results[name]))
+    return results
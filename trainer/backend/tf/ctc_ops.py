@@ -1,15 +1,219 @@
+import numpy as np
 import tensorflow as tf
 from tensorflow.contrib import slim
+from tensorflow.python.framework import tensor_shape
 
+from trainer.backend import decoder_tables
 
-def ctc_beam_search_decoder(inputs, sequence_length):
-    decoded, log_probabilities = tf.nn.ctc_beam_search_decoder(inputs, sequence_length)
+
+DEFAULT_BEAM_WIDTH = 100
+DEFAULT_CONSTRAINED_BEAM_WIDTH = 16
+_NEG_LOG_PROBABILITY = -1e10
+
+
+def ctc_beam_search_decoder(inputs, sequence_length, beam_width=DEFAULT_BEAM_WIDTH):
+    decoded, log_probabilities = tf.nn.ctc_beam_search_decoder(inputs, sequence_length,
+                                                               beam_width=beam_width,
+                                                               top_paths=1)
     return decoded[0], log_probabilities
 
 
+def ctc_greedy_decoder(inputs, sequence_length):
+    decoded, negative_sum_logits = tf.nn.ctc_greedy_decoder(inputs, sequence_length)
+    return decoded[0], negative_sum_logits
+
+
 def convert_to_ctc_dims(inputs, num_classes, num_steps, num_outputs):
     outputs = tf.reshape(inputs, [-1, num_outputs])
     logits = slim.fully_connected(outputs, num_classes)
-    logits = tf.reshape(logits, [-1, num_steps, num_classes])
+    if tensor_shape.as_dimension(num_steps).value is None:
+        logits = tf.reshape(logits, [tf.shape(inputs)[0], -1, num_classes])
+    else:
+        logits = tf.reshape(logits, [-1, num_steps, num_classes])
     logits = tf.transpose(logits, (1, 0, 2))
     return logits
+
+
+def ctc_constrained_beam_search_decoder(inputs, sequence_length, tables,
+                                        beam_width=DEFAULT_CONSTRAINED_BEAM_WIDTH,
+                                        lm_weight=0.5, insertion_bonus=0.0):
+    log_probs = tf.nn.log_softmax(inputs)
+    num_characters = inputs.get_shape()[-1].value - 1
+    num_steps = tf.shape(log_probs)[0]
+    batch_size = tf.shape(log_probs)[1]
+    lm_order = int(tables['lm_order'])
+    has_lexicon = bool(tables['has_lexicon'])
+    positions = tf.range(num_steps)
+    characters = tf.range(num_characters)
+    word_ends = tf.constant(tables['word_ends'])
+
+    def _gather_beams(values, beam_indices):
+        batch_indices = tf.tile(tf.range(batch_size)[:, None], [1, beam_width])
+        return tf.gather_nd(values, tf.stack([batch_indices, beam_indices], axis=-1))
+
+    def _step(step, prefixes, lengths, p_blank, p_nonblank, lm_scores, nodes, contexts):
+        step_log_probs = log_probs[step]
+        blank_log_probs = step_log_probs[:, num_characters:]
+        char_log_probs = step_log_probs[:, None, :num_characters]
+        last_chars = tf.where(lengths > 0,
+                              tf.reduce_sum(prefixes * tf.one_hot(lengths - 1, num_steps, dtype=tf.int32), -1),
+                              -tf.ones_like(lengths))
+        last_one_hot = tf.one_hot(last_chars, num_characters)
+        p_total = _logaddexp(p_blank, p_nonblank)
+        neg_beams = tf.fill(tf.shape(p_total), _NEG_LOG_PROBABILITY)
+        neg_candidates = tf.fill(tf.shape(last_one_hot), _NEG_LOG_PROBABILITY)
+
+        stay_p_blank = p_total + blank_log_probs
+        stay_p_nonblank = tf.where(lengths > 0,
+                                   p_nonblank + tf.reduce_sum(last_one_hot * char_log_probs, -1),
+                                   neg_beams)
+        extend_p_nonblank = tf.where(tf.cast(last_one_hot, tf.bool),
+                                     p_blank[:, :, None] + char_log_probs,
+                                     p_total[:, :, None] + char_log_probs)
+        allowed, next_nodes = _get_lexicon_transitions(tables, nodes, characters, word_ends, has_lexicon)
+        extend_p_nonblank = tf.where(allowed, extend_p_nonblank, neg_candidates)
+        extend_lm_scores = lm_scores[:, :, None] + _get_lm_log_probs(tables, contexts, characters, lm_order)
+
+        extends_to = _get_extension_matches(prefixes, lengths, positions, p_total)
+        merged_log_probs = tf.matmul(extend_p_nonblank, last_one_hot, transpose_b=True)
+        merged_log_probs = tf.where(extends_to, merged_log_probs, tf.fill(tf.shape(merged_log_probs),
+                                                                         _NEG_LOG_PROBABILITY))
+        stay_p_nonblank = _logaddexp(stay_p_nonblank, tf.reduce_logsumexp(merged_log_probs, axis=1))
+        is_merged = tf.greater(tf.matmul(tf.to_float(extends_to), last_one_hot), 0)
+        extend_p_nonblank = tf.where(is_merged, neg_candidates, extend_p_nonblank)
+
+        float_lengths = tf.to_float(lengths)
+        stay_scores = _logaddexp(stay_p_blank, stay_p_nonblank) + lm_weight * lm_scores \
+            + insertion_bonus * float_lengths
+        extend_scores = extend_p_nonblank + lm_weight * extend_lm_scores \
+            + insertion_bonus * (float_lengths[:, :, None] + 1)
+        candidate_scores = tf.concat([stay_scores,
+                                      tf.reshape(extend_scores, [batch_size, beam_width * num_characters])], 1)
+        _, indices = tf.nn.top_k(candidate_scores, k=beam_width)
+        is_extension = indices >= beam_width
+        extension_indices = tf.maximum(indices - beam_width, 0)
+        parents = tf.where(is_extension, extension_indices // num_characters, indices)
+        chars = tf.where(is_extension, extension_indices % num_characters, -tf.ones_like(indices))
+
+        def _gather_extensions(values):
+            return _gather_beams(tf.reshape(values, [batch_size, beam_width * num_characters]), extension_indices)
+
+        parent_lengths = _gather_beams(lengths, parents)
+        new_prefixes = _gather_beams(prefixes, parents)
+        is_written = tf.logical_and(tf.equal(positions[None, None, :], parent_lengths[:, :, None]),
+                                    is_extension[:, :, None])
+        new_prefixes = tf.where(is_written, tf.zeros_like(new_prefixes) + chars[:, :, None], new_prefixes)
+        new_lengths = parent_lengths + tf.to_int32(is_extension)
+        new_p_blank = tf.where(is_extension, neg_beams, _gather_beams(stay_p_blank, parents))
+        new_p_nonblank = tf.where(is_extension, _gather_extensions(extend_p_nonblank),
+                                  _gather_beams(stay_p_nonblank, parents))
+        new_lm_scores = tf.where(is_extension, _gather_extensions(extend_lm_scores),
+                                 _gather_beams(lm_scores, parents))
+        new_nodes = tf.where(is_extension, _gather_extensions(next_nodes), _gather_beams(nodes, parents))
+        new_contexts = contexts
+        if lm_order > 1:
+            new_contexts = _gather_beams(contexts, parents)
+            new_contexts = tf.where(tf.tile(is_extension[:, :, None], [1, 1, lm_order - 1]),
+                                    tf.concat([new_contexts[:, :, 1:], chars[:, :, None]], -1),
+                                    new_contexts)
+
+        is_active = step < sequence_length
+        new_state = [new_prefixes, new_lengths, new_p_blank, new_p_nonblank, new_lm_scores, new_nodes,
+                     new_contexts]
+        old_state = [prefixes, lengths, p_blank, p_nonblank, lm_scores, nodes, contexts]
+        return [step + 1] + [tf.where(is_active, new, old) for new, old in zip(new_state, old_state)]
+
+    initial_state = [
+        tf.constant(0),
+        -tf.ones([batch_size, beam_width, num_steps], dtype=tf.int32),
+        tf.zeros([batch_size, beam_width], dtype=tf.int32),
+        tf.tile(tf.constant([[0.0] + [_NEG_LOG_PROBABILITY] * (beam_width - 1)]), [batch_size, 1]),
+        tf.fill([batch_size, beam_width], _NEG_LOG_PROBABILITY),
+        tf.zeros([batch_size, beam_width]),
+        tf.zeros([batch_size, beam_width], dtype=tf.int32),
+        tf.fill([batch_size, beam_width, lm_order - 1], num_characters)
+    ]
+    _, prefixes, lengths, p_blank, p_nonblank, lm_scores, nodes, _ = tf.while_loop(
+        lambda step, *state: step < num_steps, _step, initial_state, back_prop=False)
+
+    scores = _logaddexp(p_blank, p_nonblank) + lm_weight * lm_scores + insertion_bonus * tf.to_float(lengths)
+    if has_lexicon:
+        is_complete = tf.logical_or(tf.gather(word_ends, nodes), tf.equal(lengths, 0))
+        scores = tf.where(is_complete, scores, scores + _NEG_LOG_PROBABILITY)
+    best_beams = tf.argmax(scores, 1, output_type=tf.int32)
+    batch_indices = tf.range(batch_size)
+    best_prefixes = tf.gather_nd(prefixes, tf.stack([batch_indices, best_beams], axis=-1))
+    best_scores = tf.gather_nd(scores, tf.stack([batch_indices, best_beams], axis=-1))
+    max_length = tf.reduce_max(tf.gather_nd(lengths, tf.stack([batch_indices, best_beams], axis=-1)))
+    best_prefixes = best_prefixes[:, :max_length]
+    indices = tf.where(best_prefixes >= 0)
+    decoded = tf.SparseTensor(indices, tf.to_int64(tf.gather_nd(best_prefixes, indices)),
+                              tf.to_int64(tf.stack([batch_size, max_length])))
+    return decoded, best_scores
+
+
+def _logaddexp(a, b):
+    maximum = tf.maximum(a, b)
+    return maximum + tf.log(tf.exp(a - maximum) + tf.exp(b - maximum))
+
+
+def _get_extension_matches(prefixes, lengths, positions, p_total):
+    is_compared = positions[None, None, None, :] < lengths[:, :, None, None]
+    is_same_position = tf.equal(prefixes[:, :, None, :], prefixes[:, None, :, :])
+    is_same_prefix = tf.reduce_all(tf.logical_or(is_same_position, tf.logical_not(is_compared)), -1)
+    is_one_longer = tf.equal(lengths[:, None, :], lengths[:, :, None] + 1)
+    is_alive = tf.greater(p_total, _NEG_LOG_PROBABILITY / 2)[:, None, :]
+    return tf.logical_and(tf.logical_and(is_same_prefix, is_one_longer), is_alive)
+
+
+def _get_lexicon_transitions(tables, nodes, characters, word_ends, has_lexicon):
+    num_characters = len(tables['unigram_log_probs'])
+    character_grid = tf.zeros_like(nodes)[:, :, None] + characters
+    if not has_lexicon:
+        return tf.ones_like(character_grid, dtype=tf.bool), tf.zeros_like(character_grid)
+    node_keys = tf.to_int64(nodes)[:, :, None] * num_characters + tf.to_int64(character_grid)
+    children = _sorted_lookup(tables['trie_keys'], tables['trie_values'], node_keys, -1)
+    allowed = children >= 0
+    space_id = int(tables['space_id'])
+    if space_id < 0:
+        return allowed, children
+    is_space = tf.equal(character_grid, space_id)
+    is_word_end = tf.logical_and(tf.gather(word_ends, nodes)[:, :, None], is_space)
+    allowed = tf.logical_or(tf.logical_and(allowed, tf.logical_not(is_space)), is_word_end)
+    return allowed, tf.where(is_space, tf.zeros_like(children), children)
+
+
+def _get_lm_log_probs(tables, contexts, characters, lm_order):
+    num_characters = len(tables['unigram_log_probs'])
+    base = num_characters + 1
+    context_shape = tf.shape(contexts)
+    log_probs = tf.zeros(tf.stack([context_shape[0], context_shape[1], 1])) + tf.constant(tables['unigram_log_probs'])
+    for order in range(2, lm_order + 1):
+        context_keys = tf.zeros_like(tf.to_int64(contexts[:, :, 0]))
+        for position in range(lm_order - order + 1, lm_order):
+            context_keys = context_keys * base + tf.to_int64(contexts[:, :, position - 1])
+        keys = context_keys[:, :, None] * base + tf.to_int64(characters)
+        ngram_log_probs = _sorted_lookup(tables['lm_keys_{}'.format(order)],
+                                         tables['lm_values_{}'.format(order)], keys, 1.0)
+        log_probs = tf.where(ngram_log_probs <= 0, ngram_log_probs,
+                             log_probs + decoder_tables.BACKOFF_LOG_PROBABILITY)
+    return log_probs
+
+
+def _sorted_lookup(sorted_keys, values, queries, default_value):
+    num_keys = len(sorted_keys)
+    default_values = tf.fill(tf.shape(queries), tf.constant(default_value, dtype=tf.as_dtype(values.dtype)))
+    if num_keys == 0:
+        return default_values
+    keys = tf.constant(sorted_keys)
+    low = tf.zeros_like(queries, dtype=tf.int32)
+    high = tf.fill(tf.shape(queries), num_keys)
+    for _ in range(int(np.ceil(np.log2(num_keys + 1)))):
+        middle = (low + high) // 2
+        is_right = tf.logical_and(tf.less(tf.gather(keys, tf.minimum(middle, num_keys - 1)), queries),
+                                  tf.less(low, high))
+        low = tf.where(is_right, middle + 1, low)
+        high = tf.where(is_right, high, tf.minimum(middle, high))
+    index = tf.minimum(low, num_keys - 1)
+    is_found = tf.equal(tf.gather(keys, index), queries)
+    return tf.where(is_found, tf.gather(tf.constant(values), index), default_values)
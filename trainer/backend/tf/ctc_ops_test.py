@@ -0,0 +1,56 @@
+import numpy as np
+import tensorflow as tf
+
+from trainer.backend import decoder_tables
+from trainer.backend.tf import ctc_ops
+
+_CHARSET = 'ab c'
+
+
+def _create_logits(paths, num_classes=len(_CHARSET) + 1):
+    logits = np.zeros((len(paths[0]), len(paths), num_classes), dtype=np.float32)
+    for batch_index, path in enumerate(paths):
+        for step, class_scores in enumerate(path):
+            logits[step, batch_index] = class_scores
+    return tf.constant(logits)
+
+
+class CtcConstrainedBeamSearchDecoderTest(tf.test.TestCase):
+    def testUnconstrainedDecodingCollapsesRepeatsAndBlanks(self):
+        tables = decoder_tables.build_decoder_tables(_CHARSET, lines=['ab'], lm_order=2)
+        logits = _create_logits([[[5, 0, 0, 0, 0], [5, 0, 0, 0, 0], [0, 0, 0, 0, 5], [5, 0, 0, 0, 0]]])
+        decoded, _ = ctc_ops.ctc_constrained_beam_search_decoder(logits, tf.constant([4]), tables,
+                                                                 beam_width=8, lm_weight=0.0)
+        with self.test_session():
+            self.assertAllEqual(tf.sparse_tensor_to_dense(decoded, default_value=-1).eval(), [[0, 0]])
+
+    def testLexiconRejectsWordsItDoesNotContain(self):
+        tables = decoder_tables.build_decoder_tables(_CHARSET, words=['ab', 'ca'], lm_order=2)
+        logits = _create_logits([[[3, 0, 0, 0, 0], [0, 1.5, 0, 2, 0]],
+                                 [[0, 0, 0, 3, 0], [3, 0, 0, 0, 0]]])
+        decoded, _ = ctc_ops.ctc_constrained_beam_search_decoder(logits, tf.constant([2, 2]), tables,
+                                                                 beam_width=8, lm_weight=0.0)
+        with self.test_session():
+            self.assertAllEqual(tf.sparse_tensor_to_dense(decoded, default_value=-1).eval(), [[0, 1], [3, 0]])
+
+    def testDecodingStopsAtTheSequenceLength(self):
+        tables = decoder_tables.build_decoder_tables(_CHARSET, lines=['ab'], lm_order=3)
+        logits = _create_logits([[[5, 0, 0, 0, 0], [0, 5, 0, 0, 0], [0, 0, 0, 5, 0]]])
+        decoded, _ = ctc_ops.ctc_constrained_beam_search_decoder(logits, tf.constant([2]), tables,
+                                                                 beam_width=4, lm_weight=0.5)
+        with self.test_session():
+            self.assertAllEqual(tf.sparse_tensor_to_dense(decoded, default_value=-1).eval(), [[0, 1]])
+
+    def testTablesAreCachedOnDisk(self):
+        lexicon_file = self.get_temp_dir() + '/lexicon.txt'
+        with open(lexicon_file, 'w') as f:
+            f.write('ab\nca\n')
+        tables = decoder_tables.get_decoder_tables(_CHARSET, lexicon_file=lexicon_file)
+        cached_tables = decoder_tables.get_decoder_tables(_CHARSET, lexicon_file=lexicon_file)
+        self.assertEqual(sorted(tables), sorted(cached_tables))
+        self.assertAllEqual(tables['trie_keys'], cached_tables['trie_keys'])
+        self.assertAllEqual(np.nonzero(tables['word_ends'])[0], [2, 4])
+
+
+if __name__ == '__main__':
+    tf.test.main()
@@ -1,4 +1,3 @@
-import numpy as np
 import tensorflow as tf
 import logging
 
@@ -10,9 +9,11 @@ from trainer.backend.GraphKeys import OutputLayers
 from trainer.backend.GraphKeys import Metrics
 from trainer.backend.GraphKeys import Losses
 
+from trainer.backend import decoder_tables
+from trainer.backend.dataset_utils import get_characters_from
 from trainer.backend.tf import ctc_ops, losses, metric_functions
 from trainer.backend.tf.replicate_model_fn import TowerOptimizer
-from trainer.backend.tf.util_ops import feed, dense_to_sparse, get_sequence_lengths
+from trainer.backend.tf.util_ops import feed, dense_to_sparse, get_input_sequence_lengths, get_layer_sequence_lengths
 from trainer.backend.tf.ValidationHook import ValidationHook
 
 from tensorflow.contrib import slim
@@ -21,16 +22,11 @@ from tensorflow.contrib.opt import NadamOptimizer
 tf.logging.set_verbosity(tf.logging.INFO)
 
 
-def _get_loss(loss, labels, inputs, num_classes):
+def _get_loss(loss, labels, logits, sequence_lengths):
     if loss == Losses.CTC.value:
-        ctc_inputs = ctc_ops.convert_to_ctc_dims(inputs,
-                                                 num_classes=num_classes,
-                                                 num_steps=inputs.shape[1],
-                                                 num_outputs=inputs.shape[-1])
-        labels = dense_to_sparse(labels, token_to_ignore=-1)
         return losses.ctc_loss(labels=labels,
-                               inputs=ctc_inputs,
-                               sequence_length=get_sequence_lengths(inputs))
+                               inputs=logits,
+                               sequence_length=sequence_lengths)
     raise NotImplementedError(loss + " loss not implemented")
 
 
@@ -57,14 +53,15 @@ def _get_optimizer(learning_rate, optimizer_name):
     raise NotImplementedError(optimizer_name + " optimizer not supported")
 
 
-def train(params, features, labels, num_classes, checkpoint_dir,
-          batch_size=1, num_epochs=1,
+def train(params, train_input_fn, num_train_examples, num_classes, checkpoint_dir,
+          validation_input_fn=None, batch_size=1, num_epochs=1,
           save_checkpoint_every_n_epochs=1):
     _set_logger_to_file(checkpoint_dir, 'train')
-    num_steps_per_epoch = len(features['train']) // batch_size
+    num_steps_per_epoch = num_train_examples // batch_size
     save_checkpoint_steps = save_checkpoint_every_n_epochs * num_steps_per_epoch
     params['num_classes'] = num_classes
     params['log_step_count_steps'] = num_steps_per_epoch
+    params['summary_dir'] = checkpoint_dir
     training_hooks = []
     estimator = tf.estimator.Estimator(model_fn=_train_model_fn,
                                        params=params,
@@ -74,34 +71,26 @@ def train(params, features, labels, num_classes, checkpoint_dir,
                                            log_step_count_steps=num_steps_per_epoch,
                                            save_summary_steps=num_steps_per_epoch
                                        ))
-    if features.get('validation'):
+    if validation_input_fn:
         training_hooks.append(ValidationHook(
             model_fn=_eval_model_fn,
             params=params,
-            input_fn=_input_fn(features['validation'],
-                               labels['validation'],
-                               batch_size,
-                               num_epochs=1,
-                               shuffle=False),
+            input_fn=validation_input_fn,
             checkpoint_dir=checkpoint_dir,
             every_n_steps=save_checkpoint_steps
         ))
-    estimator.train(input_fn=_input_fn(features['train'], labels['train'], batch_size),
+    estimator.train(input_fn=train_input_fn,
                     steps=num_epochs * num_steps_per_epoch,
                     hooks=training_hooks)
 
 
-def test(params, features, labels, checkpoint_dir):
+def test(params, input_fn, checkpoint_dir):
     _set_logger_to_file(checkpoint_dir, 'test')
     params['summary_dir'] = checkpoint_dir + '/test'
     estimator = tf.estimator.Estimator(model_fn=_test_model_fn,
                                        params=params,
                                        model_dir=checkpoint_dir)
-    estimator.evaluate(input_fn=_input_fn(features,
-                                          labels,
-                                          batch_size=params['batch_size'],
-                                          num_epochs=1,
-                                          shuffle=False))
+    estimator.evaluate(input_fn=input_fn)
 
 
 # see https://stackoverflow.com/a/44296581
@@ -117,27 +106,15 @@ def _set_logger_to_file(checkpoint_dir, task):
     log.addHandler(fh)
 
 
-def predict(params, features, checkpoint_dir):
-    estimator = tf.estimator.Estimator(model_fn=_predict_model_fn,
-                                       params=params,
+def predict(params, input_fn, checkpoint_dir):
+    estimator = tf.estimator.Estimator(model_fn=_serving_model_fn,
+                                       params=dict(params, input_name="features"),
                                        model_dir=checkpoint_dir)
-    predictions = estimator.predict(input_fn=_input_fn(features, num_epochs=1))
+    predictions = estimator.predict(input_fn=input_fn)
     for i, p in enumerate(predictions):
         print(i, p)
 
 
-def _input_fn(features, labels=None, batch_size=1, num_epochs=None, shuffle=True):
-    if labels:
-        labels = np.array(labels, dtype=np.int32)
-    return tf.estimator.inputs.numpy_input_fn(
-        x={'features': np.array(features)},
-        y=labels,
-        batch_size=batch_size,
-        num_epochs=num_epochs,
-        shuffle=shuffle
-    )
-
-
 def _add_to_summary(name, value):
     tf.summary.scalar(name, value)
 
@@ -161,28 +138,47 @@ def _create_model_fn(mode, predictions, loss=None, train_op=None,
                                       export_outputs=export_outputs)
 
 
-def _get_output(rnn_outputs, output_layer, num_classes):
+def _get_logits(network_outputs, num_classes):
+    return ctc_ops.convert_to_ctc_dims(network_outputs,
+                                       num_classes=num_classes,
+                                       num_steps=network_outputs.shape[1],
+                                       num_outputs=network_outputs.shape[-1])
+
+
+def _decode(logits, output_layer, sequence_lengths, params):
+    beam_width = params.get("beam_width") or ctc_ops.DEFAULT_BEAM_WIDTH
     if output_layer == OutputLayers.CTC_DECODER.value:
-        ctc_inputs = ctc_ops.convert_to_ctc_dims(rnn_outputs,
-                                                 num_classes=num_classes,
-                                                 num_steps=rnn_outputs.shape[1],
-                                                 num_outputs=rnn_outputs.shape[-1])
-        decoded, _ = ctc_ops.ctc_beam_search_decoder(ctc_inputs, get_sequence_lengths(rnn_outputs))
-        return _sparse_to_dense(decoded, name="output")
+        decoded, _ = ctc_ops.ctc_beam_search_decoder(logits, sequence_lengths, beam_width=beam_width)
+        return decoded
+    if output_layer == OutputLayers.CTC_GREEDY_DECODER.value:
+        decoded, _ = ctc_ops.ctc_greedy_decoder(logits, sequence_lengths)
+        return decoded
+    if output_layer == OutputLayers.CTC_CONSTRAINED_DECODER.value:
+        options = params.get("constrained_decoder") or {}
+        tables = decoder_tables.get_decoder_tables(get_characters_from(params["charset_file"]),
+                                                   lexicon_file=options.get("lexicon_file"),
+                                                   corpus_file=options.get("corpus_file"),
+                                                   lm_order=options.get("lm_order", 3))
+        decoded, _ = ctc_ops.ctc_constrained_beam_search_decoder(
+            logits, sequence_lengths, tables,
+            beam_width=options.get("beam_width") or ctc_ops.DEFAULT_CONSTRAINED_BEAM_WIDTH,
+            lm_weight=options.get("lm_weight", 0.5),
+            insertion_bonus=options.get("insertion_bonus", 0.0))
+        return decoded
     raise NotImplementedError(output_layer + " not implemented")
 
 
-def _get_metrics(metrics, y_pred, y_true, num_classes):
+def _get_output_layer(mode, params):
+    if mode == tf.estimator.ModeKeys.TRAIN:
+        return params.get("train_output_layer") or OutputLayers.CTC_GREEDY_DECODER.value
+    return params["output_layer"]
+
+
+def _get_metrics(metrics, decoded, y_true):
     metrics_dict = {}
     for metric in metrics:
         if metric == Metrics.LABEL_ERROR_RATE.value:
-            ctc_inputs = ctc_ops.convert_to_ctc_dims(y_pred,
-                                                     num_classes=num_classes,
-                                                     num_steps=y_pred.shape[1],
-                                                     num_outputs=y_pred.shape[-1])
-            y_pred, _ = ctc_ops.ctc_beam_search_decoder(ctc_inputs, get_sequence_lengths(y_pred))
-            y_true = dense_to_sparse(y_true, token_to_ignore=-1)
-            value = metric_functions.label_error_rate(y_pred,
+            value = metric_functions.label_error_rate(decoded,
                                                       y_true,
                                                       metric)
         else:
@@ -197,7 +193,7 @@ def create_serving_model(checkpoint_dir, run_params, input_name="features"):
 
 
 def _export_serving_model(checkpoint_dir, model_params, input_name="features"):
-    model_params["input_name"] = input_name
+    model_params = dict(model_params, input_name=input_name)
     checkpoint = tf.train.get_checkpoint_state(checkpoint_dir)
     input_checkpoint = checkpoint.model_checkpoint_path
     with tf.Session(graph=tf.Graph()) as sess:
@@ -251,10 +247,11 @@ def _serving_model_fn(features, mode, params):
 
 
 def _predict_model_fn(features, mode, params):
-    features = _network_fn(features, mode, params)
-    outputs = _get_output(features, params["output_layer"], params["num_classes"])
+    features, sequence_lengths = _network_fn(features, mode, params)
+    logits = _get_logits(features, params["num_classes"])
+    decoded = _decode(logits, params["output_layer"], sequence_lengths, params)
     predictions = {
-        "outputs": outputs
+        "outputs": _sparse_to_dense(decoded, name="output")
     }
 
     return _create_model_fn(mode, predictions=predictions,
@@ -294,13 +291,27 @@ def _train_model_fn(features, labels, mode, params):
                                 learning_rate=params["learning_rate"],
                                 optimizer=params["optimizer"])
 
+    metrics_every_n_steps = params.get("metrics_every_n_steps") or params["log_step_count_steps"]
     training_hooks = []
+    if params.get("data_sources") and 'source_ids' in features:
+        count_op, source_counts = _count_source_samples(features['source_ids'], params["data_sources"])
+        with tf.control_dependencies([count_op]):
+            train_op = tf.identity(train_op)
+        training_hooks.append(tf.train.LoggingTensorHook(source_counts,
+                                                         every_n_iter=params["log_step_count_steps"]))
+    summary_dir = params.get("summary_dir")
+    metric_summaries = []
     for metric_key in metrics:
-        _add_to_summary(metric_key, metrics[metric_key])
+        metric_summaries.append(tf.summary.scalar(metric_key, metrics[metric_key],
+                                                  collections=[] if summary_dir else None))
         training_hooks.append(tf.train.LoggingTensorHook(
             {metric_key: metric_key},
-            every_n_iter=params["log_step_count_steps"])
+            every_n_iter=metrics_every_n_steps)
         )
+    if summary_dir and metric_summaries:
+        training_hooks.append(tf.train.SummarySaverHook(save_steps=metrics_every_n_steps,
+                                                        output_dir=params["summary_dir"],
+                                                        summary_op=tf.summary.merge(metric_summaries)))
     return _create_model_fn(mode,
                             predictions=predictions,
                             loss=loss,
@@ -308,36 +319,65 @@ def _train_model_fn(features, labels, mode, params):
                             training_hooks=training_hooks)
 
 
+def _count_source_samples(source_ids, source_names):
+    counts = tf.get_variable("source_sample_counts",
+                             shape=[len(source_names)],
+                             dtype=tf.int64,
+                             initializer=tf.zeros_initializer(),
+                             trainable=False)
+    batch_counts = tf.bincount(source_ids, minlength=len(source_names), maxlength=len(source_names),
+                               dtype=tf.int64)
+    count_op = tf.assign_add(counts, batch_counts)
+    source_counts = {}
+    for source_id, source_name in enumerate(source_names):
+        source_counts["source_samples/" + source_name] = counts[source_id]
+        _add_to_summary("source_samples/" + source_name, counts[source_id])
+    return count_op, source_counts
+
+
 def _get_evaluation_parameters(features, labels, mode, params):
-    features, predictions = _get_fed_features_and_resulting_predictions(features, mode, params)
+    logits, sequence_lengths, decoded = _get_logits_and_decoded_outputs(features, mode, params)
+    labels = _to_sparse_labels(labels)
     loss = _get_loss(params["loss"], labels=labels,
-                     inputs=features, num_classes=params["num_classes"])
+                     logits=logits,
+                     sequence_lengths=sequence_lengths)
     metrics = _get_metrics(params["metrics"],
-                           y_pred=features,
-                           y_true=labels,
-                           num_classes=params["num_classes"])
+                           decoded=decoded,
+                           y_true=labels)
+    predictions = {
+        "outputs": _sparse_to_dense(decoded, name="output")
+    }
     return loss, metrics, predictions
 
 
-def _get_fed_features_and_resulting_predictions(features, mode, params):
-    features = features['features']
-    features = _network_fn(features, mode, params)
-    outputs = _get_output(features, params["output_layer"], params["num_classes"])
-    predictions = {
-        "outputs": outputs
-    }
-    return features, predictions
+def _to_sparse_labels(labels):
+    if isinstance(labels, tf.SparseTensor):
+        return labels
+    return dense_to_sparse(labels, token_to_ignore=-1)
+
+
+def _get_logits_and_decoded_outputs(features, mode, params):
+    features, sequence_lengths = _network_fn(features['features'], mode, params, features.get('image_widths'))
+    logits = _get_logits(features, params["num_classes"])
+    decoded = _decode(logits, _get_output_layer(mode, params), sequence_lengths, params)
+    return logits, sequence_lengths, decoded
 
 
-def _network_fn(features, mode, params):
+def _network_fn(features, mode, params, image_widths=None):
     features = _set_dynamic_batch_size(features)
+    sequence_lengths = get_input_sequence_lengths(features, image_widths)
     for layer in params["network"]:
-        features = feed(features, layer, is_training=mode == tf.estimator.ModeKeys.TRAIN)
-    return features
+        features = feed(features, layer, is_training=mode == tf.estimator.ModeKeys.TRAIN,
+                        sequence_lengths=sequence_lengths)
+        sequence_lengths = get_layer_sequence_lengths(layer, sequence_lengths, features)
+    return features, sequence_lengths
 
 
 def _set_dynamic_batch_size(inputs):
+    inputs = tf.to_float(inputs)
     new_shape = inputs.get_shape().as_list()
     new_shape[0] = -1
+    if None in new_shape:
+        return tf.identity(inputs, name="input_layer")
     inputs = tf.reshape(inputs, new_shape, name="input_layer")
     return inputs
@@ -0,0 +1,54 @@
+import numpy as np
+import tensorflow as tf
+
+from trainer.backend.tf import experiment_ops
+from trainer.backend.tf.benchmark_ops import count_ops
+
+_PARAMS = {
+    "network": [
+        {"layer_type": "conv2d", "num_filters": 4, "kernel_size": 3, "padding": "same"},
+        {"layer_type": "max_pool2d", "pool_size": 2, "stride": 2, "padding": "valid"},
+        {"layer_type": "collapse_to_rnn_dims"},
+        {"layer_type": "birnn", "num_hidden": 8, "cell_type": "LSTM"}
+    ],
+    "output_layer": "ctc_decoder",
+    "loss": "ctc",
+    "metrics": ["label_error_rate"],
+    "optimizer": "adam",
+    "learning_rate": 0.001,
+    "num_classes": 10,
+    "log_step_count_steps": 1
+}
+
+
+def _create_inputs():
+    images = tf.constant(np.zeros((2, 16, 16, 1), dtype=np.uint8))
+    labels = tf.constant([[1, 2, -1], [3, 4, 5]], dtype=tf.int32)
+    return {'features': images}, labels
+
+
+class TrainModelFnTest(tf.test.TestCase):
+    def testLossMetricsAndPredictionsShareOneHead(self):
+        features, labels = _create_inputs()
+        experiment_ops._train_model_fn(features, labels, tf.estimator.ModeKeys.TRAIN, dict(_PARAMS))
+        graph = tf.get_default_graph()
+        self.assertEqual(count_ops(graph, ('CTCBeamSearchDecoder', 'CTCGreedyDecoder')), 1)
+        projection_variables = [variable for variable in tf.trainable_variables()
+                                if variable.op.name.startswith('fully_connected')]
+        self.assertEqual(len(projection_variables), 2)
+
+    def testTrainingMetricsUseTheGreedyDecoder(self):
+        features, labels = _create_inputs()
+        experiment_ops._train_model_fn(features, labels, tf.estimator.ModeKeys.TRAIN, dict(_PARAMS))
+        graph = tf.get_default_graph()
+        self.assertEqual(count_ops(graph, ('CTCGreedyDecoder',)), 1)
+        self.assertEqual(count_ops(graph, ('CTCBeamSearchDecoder',)), 0)
+
+    def testEvaluationUsesTheOutputLayerDecoder(self):
+        features, labels = _create_inputs()
+        experiment_ops._eval_model_fn(features, labels, tf.estimator.ModeKeys.EVAL, dict(_PARAMS, beam_width=4))
+        self.assertEqual(count_ops(tf.get_default_graph(), ('CTCBeamSearchDecoder',)), 1)
+
+
+if __name__ == '__main__':
+    tf.test.main()
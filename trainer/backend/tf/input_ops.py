@@ -0,0 +1,397 @@
+import multiprocessing
+
+import numpy as np
+import tensorflow as tf
+
+from trainer.backend import augmentation as image_augmentation
+from trainer.backend import dataset_split
+from trainer.backend import dataset_utils
+from trainer.backend import synthetic_data
+from trainer.backend.EncoderDecoder import EncoderDecoder
+from trainer.backend.GraphKeys import BatchBuckets
+from trainer.backend.tf import tfrecord_ops
+from trainer.backend.tf.util_ops import padded_ragged_to_sparse, ragged_to_sparse, unpack_bits
+
+_INDEX_BLOCK_SIZE = 1024
+
+
+def array_input_fn(images, labels, batch_size=1, num_epochs=None, shuffle=True,
+                   packed_image_width=None, indices=None, bucket_by=None, label_bucket_boundaries=None,
+                   augmentation=None, num_parallel_calls=None, prefetch_buffer_size=2):
+    label_values, label_lengths = labels
+    label_lengths = np.asarray(label_lengths, dtype=np.int32)
+    label_offsets = dataset_utils.get_label_offsets(label_lengths)
+    if indices is None:
+        indices = np.arange(len(label_lengths))
+    images_shape = list(images.shape[1:])
+    bucket_key_fn = _create_bucket_key_fn(bucket_by,
+                                          lambda index, label_length: label_length,
+                                          label_bucket_boundaries=label_bucket_boundaries)
+
+    def _generate_index_blocks():
+        epoch = 0
+        while num_epochs is None or epoch < num_epochs:
+            epoch_indices = np.random.permutation(indices) if shuffle else indices
+            for start in range(0, len(epoch_indices), _INDEX_BLOCK_SIZE):
+                block = epoch_indices[start:start + _INDEX_BLOCK_SIZE]
+                yield block, label_lengths[block]
+            epoch += 1
+
+    def _gather(indices):
+        batch_label_values, batch_label_lengths = dataset_utils.gather_labels(label_values, label_offsets, indices)
+        return np.asarray(images[indices]), batch_label_values, batch_label_lengths
+
+    def _gather_batch(indices, _):
+        batch_images, batch_label_values, batch_label_lengths = tf.py_func(_gather, [indices],
+                                                                           [tf.uint8, tf.int32, tf.int32],
+                                                                           stateful=False)
+        batch_images.set_shape([None] + images_shape)
+        batch_label_values.set_shape([None])
+        batch_label_lengths.set_shape([None])
+        if packed_image_width:
+            batch_images = unpack_bits(batch_images, packed_image_width)
+        return {'features': batch_images}, ragged_to_sparse(batch_label_values, batch_label_lengths)
+
+    def _create_dataset():
+        dataset = tf.data.Dataset.from_generator(_generate_index_blocks,
+                                                 (tf.int64, tf.int32),
+                                                 (tf.TensorShape([None]), tf.TensorShape([None])))
+        dataset = dataset.apply(tf.contrib.data.unbatch())
+        dataset = _bucketed_batch(dataset, batch_size, lambda window: window.batch(batch_size),
+                                  bucket_key_fn)
+        dataset = dataset.map(_gather_batch)
+        return _augment_batches(dataset, augmentation, num_parallel_calls)
+
+    return _create_input_fn(_create_dataset, prefetch_buffer_size)
+
+
+def streaming_input_fn(data_dir, labels_file, charset, desired_image_size,
+                       labels_delimiter=' ', image_extension='png',
+                       batch_size=1, num_epochs=None, shuffle=True,
+                       variable_width=False, max_image_width=None,
+                       bucket_by=None, label_bucket_boundaries=None, width_bucket_boundaries=None,
+                       augmentation=None, shuffle_buffer_size=10000, num_parallel_calls=None,
+                       prefetch_buffer_size=2):
+    encoder_decoder = EncoderDecoder()
+    encoder_decoder.initialize_encode_and_decode_maps_from(charset)
+    num_parallel_calls = num_parallel_calls or multiprocessing.cpu_count()
+    load_image = _create_image_loader(data_dir, image_extension, desired_image_size,
+                                      variable_width, max_image_width)
+    bucket_key_fn = _create_example_bucket_key_fn(desired_image_size, variable_width, max_image_width, bucket_by,
+                                                  label_bucket_boundaries, width_bucket_boundaries)
+
+    def _load_example(image_name, label):
+        image = load_image(image_name)
+        label = np.array(encoder_decoder.encode(label.decode()), dtype=np.int32)
+        return image, np.int32(image.shape[1]), label
+
+    def _parse_line(line):
+        example = tf.string_split([line], delimiter=labels_delimiter).values
+        return example[0], example[-1]
+
+    def _load_and_preprocess(image_name, label):
+        image, image_width, label = tf.py_func(_load_example, [image_name, label],
+                                               [tf.uint8, tf.int32, tf.int32],
+                                               stateful=False)
+        label.set_shape([None])
+        return _create_features(image, image_width, desired_image_size, variable_width), (label, tf.size(label))
+
+    def _padded_batch(dataset):
+        return _padded_batch_images(dataset, batch_size, desired_image_size, variable_width)
+
+    def _create_dataset():
+        dataset = tf.data.TextLineDataset(labels_file)
+        dataset = dataset.filter(lambda line: tf.greater(
+            tf.size(tf.string_split([line], delimiter=labels_delimiter).values), 0))
+        dataset = dataset.map(_parse_line)
+        if shuffle:
+            dataset = dataset.shuffle(shuffle_buffer_size)
+        dataset = dataset.repeat(num_epochs)
+        dataset = dataset.map(_load_and_preprocess, num_parallel_calls=num_parallel_calls)
+        dataset = _bucketed_batch(dataset, batch_size, _padded_batch, bucket_key_fn).map(_to_sparse_labels)
+        return _augment_batches(dataset, augmentation, num_parallel_calls)
+
+    return _create_input_fn(_create_dataset, prefetch_buffer_size)
+
+
+def synthetic_input_fn(synthetic_params, charset, desired_image_size, batch_size=1,
+                       variable_width=False, max_image_width=None,
+                       bucket_by=None, label_bucket_boundaries=None, width_bucket_boundaries=None,
+                       augmentation=None, num_workers=None, num_parallel_calls=None,
+                       prefetch_buffer_size=2):
+    bucket_key_fn = _create_example_bucket_key_fn(desired_image_size, variable_width, max_image_width, bucket_by,
+                                                  label_bucket_boundaries, width_bucket_boundaries)
+    num_workers = num_workers or multiprocessing.cpu_count()
+    # Forking a process that already runs a session is unsafe, so the render workers are
+    # started here, before the estimator creates one, and shut down through close().
+    render_pool = synthetic_data.create_render_pool(synthetic_params['corpus_file'],
+                                                    synthetic_params['font_files'],
+                                                    charset,
+                                                    desired_image_size,
+                                                    variable_width=variable_width,
+                                                    max_image_width=max_image_width,
+                                                    seed=synthetic_params['seed'],
+                                                    parameters=synthetic_params['parameters'],
+                                                    num_workers=num_workers)
+
+    def _generate_examples():
+        return synthetic_data.generate_examples(render_pool, num_workers)
+
+    def _to_features(image, image_width, label):
+        return _create_features(image, image_width, desired_image_size, variable_width), (label, tf.size(label))
+
+    def _padded_batch(dataset):
+        return _padded_batch_images(dataset, batch_size, desired_image_size, variable_width)
+
+    def _create_dataset():
+        dataset = tf.data.Dataset.from_generator(_generate_examples,
+                                                 (tf.uint8, tf.int32, tf.int32),
+                                                 (tf.TensorShape(_get_image_shape(desired_image_size,
+                                                                                   variable_width)),
+                                                  tf.TensorShape([]),
+                                                  tf.TensorShape([None])))
+        dataset = dataset.map(_to_features)
+        dataset = _bucketed_batch(dataset, batch_size, _padded_batch, bucket_key_fn).map(_to_sparse_labels)
+        return _augment_batches(dataset, augmentation, num_parallel_calls)
+
+    return _create_input_fn(_create_dataset, prefetch_buffer_size,
+                            close=lambda: synthetic_data.close_render_pool(render_pool))
+
+
+def mixed_input_fn(input_fns, weights, seed=None, prefetch_buffer_size=2):
+    def _create_dataset():
+        datasets = [_add_source_ids(input_fn.create_dataset(), source_id)
+                    for source_id, input_fn in enumerate(input_fns)]
+        return tf.contrib.data.sample_from_datasets(datasets, weights=[float(weight) for weight in weights],
+                                                    seed=seed)
+
+    return _create_input_fn(_create_dataset, prefetch_buffer_size, close=_create_close_fn(input_fns))
+
+
+def concatenated_input_fn(input_fns, prefetch_buffer_size=2):
+    def _create_dataset():
+        dataset = input_fns[0].create_dataset()
+        for input_fn in input_fns[1:]:
+            dataset = dataset.concatenate(input_fn.create_dataset())
+        return dataset
+
+    return _create_input_fn(_create_dataset, prefetch_buffer_size, close=_create_close_fn(input_fns))
+
+
+def _create_close_fn(input_fns):
+    def _close():
+        for input_fn in input_fns:
+            input_fn.close()
+
+    return _close
+
+
+def _add_source_ids(dataset, source_id):
+    def _add_source_id(features, labels):
+        source_ids = tf.fill([tf.shape(features['features'])[0]], tf.constant(source_id, dtype=tf.int32))
+        return dict(features, source_ids=source_ids), labels
+
+    return dataset.map(_add_source_id)
+
+
+def _create_input_fn(create_dataset, prefetch_buffer_size, close=None):
+    def _input_fn():
+        dataset = create_dataset().prefetch(prefetch_buffer_size)
+        return dataset.make_one_shot_iterator().get_next()
+
+    _input_fn.create_dataset = create_dataset
+    _input_fn.close = close or (lambda: None)
+    return _input_fn
+
+
+def _create_image_loader(data_dir, image_extension, desired_image_size, variable_width, max_image_width):
+    def _load_image(image_name):
+        image = dataset_utils.read_image(data_dir, image_name.decode(), image_extension, grayscale=True)
+        if variable_width:
+            return dataset_utils.preprocess_line_image(image, desired_image_size, max_image_width)
+        return dataset_utils.preprocess_image(image, desired_image_size)
+
+    return _load_image
+
+
+def _get_image_shape(desired_image_size, variable_width):
+    if variable_width:
+        return [desired_image_size, None, 1]
+    return [desired_image_size, desired_image_size, 1]
+
+
+def _create_features(image, image_width, desired_image_size, variable_width):
+    image.set_shape(_get_image_shape(desired_image_size, variable_width))
+    features = {'features': image}
+    if variable_width:
+        image_width.set_shape([])
+        features['image_widths'] = image_width
+    return features
+
+
+def _get_image_width(features):
+    if 'image_widths' in features:
+        return features['image_widths']
+    return tf.shape(features['features'])[1]
+
+
+def _padded_batch_images(dataset, batch_size, desired_image_size, variable_width):
+    padded_shapes = {'features': _get_image_shape(desired_image_size, variable_width)}
+    padding_values = {'features': np.uint8(0)}
+    if variable_width:
+        padded_shapes['image_widths'] = []
+        padding_values['image_widths'] = np.int32(0)
+    return dataset.padded_batch(batch_size,
+                                padded_shapes=(padded_shapes, ([None], [])),
+                                padding_values=(padding_values, (np.int32(0), np.int32(0))))
+
+
+def _to_sparse_labels(features, labels):
+    label_values, label_lengths = labels
+    return features, padded_ragged_to_sparse(label_values, label_lengths)
+
+
+def _augment_batches(dataset, augmentation, num_parallel_calls=None):
+    if not augmentation or not augmentation['probabilities']:
+        return dataset
+    augment_batch = image_augmentation.create_batch_augmenter(augmentation)
+
+    def _augment(batch_index, batch):
+        features, labels = batch
+        images = tf.py_func(augment_batch, [features['features'], batch_index], tf.uint8, stateful=False)
+        images.set_shape(features['features'].get_shape())
+        return dict(features, features=images), labels
+
+    batch_indices = tf.data.Dataset.range(np.iinfo(np.int64).max)
+    return tf.data.Dataset.zip((batch_indices, dataset)).map(
+        _augment, num_parallel_calls=num_parallel_calls or multiprocessing.cpu_count())
+
+
+def _bucketed_batch(dataset, batch_size, batch_fn, bucket_key_fn=None):
+    if bucket_key_fn is None:
+        return batch_fn(dataset)
+    return dataset.apply(tf.contrib.data.group_by_window(key_func=bucket_key_fn,
+                                                         reduce_func=lambda _, window: batch_fn(window),
+                                                         window_size=batch_size))
+
+
+def _create_example_bucket_key_fn(desired_image_size, variable_width, max_image_width, bucket_by,
+                                  label_bucket_boundaries, width_bucket_boundaries):
+    if not bucket_by and variable_width:
+        bucket_by = BatchBuckets.IMAGE_WIDTH.value
+    if variable_width:
+        width_bucket_boundaries = width_bucket_boundaries or get_default_width_bucket_boundaries(desired_image_size,
+                                                                                                 max_image_width)
+    return _create_bucket_key_fn(bucket_by,
+                                 lambda features, label: label[1],
+                                 lambda features, label: _get_image_width(features),
+                                 label_bucket_boundaries,
+                                 width_bucket_boundaries)
+
+
+def _create_bucket_key_fn(bucket_by, get_label_length, get_image_width=None,
+                          label_bucket_boundaries=None, width_bucket_boundaries=None):
+    if not bucket_by or bucket_by == BatchBuckets.NONE.value:
+        return None
+    by_label_length = bucket_by in (BatchBuckets.LABEL_LENGTH.value,
+                                    BatchBuckets.LABEL_LENGTH_AND_IMAGE_WIDTH.value)
+    by_image_width = get_image_width is not None and bucket_by in (BatchBuckets.IMAGE_WIDTH.value,
+                                                                   BatchBuckets.LABEL_LENGTH_AND_IMAGE_WIDTH.value)
+    if not by_label_length and not by_image_width:
+        return None
+    label_bucket_boundaries = label_bucket_boundaries or get_default_label_bucket_boundaries()
+    width_bucket_boundaries = width_bucket_boundaries or [0]
+    num_width_buckets = len(width_bucket_boundaries) + 1
+
+    def _bucket_key_fn(*element):
+        key = tf.constant(0, dtype=tf.int64)
+        if by_label_length:
+            key += _get_bucket_id(get_label_length(*element), label_bucket_boundaries) * num_width_buckets
+        if by_image_width:
+            key += _get_bucket_id(get_image_width(*element), width_bucket_boundaries)
+        return key
+
+    return _bucket_key_fn
+
+
+def _get_bucket_id(value, bucket_boundaries):
+    return tf.reduce_sum(tf.to_int64(tf.greater_equal(tf.to_int64(value),
+                                                      tf.constant(bucket_boundaries, dtype=tf.int64))))
+
+
+def get_default_label_bucket_boundaries():
+    return [8, 16, 24, 32, 48, 64, 96, 128, 192, 256]
+
+
+def get_default_width_bucket_boundaries(image_height, max_image_width=None):
+    boundaries = [image_height * multiple for multiple in (2, 4, 6, 8, 12, 16, 24, 32)]
+    if max_image_width:
+        boundaries = [boundary for boundary in boundaries if boundary < max_image_width]
+    return boundaries
+
+
+def tfrecord_input_fn(dataset_dir, split_name, batch_size=1, num_epochs=None, shuffle=True,
+                      validation_size=None, split=None, split_seed=0,
+                      bucket_by=None, label_bucket_boundaries=None, augmentation=None,
+                      shuffle_buffer_size=10000, num_parallel_reads=None,
+                      num_parallel_calls=None, prefetch_buffer_size=2):
+    manifest = tfrecord_ops.read_manifest(dataset_dir)
+    desired_image_size = manifest['desired_image_size']
+    packed_width = dataset_utils.get_packed_width(desired_image_size)
+    shard_paths = tfrecord_ops.get_shard_paths(dataset_dir, split_name)
+    num_parallel_reads = num_parallel_reads or min(len(shard_paths), multiprocessing.cpu_count())
+    num_parallel_calls = num_parallel_calls or multiprocessing.cpu_count()
+    bucket_key_fn = _create_bucket_key_fn(bucket_by,
+                                          lambda image, label: label[1],
+                                          label_bucket_boundaries=label_bucket_boundaries)
+
+    def _parse_example(serialized):
+        parsed = tf.parse_single_example(serialized, {
+            'image': tf.FixedLenFeature([], tf.string),
+            'label': tf.VarLenFeature(tf.int64)
+        })
+        image = tf.reshape(tf.decode_raw(parsed['image'], tf.uint8), [desired_image_size, packed_width])
+        label = tf.to_int32(parsed['label'].values)
+        return image, (label, tf.size(label))
+
+    def _padded_batch(dataset):
+        return dataset.padded_batch(batch_size,
+                                    padded_shapes=([desired_image_size, packed_width], ([None], [])),
+                                    padding_values=(np.uint8(0), (np.int32(0), np.int32(0))))
+
+    def _unpack_batch(images, labels):
+        return _to_sparse_labels({'features': unpack_bits(images, desired_image_size)}, labels)
+
+    def _is_serialized_example_in_split(serialized):
+        split_bucket = tf.parse_single_example(serialized, {
+            'split_bucket': tf.FixedLenFeature([], tf.int64)
+        })['split_bucket']
+        return _is_in_split(split_bucket, validation_size, split, split_seed)
+
+    def _create_dataset():
+        dataset = tf.data.Dataset.from_tensor_slices(tf.constant(shard_paths, dtype=tf.string))
+        if shuffle:
+            dataset = dataset.shuffle(len(shard_paths))
+        dataset = dataset.apply(tf.contrib.data.parallel_interleave(tf.data.TFRecordDataset,
+                                                                    cycle_length=num_parallel_reads,
+                                                                    sloppy=shuffle))
+        if validation_size and split:
+            dataset = dataset.filter(_is_serialized_example_in_split)
+        if shuffle:
+            dataset = dataset.shuffle(shuffle_buffer_size)
+        dataset = dataset.repeat(num_epochs)
+        dataset = dataset.map(_parse_example, num_parallel_calls=num_parallel_calls)
+        dataset = _bucketed_batch(dataset, batch_size, _padded_batch, bucket_key_fn)
+        dataset = dataset.map(_unpack_batch, num_parallel_calls=num_parallel_calls)
+        return _augment_batches(dataset, augmentation, num_parallel_calls)
+
+    return _create_input_fn(_create_dataset, prefetch_buffer_size)
+
+
+def _is_in_split(split_bucket, validation_size, split, split_seed):
+    bucket_offset = dataset_split.get_bucket_offset(split_seed)
+    bucket = tf.mod(split_bucket + bucket_offset, dataset_split.NUM_SPLIT_BUCKETS)
+    in_validation = tf.less(bucket, dataset_split.get_num_holdout_buckets(validation_size))
+    if split == dataset_split.VALIDATION_SPLIT:
+        return in_validation
+    return tf.logical_not(in_validation)
@@ -0,0 +1,24 @@
+import tensorflow as tf
+
+from trainer.backend.GraphKeys import BatchBuckets
+from trainer.backend.tf import input_ops
+
+
+def _create_bucket_key_fn(variable_width, bucket_by):
+    return input_ops._create_example_bucket_key_fn(32, variable_width, 256, bucket_by, None, None)
+
+
+class BucketKeyFnTest(tf.test.TestCase):
+    def testVariableWidthBucketsByImageWidthByDefault(self):
+        self.assertIsNotNone(_create_bucket_key_fn(True, None))
+        self.assertIsNotNone(_create_bucket_key_fn(True, ''))
+
+    def testNoneIsAnExplicitOptOut(self):
+        self.assertIsNone(_create_bucket_key_fn(True, BatchBuckets.NONE.value))
+
+    def testFixedWidthIsNotBucketedByDefault(self):
+        self.assertIsNone(_create_bucket_key_fn(False, None))
+
+
+if __name__ == '__main__':
+    tf.test.main()
@@ -3,33 +3,47 @@ import tensorflow as tf
 from tensorflow.contrib import rnn, slim
 
 
-def get_sequence_lengths(inputs):
-    used = tf.sign(tf.reduce_max(tf.abs(inputs), 2))
-    length = tf.reduce_sum(used, 1)
-    length = tf.cast(length, tf.int32)
-    return length
-
-
 def reshape(tensor: tf.Tensor, new_shape: list, name="reshape"):
     return tf.reshape(tensor, new_shape, name=name)
 
 
 def bidirectional_rnn(inputs, num_hidden, cell_type='LSTM',
                       activation='tanh', concat_output=True,
-                      scope=None):
+                      sequence_lengths=None, scope=None):
     with tf.variable_scope(scope, "bidirectional_rnn", [inputs]):
-        cell_fw = _get_cell(num_hidden, cell_type, activation)
-        cell_bw = _get_cell(num_hidden, cell_type, activation)
-        outputs, _ = tf.nn.bidirectional_dynamic_rnn(cell_fw,
-                                                     cell_bw,
-                                                     inputs,
-                                                     sequence_length=get_sequence_lengths(inputs),
-                                                     dtype=tf.float32)
+        if cell_type == 'LSTMBlockFused':
+            outputs = _fused_bidirectional_rnn(inputs, num_hidden, activation, sequence_lengths)
+        else:
+            cell_fw = _get_cell(num_hidden, cell_type, activation)
+            cell_bw = _get_cell(num_hidden, cell_type, activation)
+            outputs, _ = tf.nn.bidirectional_dynamic_rnn(cell_fw,
+                                                         cell_bw,
+                                                         inputs,
+                                                         sequence_length=sequence_lengths,
+                                                         dtype=tf.float32)
         if concat_output:
             return tf.concat(outputs, 2)
         return outputs
 
 
+def _fused_bidirectional_rnn(inputs, num_hidden, activation='tanh', sequence_lengths=None):
+    if (activation or 'tanh') != 'tanh':
+        raise NotImplementedError(activation, "activation is not supported by fused LSTM cells.")
+    time_major_inputs = tf.transpose(inputs, [1, 0, 2])
+    with tf.variable_scope("fw", initializer=slim.xavier_initializer()):
+        outputs_fw, _ = rnn.LSTMBlockFusedCell(num_hidden)(time_major_inputs,
+                                                           sequence_length=sequence_lengths,
+                                                           dtype=tf.float32)
+    with tf.variable_scope("bw", initializer=slim.xavier_initializer()):
+        cell_bw = rnn.TimeReversedFusedRNN(rnn.LSTMBlockFusedCell(num_hidden))
+        outputs_bw, _ = cell_bw(time_major_inputs, sequence_length=sequence_lengths, dtype=tf.float32)
+    outputs = (tf.transpose(outputs_fw, [1, 0, 2]), tf.transpose(outputs_bw, [1, 0, 2]))
+    if sequence_lengths is None:
+        return outputs
+    mask = tf.sequence_mask(sequence_lengths, tf.shape(inputs)[1], dtype=tf.float32)[:, :, None]
+    return tuple(output * mask for output in outputs)
+
+
 def _get_activation(name):
     if name == 'tanh':
         return tf.nn.tanh
@@ -59,23 +73,94 @@ def _get_cell(num_filters_out, cell_type='LSTM', activation='tanh'):
     raise NotImplementedError(cell_type, "is not supported.")
 
 
-def mdrnn(inputs, num_hidden, cell_type='LSTM', activation='tanh', scope=None):
+def mdrnn(inputs, num_hidden, cell_type='LSTM', activation='tanh', sequence_lengths=None,
+          implementation='sequential', scope=None):
     with tf.variable_scope(scope, "multidimensional_rnn", [inputs]):
+        if implementation == 'batched' and (cell_type or 'LSTM') == 'LSTM':
+            return _batched_mdrnn(inputs, num_hidden // 2, cell_type, activation, sequence_lengths)
+        row_lengths = None
+        if sequence_lengths is not None:
+            row_lengths = tf.reshape(tf.tile(sequence_lengths[:, None], [1, tf.shape(inputs)[1]]), [-1])
         hidden_sequence_horizontal = _bidirectional_rnn_scan(inputs,
                                                              num_hidden // 2,
                                                              cell_type=cell_type,
-                                                             activation=activation)
+                                                             activation=activation,
+                                                             sequence_lengths=row_lengths)
         with tf.variable_scope("vertical"):
             transposed = tf.transpose(hidden_sequence_horizontal, [0, 2, 1, 3])
-            output_transposed = _bidirectional_rnn_scan(transposed, num_hidden // 2, cell_type=cell_type)
+            output_transposed = _bidirectional_rnn_scan(transposed, num_hidden // 2, cell_type=cell_type,
+                                                        activation=activation)
         output = tf.transpose(output_transposed, [0, 2, 1, 3])
         return output
 
 
+def _batched_mdrnn(inputs, num_hidden, cell_type='LSTM', activation='tanh', sequence_lengths=None):
+    batch_size, height, width, num_channels = _get_shape_as_list(inputs)
+    shape = tf.shape(inputs)
+    dynamic_batch_size, dynamic_width = shape[0], shape[2]
+    if height is None:
+        height = shape[1]
+    num_outputs = 2 * num_hidden
+    horizontal_inputs = tf.reshape(tf.transpose(inputs, [2, 0, 1, 3]), [dynamic_width, -1, num_channels])
+    row_lengths = None
+    if sequence_lengths is not None:
+        row_lengths = tf.reshape(tf.tile(sequence_lengths[:, None], [1, shape[1]]), [-1])
+    with tf.variable_scope("horizontal"):
+        horizontal_outputs = _bidirectional_lstm_sweep(horizontal_inputs, num_hidden, activation, row_lengths)
+    vertical_inputs = tf.reshape(horizontal_outputs, [dynamic_width, dynamic_batch_size, height, num_outputs])
+    vertical_inputs = tf.reshape(tf.transpose(vertical_inputs, [2, 0, 1, 3]), [height, -1, num_outputs])
+    with tf.variable_scope("vertical"):
+        vertical_outputs = _bidirectional_lstm_sweep(vertical_inputs, num_hidden, activation)
+    outputs = tf.reshape(vertical_outputs, [height, dynamic_width, dynamic_batch_size, num_outputs])
+    outputs = tf.transpose(outputs, [2, 0, 1, 3])
+    outputs.set_shape([batch_size, _get_shape_as_list(inputs)[1], width, num_outputs])
+    return outputs
+
+
+def _bidirectional_lstm_sweep(inputs, num_hidden, activation='tanh', sequence_lengths=None):
+    num_steps, batch_size = tf.shape(inputs)[0], tf.shape(inputs)[1]
+    num_inputs = _get_shape_as_list(inputs)[-1]
+    activation_function = _get_activation(activation or 'tanh')
+    kernel = tf.get_variable("kernel", [2, num_inputs + num_hidden, 4 * num_hidden],
+                             initializer=_stacked_initializer(slim.xavier_initializer()))
+    bias = tf.get_variable("bias", [2, 4 * num_hidden], initializer=tf.zeros_initializer())
+    if sequence_lengths is None:
+        sequence_lengths = tf.fill([batch_size], num_steps)
+    reversed_inputs = tf.reverse_sequence(inputs, sequence_lengths, seq_axis=0, batch_axis=1)
+    masks = tf.transpose(tf.sequence_mask(sequence_lengths, num_steps, dtype=tf.float32))[:, None, :, None]
+
+    def _step(state, step_inputs):
+        hidden_state, cell_state = state
+        inputs_t, mask_t = step_inputs
+        gates = tf.matmul(tf.concat([inputs_t, hidden_state], 2), kernel) + bias[:, None, :]
+        input_gate, new_input, forget_gate, output_gate = tf.split(gates, 4, axis=2)
+        new_cell_state = tf.sigmoid(forget_gate + 1.0) * cell_state + \
+            tf.sigmoid(input_gate) * activation_function(new_input)
+        new_hidden_state = tf.sigmoid(output_gate) * activation_function(new_cell_state)
+        return (mask_t * new_hidden_state + (1 - mask_t) * hidden_state,
+                mask_t * new_cell_state + (1 - mask_t) * cell_state)
+
+    initial_state = tf.zeros(tf.stack([2, batch_size, num_hidden]))
+    hidden_states, _ = tf.scan(_step, (tf.stack([inputs, reversed_inputs], axis=1), masks),
+                               initializer=(initial_state, initial_state))
+    hidden_states *= masks
+    outputs_bw = tf.reverse_sequence(hidden_states[:, 1], sequence_lengths, seq_axis=0, batch_axis=1)
+    return tf.concat([hidden_states[:, 0], outputs_bw], 2)
+
+
+def _stacked_initializer(initializer, num_directions=2):
+    def _initializer(shape, dtype=tf.float32, partition_info=None):
+        return tf.stack([initializer(shape[1:], dtype=dtype) for _ in range(num_directions)])
+
+    return _initializer
+
+
 def images_to_sequence(inputs):
     _, _, width, num_channels = _get_shape_as_list(inputs)
     s = tf.shape(inputs)
     batch_size, height = s[0], s[1]
+    if width is None:
+        width = s[2]
     return reshape(inputs, [batch_size * height, width, num_channels])
 
 
@@ -89,16 +174,17 @@ def sequence_to_images(tensor, height):
         num_batches = -1
     else:
         num_batches = num_batches // height
-    reshaped = tf.reshape(tensor,
-                          [num_batches, width, height, depth])
-    return tf.transpose(reshaped, [0, 2, 1, 3])
+    if width is None:
+        width = tf.shape(tensor)[1]
+    return tf.reshape(tensor, [num_batches, height, width, depth])
 
 
-def _bidirectional_rnn_scan(inputs, num_hidden, cell_type='LSTM', activation='tanh'):
+def _bidirectional_rnn_scan(inputs, num_hidden, cell_type='LSTM', activation='tanh', sequence_lengths=None):
     with tf.variable_scope("BidirectionalRNN", [inputs]):
         height = inputs.get_shape().as_list()[1]
         inputs = images_to_sequence(inputs)
-        output_sequence = bidirectional_rnn(inputs, num_hidden, cell_type, activation)
+        output_sequence = bidirectional_rnn(inputs, num_hidden, cell_type, activation,
+                                            sequence_lengths=sequence_lengths)
         output = sequence_to_images(output_sequence, height)
         return output
 
@@ -115,6 +201,42 @@ def conv2d(inputs, num_filters, kernel_size, activation="relu", stride=1, paddin
                        scope=scope)
 
 
+def separable_conv2d(inputs, num_filters, kernel_size, depth_multiplier=1, activation="relu", padding='SAME',
+                     scope=None):
+    if isinstance(kernel_size, int):
+        kernel_size = [kernel_size, kernel_size]
+    padding = padding or 'SAME'
+    activation = activation or "relu"
+    return slim.separable_conv2d(inputs, num_filters, kernel_size,
+                                 depth_multiplier=depth_multiplier or 1,
+                                 activation_fn=_get_activation(activation),
+                                 padding=padding,
+                                 scope=scope)
+
+
+def bottleneck_block(inputs, num_filters, bottleneck_filters=None, kernel_size=3, activation="relu", scope=None):
+    bottleneck_filters = bottleneck_filters or max(num_filters // 4, 1)
+    activation_function = _get_activation(activation or "relu")
+    with tf.variable_scope(scope, "bottleneck_block", [inputs]):
+        shortcut = inputs
+        if _get_shape_as_list(inputs)[-1] != num_filters:
+            shortcut = slim.conv2d(inputs, num_filters, [1, 1], activation_fn=None, scope="shortcut")
+        outputs = slim.conv2d(inputs, bottleneck_filters, [1, 1], activation_fn=activation_function, scope="reduce")
+        outputs = slim.conv2d(outputs, bottleneck_filters, kernel_size or 3, activation_fn=activation_function,
+                              scope="conv")
+        outputs = slim.conv2d(outputs, num_filters, [1, 1], activation_fn=None, scope="expand")
+        return activation_function(outputs + shortcut)
+
+
+def temporal_conv(inputs, num_filters, kernel_size, dilation_rate=1, activation="relu", scope=None):
+    activation = activation or "relu"
+    return slim.convolution(inputs, num_filters, kernel_size,
+                            rate=dilation_rate or 1,
+                            padding='SAME',
+                            activation_fn=_get_activation(activation),
+                            scope=scope)
+
+
 def max_pool2d(inputs, pool_size, padding='VALID', stride=2, scope=None):
     if isinstance(pool_size, int):
         pool_size = [pool_size, pool_size]
@@ -131,6 +253,8 @@ def collapse_to_rnn_dims(inputs):
     batch_size, height, width, num_channels = inputs.get_shape().as_list()
     if batch_size is None:
         batch_size = -1
+    if width is None:
+        width = tf.shape(inputs)[2]
     nwhc_cnn_outputs = tf.transpose(inputs, (0, 2, 1, 3))
     batch_major_rnn_inputs = tf.reshape(nwhc_cnn_outputs,
                                         [batch_size, width, height * num_channels]
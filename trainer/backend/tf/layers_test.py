@@ -1,8 +1,14 @@
+import numpy as np
 import tensorflow as tf
 
+from trainer.backend.tf.layers import bidirectional_rnn
+from trainer.backend.tf.layers import bottleneck_block
+from trainer.backend.tf.layers import conv2d
 from trainer.backend.tf.layers import images_to_sequence
 from trainer.backend.tf.layers import mdrnn
+from trainer.backend.tf.layers import separable_conv2d
 from trainer.backend.tf.layers import sequence_to_images
+from trainer.backend.tf.layers import temporal_conv
 
 
 def _create_input(shape):
@@ -37,6 +43,12 @@ class MDRNNTest(tf.test.TestCase):
         expected_shape = (None, 7, 11, 5)
         self._testAssertShapesAreEqual(outputs, expected_shape)
 
+    def testSequenceToImagesInvertsImagesToSequence(self):
+        values = np.arange(2 * 3 * 4 * 5, dtype=np.float32).reshape(2, 3, 4, 5)
+        outputs = sequence_to_images(images_to_sequence(tf.constant(values)), 3)
+        with self.test_session() as sess:
+            self.assertAllEqual(sess.run(outputs), values)
+
     def testMDRNN(self):
         inputs = _create_input([2, 7, 11, 5])
         outputs = mdrnn(inputs, num_hidden=8)
@@ -50,5 +62,97 @@ class MDRNNTest(tf.test.TestCase):
         self._testAssertShapesAreEqual(outputs, expected_shape)
 
 
+def _get_sequential_variable(direction, cell_direction, name):
+    return [variable for variable in tf.global_variables()
+            if variable.op.name.startswith('sequential/')
+            and ('/vertical/' in variable.op.name) == (direction == 'vertical')
+            and '/{}/'.format(cell_direction) in variable.op.name
+            and variable.op.name.endswith('/' + name)][0]
+
+
+class BatchedMDRNNTest(tf.test.TestCase):
+    def testBatchedMDRNNDynamicBatchSize(self):
+        inputs = _create_input([None, 7, 11, 5])
+        outputs = mdrnn(inputs, num_hidden=8, implementation='batched')
+        self.assertEqual(tuple(outputs.get_shape().as_list()), (None, 7, 11, 8))
+
+    def testBatchedMatchesSequential(self):
+        inputs = tf.constant(np.random.RandomState(0).rand(2, 4, 5, 3), dtype=tf.float32)
+        sequence_lengths = tf.constant([5, 3])
+        sequential = mdrnn(inputs, num_hidden=6, sequence_lengths=sequence_lengths, scope='sequential')
+        batched = mdrnn(inputs, num_hidden=6, sequence_lengths=sequence_lengths, implementation='batched',
+                        scope='batched')
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            for direction in ('horizontal', 'vertical'):
+                for name in ('kernel', 'bias'):
+                    batched_variable = [variable for variable in tf.global_variables()
+                                        if variable.op.name == 'batched/{}/{}'.format(direction, name)][0]
+                    sess.run(tf.assign(batched_variable, tf.stack([
+                        _get_sequential_variable(direction, 'fw', name),
+                        _get_sequential_variable(direction, 'bw', name)])))
+            sequential_outputs, batched_outputs = sess.run([sequential, batched])
+        self.assertAllClose(sequential_outputs, batched_outputs, atol=1e-5)
+
+    def testOtherCellTypesFallBackToSequential(self):
+        inputs = _create_input([None, 7, 11, 5])
+        outputs = mdrnn(inputs, num_hidden=8, cell_type='GRU', implementation='batched')
+        self.assertEqual(tuple(outputs.get_shape().as_list()), (None, 7, 11, 8))
+        self.assertFalse([variable for variable in tf.global_variables() if 'horizontal/kernel' in variable.op.name])
+
+
+class FusedBidirectionalRNNTest(tf.test.TestCase):
+    def testFusedOutputsMatchTheUnfusedShapes(self):
+        inputs = _create_input([2, 11, 5])
+        outputs = bidirectional_rnn(inputs, num_hidden=8, cell_type='LSTMBlockFused')
+        self.assertEqual(tuple(outputs.get_shape().as_list()), (2, 11, 16))
+
+    def testFusedMDRNN(self):
+        inputs = _create_input([None, 7, 11, 5])
+        outputs = mdrnn(inputs, num_hidden=8, cell_type='LSTMBlockFused')
+        self.assertEqual(tuple(outputs.get_shape().as_list()), (None, 7, 11, 8))
+
+    def testPaddedStepsAreZero(self):
+        inputs = tf.constant(np.random.rand(2, 6, 3), dtype=tf.float32)
+        outputs = bidirectional_rnn(inputs, num_hidden=4, cell_type='LSTMBlockFused',
+                                    sequence_lengths=tf.constant([6, 3]))
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            values = sess.run(outputs)
+        self.assertAllEqual(values[1, 3:], np.zeros((3, 8)))
+        self.assertTrue(np.all(values[1, :3] != 0))
+
+
+class ConvolutionBlocksTest(tf.test.TestCase):
+    def testSeparableConv2DKeepsTheSpatialDims(self):
+        inputs = _create_input([None, 16, 40, 8])
+        outputs = separable_conv2d(inputs, num_filters=16, kernel_size=3)
+        self.assertEqual(tuple(outputs.get_shape().as_list()), (None, 16, 40, 16))
+
+    def testStridedConv2DDownsamples(self):
+        inputs = _create_input([None, 16, 41, 8])
+        outputs = conv2d(inputs, num_filters=16, kernel_size=3, stride=2)
+        self.assertEqual(tuple(outputs.get_shape().as_list()), (None, 8, 21, 16))
+
+    def testBottleneckBlockProjectsTheShortcut(self):
+        inputs = _create_input([None, 16, 40, 8])
+        outputs = bottleneck_block(inputs, num_filters=32)
+        self.assertEqual(tuple(outputs.get_shape().as_list()), (None, 16, 40, 32))
+        shortcut_variables = [variable for variable in tf.trainable_variables() if 'shortcut' in variable.op.name]
+        self.assertTrue(shortcut_variables)
+
+    def testBottleneckBlockIsAnIdentityShortcutForMatchingDepths(self):
+        inputs = _create_input([None, 16, 40, 32])
+        outputs = bottleneck_block(inputs, num_filters=32, bottleneck_filters=4)
+        self.assertEqual(tuple(outputs.get_shape().as_list()), (None, 16, 40, 32))
+        shortcut_variables = [variable for variable in tf.trainable_variables() if 'shortcut' in variable.op.name]
+        self.assertFalse(shortcut_variables)
+
+    def testTemporalConvKeepsTheTimeSteps(self):
+        inputs = _create_input([None, 25, 64])
+        outputs = temporal_conv(inputs, num_filters=32, kernel_size=3, dilation_rate=2)
+        self.assertEqual(tuple(outputs.get_shape().as_list()), (None, 25, 32))
+
+
 if __name__ == "__main__":
     tf.test.main()
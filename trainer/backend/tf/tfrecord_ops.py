@@ -0,0 +1,155 @@
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from trainer.backend import dataset_split
+from trainer.backend import dataset_utils
+
+TFRECORD_DIRECTORY = "tfrecords"
+MANIFEST_FILENAME = "manifest.json"
+
+
+def convert_to_tfrecords(dataset_dir, charset, desired_image_size, splits=('train', 'test'),
+                         labels_delimiter=' ', image_extension='png',
+                         examples_per_shard=10000, num_workers=None):
+    tfrecord_dir = os.path.join(dataset_dir, TFRECORD_DIRECTORY)
+    if not os.path.exists(tfrecord_dir):
+        os.makedirs(tfrecord_dir)
+    manifest = {
+        'desired_image_size': desired_image_size,
+        'packed': True,
+        'split_buckets': dataset_split.NUM_SPLIT_BUCKETS,
+        'charset': charset,
+        'splits': {}
+    }
+    preprocessing_pool = dataset_utils.create_preprocessing_pool(dataset_dir, examples_per_shard, desired_image_size,
+                                                                 image_extension=image_extension,
+                                                                 num_workers=num_workers, packed=True)
+    try:
+        for split_name in splits:
+            labels_file = os.path.join(dataset_dir, split_name + ".csv")
+            manifest['splits'][split_name] = _write_split(dataset_dir, tfrecord_dir, split_name, labels_file,
+                                                          charset, desired_image_size, labels_delimiter,
+                                                          examples_per_shard, preprocessing_pool)
+    finally:
+        _close_pool(preprocessing_pool)
+    _write_manifest(tfrecord_dir, manifest)
+    return manifest
+
+
+def append_to_tfrecords(dataset_dir, split_examples, image_extension='png',
+                        examples_per_shard=10000, num_workers=None):
+    manifest = read_manifest(dataset_dir)
+    tfrecord_dir = os.path.join(dataset_dir, TFRECORD_DIRECTORY)
+    preprocessing_pool = dataset_utils.create_preprocessing_pool(dataset_dir, examples_per_shard,
+                                                                 manifest['desired_image_size'],
+                                                                 image_extension=image_extension,
+                                                                 num_workers=num_workers, packed=True)
+    try:
+        for split_name, (image_paths, labels) in split_examples.items():
+            if not image_paths:
+                continue
+            split = manifest['splits'][split_name]
+            shard_prefix = "{}-append{:03d}".format(split_name, split.get('num_appends', 0) + 1)
+            appended_split = _write_shards(dataset_dir, tfrecord_dir, shard_prefix, image_paths, labels,
+                                           manifest['charset'], manifest['desired_image_size'],
+                                           examples_per_shard, preprocessing_pool)
+            split['num_examples'] += appended_split['num_examples']
+            split['shards'].extend(appended_split['shards'])
+            split['num_appends'] = split.get('num_appends', 0) + 1
+    finally:
+        _close_pool(preprocessing_pool)
+    _write_manifest(tfrecord_dir, manifest)
+    return manifest
+
+
+def _close_pool(preprocessing_pool):
+    pool, _ = preprocessing_pool
+    pool.close()
+    pool.join()
+
+
+def _write_manifest(tfrecord_dir, manifest):
+    manifest_path = os.path.join(tfrecord_dir, MANIFEST_FILENAME)
+    with open(manifest_path + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=0)
+    os.rename(manifest_path + ".tmp", manifest_path)
+
+
+def _write_split(dataset_dir, tfrecord_dir, split_name, labels_file, charset, desired_image_size,
+                 labels_delimiter, examples_per_shard, preprocessing_pool):
+    image_paths, labels = dataset_utils.read_dataset_list(labels_file, delimiter=labels_delimiter)
+    return _write_shards(dataset_dir, tfrecord_dir, split_name, image_paths, labels, charset,
+                         desired_image_size, examples_per_shard, preprocessing_pool)
+
+
+def _write_shards(dataset_dir, tfrecord_dir, shard_prefix, image_paths, labels, charset, desired_image_size,
+                  examples_per_shard, preprocessing_pool):
+    num_shards = max(1, -(-len(image_paths) // examples_per_shard))
+    shards = []
+    for shard_index in range(num_shards):
+        start = shard_index * examples_per_shard
+        shard_filename = "{}-{:05d}-of-{:05d}.tfrecord".format(shard_prefix, shard_index, num_shards)
+        num_examples = write_shard(os.path.join(tfrecord_dir, shard_filename),
+                                   dataset_dir,
+                                   image_paths[start:start + examples_per_shard],
+                                   labels[start:start + examples_per_shard],
+                                   charset, desired_image_size, preprocessing_pool=preprocessing_pool)
+        shards.append({
+            'filename': shard_filename,
+            'num_examples': num_examples,
+            'size_bytes': os.path.getsize(os.path.join(tfrecord_dir, shard_filename))
+        })
+    return {
+        'num_examples': sum(shard['num_examples'] for shard in shards),
+        'shards': shards
+    }
+
+
+def write_shard(shard_path, data_dir, image_paths, labels, charset, desired_image_size,
+                image_extension='png', num_workers=None, preprocessing_pool=None):
+    if preprocessing_pool:
+        pool, images = preprocessing_pool
+        images = dataset_utils.preprocess_images_in(pool, images, image_paths)
+    else:
+        images = dataset_utils.preprocess_images(data_dir, image_paths, desired_image_size,
+                                                 image_extension=image_extension,
+                                                 num_workers=num_workers,
+                                                 packed=True)
+    label_values, label_lengths = dataset_utils.encode_ragged(labels, charset)
+    label_offsets = dataset_utils.get_label_offsets(label_lengths)
+    with tf.python_io.TFRecordWriter(shard_path) as writer:
+        for index, (image_name, image) in enumerate(zip(image_paths, images)):
+            label = label_values[label_offsets[index]:label_offsets[index + 1]]
+            writer.write(_create_example(image_name, image, label).SerializeToString())
+    return len(image_paths)
+
+
+def _create_example(image_name, image, label):
+    return tf.train.Example(features=tf.train.Features(feature={
+        'image_name': _bytes_feature(image_name.encode()),
+        'split_bucket': tf.train.Feature(int64_list=tf.train.Int64List(
+            value=[dataset_split.get_split_bucket(image_name, dataset_split.VALIDATION_SPLIT)])),
+        'image': _bytes_feature(np.ascontiguousarray(image).tobytes()),
+        'label': tf.train.Feature(int64_list=tf.train.Int64List(value=label.tolist()))
+    }))
+
+
+def _bytes_feature(value):
+    return tf.train.Feature(bytes_list=tf.train.BytesList(value=[value]))
+
+
+def read_manifest(dataset_dir):
+    manifest_path = os.path.join(dataset_dir, TFRECORD_DIRECTORY, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def get_shard_paths(dataset_dir, split_name):
+    manifest = read_manifest(dataset_dir)
+    return [os.path.join(dataset_dir, TFRECORD_DIRECTORY, shard['filename'])
+            for shard in manifest['splits'][split_name]['shards']]
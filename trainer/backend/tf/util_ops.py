@@ -2,18 +2,25 @@ import tensorflow as tf
 
 from tensorboard import main as tb
 
+from trainer.backend import network_utils
 from trainer.backend.tf import layers
 from trainer.backend.GraphKeys import LayerTypes
+from trainer.backend.GraphKeys import MDRNNImplementations
 
 
-def get_sequence_lengths(inputs):
-    used = tf.sign(tf.reduce_max(tf.abs(inputs), 2))
-    length = tf.reduce_sum(used, 1)
-    length = tf.cast(length, tf.int32)
-    return length
+def get_input_sequence_lengths(images, image_widths=None):
+    if image_widths is None:
+        return tf.fill([tf.shape(images)[0]], tf.shape(images)[2])
+    return tf.to_int32(image_widths)
 
 
-def feed(inputs, layer, is_training):
+def get_layer_sequence_lengths(layer, sequence_lengths, outputs):
+    sequence_lengths = network_utils.get_layer_output_width(layer, sequence_lengths)
+    num_steps = tf.shape(outputs)[1 if outputs.get_shape().ndims == 3 else 2]
+    return tf.clip_by_value(sequence_lengths, 1, num_steps)
+
+
+def feed(inputs, layer, is_training, sequence_lengths=None):
     layer_type = layer["layer_type"]
     if layer_type == LayerTypes.CONV2D.value:
         return layers.conv2d(inputs, num_filters=layer["num_filters"],
@@ -21,6 +28,32 @@ def feed(inputs, layer, is_training):
                              activation=layer.get("activation"),
                              padding=layer.get("padding"),
                              scope=layer.get("name"))
+    if layer_type == LayerTypes.STRIDED_CONV2D.value:
+        return layers.conv2d(inputs, num_filters=layer["num_filters"],
+                             kernel_size=layer["kernel_size"],
+                             activation=layer.get("activation"),
+                             stride=layer.get("stride") or 2,
+                             padding=layer.get("padding"),
+                             scope=layer.get("name"))
+    if layer_type == LayerTypes.SEPARABLE_CONV2D.value:
+        return layers.separable_conv2d(inputs, num_filters=layer["num_filters"],
+                                       kernel_size=layer["kernel_size"],
+                                       depth_multiplier=layer.get("depth_multiplier"),
+                                       activation=layer.get("activation"),
+                                       padding=layer.get("padding"),
+                                       scope=layer.get("name"))
+    if layer_type == LayerTypes.BOTTLENECK_BLOCK.value:
+        return layers.bottleneck_block(inputs, num_filters=layer["num_filters"],
+                                       bottleneck_filters=layer.get("bottleneck_filters"),
+                                       kernel_size=layer.get("kernel_size"),
+                                       activation=layer.get("activation"),
+                                       scope=layer.get("name"))
+    if layer_type == LayerTypes.TEMPORAL_CONV.value:
+        return layers.temporal_conv(inputs, num_filters=layer["num_filters"],
+                                    kernel_size=layer["kernel_size"],
+                                    dilation_rate=layer.get("dilation_rate"),
+                                    activation=layer.get("activation"),
+                                    scope=layer.get("name"))
     if layer_type == LayerTypes.MAX_POOL2D.value:
         return layers.max_pool2d(inputs, pool_size=layer["pool_size"],
                                  padding=layer.get("padding"),
@@ -30,11 +63,14 @@ def feed(inputs, layer, is_training):
         return layers.bidirectional_rnn(inputs, num_hidden=layer["num_hidden"],
                                         cell_type=layer.get("cell_type"),
                                         activation=layer.get("activation"),
+                                        sequence_lengths=sequence_lengths,
                                         scope=layer.get("name"))
     if layer_type == LayerTypes.MDRNN.value:
         return layers.mdrnn(inputs, num_hidden=layer["num_hidden"],
                             cell_type=layer.get("cell_type"),
                             activation=layer.get("activation"),
+                            sequence_lengths=sequence_lengths,
+                            implementation=layer.get("implementation") or MDRNNImplementations.SEQUENTIAL.value,
                             scope=layer.get("name"))
     if layer_type == LayerTypes.DROPOUT.value:
         return layers.dropout(inputs, keep_prob=layer["keep_prob"],
@@ -56,6 +92,35 @@ def dense_to_sparse(tensor, token_to_ignore=0):
     return tf.SparseTensor(indices, values, shape)
 
 
+def ragged_to_sparse(values, lengths):
+    lengths = tf.to_int64(lengths)
+    max_length = tf.reduce_max(tf.concat([lengths, tf.zeros([1], dtype=tf.int64)], 0))
+    indices, shape = _get_ragged_indices(lengths, max_length)
+    return tf.SparseTensor(indices, values, shape)
+
+
+def padded_ragged_to_sparse(padded_values, lengths):
+    indices, shape = _get_ragged_indices(tf.to_int64(lengths), tf.shape(padded_values, out_type=tf.int64)[1])
+    return tf.SparseTensor(indices, tf.gather_nd(padded_values, indices), shape)
+
+
+def _get_ragged_indices(lengths, max_length):
+    indices = tf.where(tf.sequence_mask(lengths, max_length))
+    shape = tf.stack([tf.size(lengths, out_type=tf.int64), max_length])
+    return indices, shape
+
+
+def unpack_bits(packed, width):
+    shifts = tf.constant([7, 6, 5, 4, 3, 2, 1, 0], dtype=packed.dtype)
+    bits = tf.bitwise.bitwise_and(tf.bitwise.right_shift(tf.expand_dims(packed, -1), shifts),
+                                  tf.constant(1, dtype=packed.dtype))
+    packed_shape = tf.shape(packed)
+    bits = tf.reshape(bits, tf.concat([packed_shape[:-1], [packed_shape[-1] * 8]], 0))
+    images = tf.expand_dims(bits[..., :width] * 255, -1)
+    images.set_shape(packed.get_shape()[:-1].concatenate([width, 1]))
+    return images
+
+
 def visualize(model, host):
     tf.flags.FLAGS.logdir = model
     tf.flags.FLAGS.host = host
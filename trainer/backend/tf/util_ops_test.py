@@ -1,8 +1,11 @@
+import numpy as np
 import tensorflow as tf
 
 from trainer.backend.tf.layers import bidirectional_rnn
 from trainer.backend.tf.ctc_ops import convert_to_ctc_dims, ctc_beam_search_decoder
-from trainer.backend.tf.util_ops import get_sequence_lengths
+from trainer.backend import dataset_utils
+from trainer.backend.tf.util_ops import get_input_sequence_lengths, get_layer_sequence_lengths
+from trainer.backend.tf.util_ops import padded_ragged_to_sparse, ragged_to_sparse, unpack_bits
 from trainer.backend.tf.losses import ctc_loss
 
 
@@ -10,12 +13,12 @@ def _create_input(shape):
     return tf.placeholder(tf.float32, shape)
 
 
-class GetSequenceLengthTest(tf.test.TestCase):
+class CTCSequenceLengthsTest(tf.test.TestCase):
     def setUp(self):
         self.inputs = _create_input([1, 128, 64])
         self.inputs = bidirectional_rnn(self.inputs, 8)
         self.labels = tf.sparse_placeholder(dtype=tf.int32)
-        self.sequence_lengths = get_sequence_lengths(self.inputs)
+        self.sequence_lengths = tf.fill([tf.shape(self.inputs)[0]], tf.shape(self.inputs)[1])
 
     def testCTCLOSS(self):
         ctc_inputs = convert_to_ctc_dims(self.inputs,
@@ -32,5 +35,49 @@ class GetSequenceLengthTest(tf.test.TestCase):
         ctc_beam_search_decoder(ctc_inputs, self.sequence_lengths)
 
 
+class LayerSequenceLengthsTest(tf.test.TestCase):
+    def testLengthsFollowTheStrideArithmetic(self):
+        images = tf.zeros([2, 8, 32, 1])
+        sequence_lengths = get_input_sequence_lengths(images, tf.constant([32, 13]))
+        conv = {"layer_type": "conv2d", "num_filters": 4, "kernel_size": 3, "padding": "valid"}
+        pool = {"layer_type": "max_pool2d", "pool_size": 2, "stride": 2}
+        sequence_lengths = get_layer_sequence_lengths(conv, sequence_lengths, tf.zeros([2, 6, 30, 4]))
+        sequence_lengths = get_layer_sequence_lengths(pool, sequence_lengths, tf.zeros([2, 3, 15, 4]))
+        with self.test_session() as sess:
+            self.assertAllEqual(sess.run(sequence_lengths), [15, 5])
+
+    def testFixedSizeImagesUseTheFullWidth(self):
+        sequence_lengths = get_input_sequence_lengths(tf.zeros([3, 8, 16, 1]))
+        with self.test_session() as sess:
+            self.assertAllEqual(sess.run(sequence_lengths), [16, 16, 16])
+
+
+class RaggedToSparseTest(tf.test.TestCase):
+    def testGatheredLabelsMatchThePaddedLabels(self):
+        label_values = np.array([1, 2, 3, 4, 5, 6], dtype=np.int32)
+        label_offsets = dataset_utils.get_label_offsets([2, 1, 3])
+        values, lengths = dataset_utils.gather_labels(label_values, label_offsets, np.array([2, 0]))
+        labels = ragged_to_sparse(tf.constant(values), tf.constant(lengths))
+        with self.test_session() as sess:
+            self.assertAllEqual(sess.run(tf.sparse_tensor_to_dense(labels, default_value=-1)),
+                                [[4, 5, 6], [1, 2, -1]])
+
+    def testPaddedLabelsKeepLabelsThatEqualThePadding(self):
+        labels = padded_ragged_to_sparse(tf.constant([[0, 2, 0], [3, 0, 0]]), tf.constant([3, 1]))
+        with self.test_session() as sess:
+            self.assertAllEqual(sess.run(tf.sparse_tensor_to_dense(labels, default_value=-1)),
+                                [[0, 2, 0], [3, -1, -1]])
+
+
+class UnpackBitsTest(tf.test.TestCase):
+    def testUnpackBitsMatchesNumpy(self):
+        images = np.random.randint(0, 2, size=(3, 5, 13)).astype(np.uint8) * 255
+        packed = np.packbits(images > 127, axis=-1)
+        unpacked = unpack_bits(tf.constant(packed), 13)
+        self.assertEqual(unpacked.get_shape().as_list(), [3, 5, 13, 1])
+        with self.test_session() as sess:
+            self.assertAllEqual(sess.run(unpacked), images[..., np.newaxis])
+
+
 if __name__ == "__main__":
     tf.test.main()
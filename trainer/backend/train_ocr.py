@@ -1,10 +1,21 @@
 import os
 
-from sklearn.model_selection import train_test_split
-
+from trainer.backend import dataset_cache
+from trainer.backend import dataset_split
+from trainer.backend import dataset_validation
 from trainer.backend import dataset_utils
+from trainer.backend.GraphKeys import InputPipelines
 from trainer.backend.tf import train
 from trainer.backend.tf import test
+from trainer.backend.tf import array_input_fn
+from trainer.backend.tf import streaming_input_fn
+from trainer.backend.tf import tfrecord_input_fn
+from trainer.backend.tf import synthetic_input_fn
+from trainer.backend.tf import mixed_input_fn
+from trainer.backend.tf import concatenated_input_fn
+from trainer.backend.tf import read_tfrecord_manifest
+
+VALIDATED_LABELS_FILENAME = "validated_train.csv"
 
 
 def train_model(run_params, dataset_dir, checkpoint_dir,
@@ -13,94 +24,349 @@ def train_model(run_params, dataset_dir, checkpoint_dir,
                 labels_delimiter=' ', num_epochs=1, batch_size=1,
                 checkpoint_epochs=1):
     labels_file = os.path.join(dataset_dir, "train.csv")
-    images, labels, num_classes = _prepare_dataset(charset_file,
-                                                   dataset_dir,
-                                                   desired_image_size,
-                                                   labels_delimiter,
-                                                   labels_file)
-    features = {'train': images}
-    labels_dict = {'train': labels}
-    if validation_size:
-        features, labels_dict = _train_validation_split(images, labels, validation_size)
+    train_input_fn, validation_input_fn, num_train_examples, num_classes = _create_train_input_fns(
+        run_params, dataset_dir, checkpoint_dir, charset_file, desired_image_size,
+        labels_delimiter, labels_file, validation_size, batch_size)
 
     run_params["learning_rate"] = learning_rate
     run_params["optimizer"] = optimizer
     run_params["metrics"] = metrics
     run_params["loss"] = loss
 
-    train(params=run_params,
-          features=features,
-          labels=labels_dict,
-          num_classes=num_classes,
-          checkpoint_dir=checkpoint_dir,
-          batch_size=batch_size,
-          num_epochs=num_epochs,
-          save_checkpoint_every_n_epochs=checkpoint_epochs)
+    try:
+        train(params=run_params,
+              train_input_fn=train_input_fn,
+              num_train_examples=num_train_examples,
+              validation_input_fn=validation_input_fn,
+              num_classes=num_classes,
+              checkpoint_dir=checkpoint_dir,
+              batch_size=batch_size,
+              num_epochs=num_epochs,
+              save_checkpoint_every_n_epochs=checkpoint_epochs)
+    finally:
+        train_input_fn.close()
 
 
 def continue_training_model(run_params, checkpoint_dir, dataset_dir):
     labels_file = os.path.join(dataset_dir, "train.csv")
-    images, labels, num_classes = _prepare_dataset(run_params['charset_file'],
-                                                   dataset_dir,
-                                                   run_params['desired_image_size'],
-                                                   ' ',
-                                                   labels_file)
-    features = {'train': images}
-    labels_dict = {'train': labels}
-    validation_size = run_params['validation_size']
+    train_input_fn, validation_input_fn, num_train_examples, num_classes = _create_train_input_fns(
+        run_params, dataset_dir, checkpoint_dir, run_params['charset_file'],
+        run_params['desired_image_size'], ' ', labels_file,
+        run_params['validation_size'], run_params['batch_size'])
+    try:
+        train(params=run_params,
+              train_input_fn=train_input_fn,
+              num_train_examples=num_train_examples,
+              validation_input_fn=validation_input_fn,
+              num_classes=num_classes,
+              checkpoint_dir=checkpoint_dir,
+              batch_size=run_params['batch_size'],
+              num_epochs=run_params['num_epochs'],
+              save_checkpoint_every_n_epochs=run_params['checkpoint_epochs'])
+    finally:
+        train_input_fn.close()
+
+
+def _create_train_input_fns(run_params, dataset_dir, checkpoint_dir, charset_file, desired_image_size,
+                            labels_delimiter, labels_file, validation_size, batch_size):
+    train_input_fn, validation_input_fn, num_train_examples, num_classes = _create_dataset_input_fns(
+        run_params, dataset_dir, checkpoint_dir, charset_file, desired_image_size,
+        labels_delimiter, labels_file, validation_size, batch_size)
+    datasets = run_params.get('datasets') or []
+    synthetic_params = run_params.get('synthetic')
+    if len(datasets) < 2 and not synthetic_params:
+        return train_input_fn, validation_input_fn, num_train_examples, num_classes
+    source_names = [run_params.get('dataset_name') or os.path.basename(dataset_dir)]
+    train_input_fns = [train_input_fn]
+    validation_input_fns = [validation_input_fn] if validation_input_fn else []
+    num_source_examples = [num_train_examples]
+    for dataset in datasets[1:]:
+        split_dir = os.path.join(checkpoint_dir, 'splits', dataset['name'])
+        if not os.path.exists(split_dir):
+            os.makedirs(split_dir)
+        source_train_input_fn, source_validation_input_fn, source_num_train_examples, _ = _create_dataset_input_fns(
+            run_params, dataset['dataset_dir'], split_dir, charset_file, desired_image_size,
+            labels_delimiter, os.path.join(dataset['dataset_dir'], "train.csv"), validation_size, batch_size)
+        source_names.append(dataset['name'])
+        train_input_fns.append(source_train_input_fn)
+        if source_validation_input_fn:
+            validation_input_fns.append(source_validation_input_fn)
+        num_source_examples.append(source_num_train_examples)
+    weights = [float(dataset['weight']) for dataset in datasets] if datasets else [1.0]
+    weights = [weight / sum(weights) for weight in weights]
+    num_train_examples = sum(num_source_examples)
+    for source_name, weight, num_examples in zip(source_names, weights, num_source_examples):
+        print('Training on', source_name, 'with weight', weight, 'and', num_examples, 'examples')
+    if synthetic_params:
+        ratio = synthetic_params['ratio']
+        print('Mixing synthetic text lines into', ratio * 100, 'percent of the training batches')
+        source_names.append('synthetic')
+        train_input_fns.append(_create_synthetic_train_input_fn(run_params, synthetic_params, charset_file,
+                                                                desired_image_size, batch_size))
+        weights = [weight * (1 - ratio) for weight in weights] + [ratio]
+        num_train_examples = int(num_train_examples / (1 - ratio))
+    run_params['data_sources'] = source_names
+    train_input_fn = mixed_input_fn(train_input_fns, weights, seed=run_params.get('split_seed'))
+    if len(validation_input_fns) > 1:
+        validation_input_fn = concatenated_input_fn(validation_input_fns)
+    return train_input_fn, validation_input_fn, num_train_examples, num_classes
+
+
+def _create_synthetic_train_input_fn(run_params, synthetic_params, charset_file, desired_image_size, batch_size):
+    augmentation = run_params.get('augmentation')
+    if augmentation:
+        augmentation = dict(augmentation, seed=augmentation['seed'] + 1)
+    streaming_options = _get_streaming_options(run_params) if run_params.get('variable_width') else {}
+    return synthetic_input_fn(synthetic_params,
+                              dataset_utils.get_characters_from(charset_file),
+                              desired_image_size,
+                              batch_size=batch_size,
+                              augmentation=augmentation,
+                              num_workers=run_params.get('num_synthetic_workers'),
+                              **dict(streaming_options, **_get_bucketing_options(run_params)))
+
+
+def _create_dataset_input_fns(run_params, dataset_dir, checkpoint_dir, charset_file, desired_image_size,
+                              labels_delimiter, labels_file, validation_size, batch_size):
+    streaming_options = _get_streaming_options(run_params)
+    bucketing_options = _get_bucketing_options(run_params)
+    split_seed = run_params.get('split_seed', 0)
+    augmentation = run_params.get('augmentation')
+    if run_params.get('preflight_validation'):
+        labels_file = _validate_labels_file(run_params, dataset_dir, checkpoint_dir, charset_file,
+                                            desired_image_size, labels_delimiter, labels_file)
+    validation_split = None
     if validation_size:
-        features, labels_dict = _train_validation_split(images, labels, validation_size)
-    train(params=run_params,
-          features=features,
-          labels=labels_dict,
-          num_classes=num_classes,
-          checkpoint_dir=checkpoint_dir,
-          batch_size=run_params['batch_size'],
-          num_epochs=run_params['num_epochs'],
-          save_checkpoint_every_n_epochs=run_params['checkpoint_epochs'])
-
-
-def _train_validation_split(images, labels, validation_size):
-    features = {}
-    labels_dict = {}
-    x_train, x_validation, y_train, y_validation = train_test_split(
-        images,
-        labels,
-        test_size=validation_size
-    )
-    features['train'] = x_train
-    features['validation'] = x_validation
-    labels_dict['train'] = y_train
-    labels_dict['validation'] = y_validation
-    return features, labels_dict
+        validation_split = dataset_split.get_validation_split(checkpoint_dir, labels_file, validation_size,
+                                                              split_seed, delimiter=labels_delimiter)
+    if _uses_input_pipeline(run_params, InputPipelines.TFRECORD):
+        return _create_tfrecord_train_input_fns(dataset_dir, charset_file, desired_image_size,
+                                                validation_size, validation_split, split_seed,
+                                                batch_size, bucketing_options, augmentation)
+    if _uses_input_pipeline(run_params, InputPipelines.STREAMING):
+        return _create_streaming_train_input_fns(dataset_dir, charset_file, desired_image_size,
+                                                 labels_delimiter, labels_file,
+                                                 validation_split, batch_size,
+                                                 dict(streaming_options, **bucketing_options),
+                                                 augmentation)
+    images, labels, num_classes = _prepare_dataset(charset_file,
+                                                   dataset_dir,
+                                                   desired_image_size,
+                                                   labels_delimiter,
+                                                   labels_file,
+                                                   **_get_preprocessing_options(run_params))
+    train_indices = None
+    validation_input_fn = None
+    if validation_split:
+        train_indices, validation_indices = dataset_split.get_split_indices(validation_split)
+        validation_input_fn = array_input_fn(images, labels, batch_size,
+                                             num_epochs=1,
+                                             shuffle=False,
+                                             packed_image_width=desired_image_size,
+                                             indices=validation_indices,
+                                             **bucketing_options)
+    train_input_fn = array_input_fn(images, labels, batch_size,
+                                    packed_image_width=desired_image_size,
+                                    indices=train_indices,
+                                    augmentation=augmentation,
+                                    **bucketing_options)
+    num_train_examples = len(images) if train_indices is None else len(train_indices)
+    return train_input_fn, validation_input_fn, num_train_examples, num_classes
+
+
+def _validate_labels_file(run_params, dataset_dir, report_dir, charset_file, desired_image_size,
+                          labels_delimiter, labels_file):
+    excluded = dataset_validation.validate_dataset(dataset_dir, labels_file,
+                                                   dataset_utils.get_characters_from(charset_file),
+                                                   report_dir,
+                                                   network=run_params['network'],
+                                                   desired_image_size=desired_image_size,
+                                                   variable_width=bool(run_params.get('variable_width')),
+                                                   max_image_width=run_params.get('max_image_width'),
+                                                   labels_delimiter=labels_delimiter,
+                                                   **_get_preprocessing_options(run_params))
+    if not excluded:
+        return labels_file
+    if _uses_input_pipeline(run_params, InputPipelines.TFRECORD):
+        print('Warning:', len(excluded), 'invalid examples are part of the TFRecords of', dataset_dir,
+              'and cannot be excluded. See', os.path.join(report_dir, dataset_validation.REPORT_FILENAME))
+        return labels_file
+    return dataset_validation.write_filtered_labels(labels_file,
+                                                    os.path.join(report_dir, VALIDATED_LABELS_FILENAME),
+                                                    excluded,
+                                                    delimiter=labels_delimiter)
+
+
+def _create_streaming_train_input_fns(dataset_dir, charset_file, desired_image_size,
+                                      labels_delimiter, labels_file, validation_split, batch_size,
+                                      streaming_options, augmentation=None):
+    classes = dataset_utils.get_characters_from(charset_file)
+    num_classes = len(classes) + 1
+    validation_input_fn = None
+    if validation_split:
+        labels_file = validation_split['train_file']
+        num_train_examples = validation_split['num_train_examples']
+        validation_input_fn = streaming_input_fn(dataset_dir, validation_split['validation_file'], classes,
+                                                 desired_image_size,
+                                                 labels_delimiter=labels_delimiter,
+                                                 batch_size=batch_size,
+                                                 num_epochs=1,
+                                                 shuffle=False,
+                                                 **streaming_options)
+    else:
+        num_train_examples = dataset_utils.count_examples(labels_file)
+    train_input_fn = streaming_input_fn(dataset_dir, labels_file, classes,
+                                        desired_image_size,
+                                        labels_delimiter=labels_delimiter,
+                                        batch_size=batch_size,
+                                        augmentation=augmentation,
+                                        **streaming_options)
+    return train_input_fn, validation_input_fn, num_train_examples, num_classes
+
+
+def _create_tfrecord_train_input_fns(dataset_dir, charset_file, desired_image_size,
+                                     validation_size, validation_split, split_seed,
+                                     batch_size, bucketing_options, augmentation=None):
+    classes = dataset_utils.get_characters_from(charset_file)
+    manifest = _get_tfrecord_manifest(dataset_dir, classes, desired_image_size)
+    num_train_examples = manifest['splits']['train']['num_examples']
+    validation_input_fn = None
+    if validation_split:
+        num_train_examples = validation_split['num_train_examples']
+        validation_input_fn = tfrecord_input_fn(dataset_dir, 'train',
+                                                batch_size=batch_size,
+                                                num_epochs=1,
+                                                shuffle=False,
+                                                validation_size=validation_size,
+                                                split=dataset_split.VALIDATION_SPLIT,
+                                                split_seed=split_seed,
+                                                **bucketing_options)
+    train_input_fn = tfrecord_input_fn(dataset_dir, 'train',
+                                       batch_size=batch_size,
+                                       validation_size=validation_size,
+                                       split='train',
+                                       split_seed=split_seed,
+                                       augmentation=augmentation,
+                                       **bucketing_options)
+    return train_input_fn, validation_input_fn, num_train_examples, len(classes) + 1
+
+
+def _get_tfrecord_manifest(dataset_dir, classes, desired_image_size):
+    manifest = read_tfrecord_manifest(dataset_dir)
+    if manifest is None:
+        raise ValueError(dataset_dir + " has not been converted to TFRecords.")
+    if manifest.get('split_buckets') != dataset_split.NUM_SPLIT_BUCKETS:
+        raise ValueError("TFRecords of " + dataset_dir + " predate deterministic splits. Convert them again.")
+    if manifest['desired_image_size'] != desired_image_size or manifest['charset'] != classes:
+        raise ValueError("TFRecords of " + dataset_dir +
+                         " were written with a different image size or charset.")
+    return manifest
+
+
+def _get_streaming_options(run_params):
+    variable_width = bool(run_params.get('variable_width'))
+    if variable_width and not _uses_input_pipeline(run_params, InputPipelines.STREAMING):
+        raise ValueError("Variable width images are only supported by the streaming input pipeline.")
+    return {
+        'variable_width': variable_width,
+        'max_image_width': run_params.get('max_image_width'),
+        'width_bucket_boundaries': run_params.get('width_bucket_boundaries')
+    }
+
+
+def _get_bucketing_options(run_params):
+    return {
+        'bucket_by': run_params.get('bucket_by'),
+        'label_bucket_boundaries': run_params.get('label_bucket_boundaries')
+    }
+
+
+def _uses_input_pipeline(run_params, input_pipeline):
+    return run_params.get('input_pipeline') == input_pipeline.value
+
+
+def _get_preprocessing_options(run_params):
+    return {
+        'num_workers': run_params.get('num_preprocessing_workers'),
+        'chunk_size': run_params.get('preprocessing_chunk_size') or 256
+    }
 
 
 def evaluate_model(architecture_params, dataset_dir, charset_file,
                    checkpoint_dir, labels_delimiter=' '):
     labels_file = os.path.join(dataset_dir, "test.csv")
-    images, labels, num_classes = _prepare_dataset(charset_file,
-                                                   dataset_dir,
-                                                   architecture_params['desired_image_size'],
-                                                   labels_delimiter,
-                                                   labels_file)
-    test(architecture_params, images, labels, checkpoint_dir)
+    desired_image_size = architecture_params['desired_image_size']
+    batch_size = architecture_params['batch_size']
+    if _uses_input_pipeline(architecture_params, InputPipelines.TFRECORD):
+        _get_tfrecord_manifest(dataset_dir, dataset_utils.get_characters_from(charset_file),
+                               desired_image_size)
+        input_fn = tfrecord_input_fn(dataset_dir, 'test',
+                                     batch_size=batch_size,
+                                     num_epochs=1,
+                                     shuffle=False,
+                                     **_get_bucketing_options(architecture_params))
+    elif _uses_input_pipeline(architecture_params, InputPipelines.STREAMING):
+        input_fn = streaming_input_fn(dataset_dir, labels_file,
+                                      dataset_utils.get_characters_from(charset_file),
+                                      desired_image_size,
+                                      labels_delimiter=labels_delimiter,
+                                      batch_size=batch_size,
+                                      num_epochs=1,
+                                      shuffle=False,
+                                      **dict(_get_streaming_options(architecture_params),
+                                             **_get_bucketing_options(architecture_params)))
+    else:
+        images, labels, num_classes = _prepare_dataset(charset_file,
+                                                       dataset_dir,
+                                                       desired_image_size,
+                                                       labels_delimiter,
+                                                       labels_file,
+                                                       **_get_preprocessing_options(architecture_params))
+        input_fn = array_input_fn(images, labels, batch_size=batch_size, num_epochs=1, shuffle=False,
+                                  packed_image_width=desired_image_size,
+                                  **_get_bucketing_options(architecture_params))
+    test(architecture_params, input_fn, checkpoint_dir)
+
+
+def _prepare_dataset(charset_file, dataset_dir, desired_image_size, labels_delimiter, labels_file,
+                     num_workers=None, chunk_size=256):
+    preprocessing_settings = dataset_cache.get_preprocessing_settings(desired_image_size,
+                                                                     labels_delimiter=labels_delimiter)
+    cache_key = dataset_cache.create_key(labels_file, charset_file, preprocessing_settings)
+    cached_dataset = dataset_cache.load(dataset_dir, cache_key)
+    if cached_dataset:
+        print('Loaded cached dataset', cache_key)
+        return cached_dataset
+    base_entry = dataset_cache.find_base_entry(dataset_dir, labels_file, charset_file, preprocessing_settings)
+    start_offset = base_entry['labels_size_bytes'] if base_entry else 0
+    images, labels, num_classes = _preprocess_dataset(charset_file,
+                                                      dataset_dir,
+                                                      desired_image_size,
+                                                      labels_delimiter,
+                                                      labels_file,
+                                                      num_workers=num_workers,
+                                                      chunk_size=chunk_size,
+                                                      start_offset=start_offset)
+    if base_entry:
+        print('Extending cached dataset', base_entry['key'], 'with', len(images), 'examples.')
+        return dataset_cache.extend(dataset_dir, base_entry, cache_key, labels_file, charset_file,
+                                    preprocessing_settings, images, labels, num_classes)
+    return dataset_cache.save(dataset_dir, cache_key, labels_file, charset_file, preprocessing_settings,
+                              images, labels, num_classes)
 
 
-def _prepare_dataset(charset_file, dataset_dir, desired_image_size, labels_delimiter, labels_file):
+def _preprocess_dataset(charset_file, dataset_dir, desired_image_size, labels_delimiter, labels_file,
+                        num_workers=None, chunk_size=256, start_offset=0):
     image_paths, labels = dataset_utils.read_dataset_list(
-        labels_file, delimiter=labels_delimiter)
-    max_label_length = len(max(labels, key=len))
-    images = dataset_utils.read_images(data_dir=dataset_dir,
-                                       image_paths=image_paths,
-                                       image_extension='png')
-    images = dataset_utils.resize(images,
-                                  desired_height=desired_image_size,
-                                  desired_width=desired_image_size)
-    images = dataset_utils.binarize(images)
-    images = dataset_utils.invert(images)
+        labels_file, delimiter=labels_delimiter, start_offset=start_offset)
+    images = dataset_utils.preprocess_images(data_dir=dataset_dir,
+                                             image_paths=image_paths,
+                                             desired_image_size=desired_image_size,
+                                             image_extension='png',
+                                             num_workers=num_workers,
+                                             chunk_size=chunk_size,
+                                             packed=True)
     classes = dataset_utils.get_characters_from(charset_file)
-    images = dataset_utils.images_as_float32(images)
-    labels = dataset_utils.encode(labels, classes)
+    labels = dataset_utils.encode_ragged(labels, classes)
     num_classes = len(classes) + 1
-    labels = dataset_utils.pad(labels, max_label_length)
     return images, labels, num_classes
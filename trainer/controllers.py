@@ -1,8 +1,8 @@
 import os
 import json
-import csv
 import shutil
 import multiprocessing
+import random
 import time
 import zipfile
 import requests
@@ -10,17 +10,23 @@ import requests
 from werkzeug.utils import secure_filename
 from flask import request
 from collections import OrderedDict
-from sklearn.model_selection import train_test_split
 
 from trainer import app
-from trainer.backend import GraphKeys, dataset_utils
-from trainer.backend.dataset_utils import read_dataset_list
+from trainer.backend import GraphKeys, dataset_utils, dataset_cache, dataset_archive, dataset_manifest
+from trainer.backend import dataset_split
+from trainer.backend import dataset_validation
+from trainer.backend import augmentation
+from trainer.backend import synthetic_data
 from trainer.backend.train_ocr import train_model
 from trainer.backend.train_ocr import evaluate_model
 from trainer.backend.train_ocr import continue_training_model
 from trainer.backend import create_serving_model
 from trainer.backend import visualize
 from trainer.backend import create_optimized_graph
+from trainer.backend import convert_to_tfrecords
+from trainer.backend import append_to_tfrecords
+from trainer.backend.tf import read_tfrecord_manifest
+from trainer.backend.dataset_utils import read_dataset_list
 
 
 def _allowed_labels_file(filename):
@@ -43,47 +49,147 @@ def _allowed_zip_file(filename):
 
 def upload_dataset(dataset_zip):
     dataset_name = get('dataset_name')
+    convert_to_tfrecord = _is_checked('convert_to_tfrecord')
+    desired_image_size = request.form.get('desired_image_size', '').strip()
+    if convert_to_tfrecord and not desired_image_size.isdigit():
+        return "A desired image size is needed to convert the dataset to TFRecords."
     if _allowed_zip_file(dataset_zip.filename):
         dataset_zip_path = _create_path(app.config['DATASET_DIRECTORY'], secure_filename(dataset_zip.filename))
         dataset_zip.save(dataset_zip_path)
         dataset_path = _create_path(app.config['DATASET_DIRECTORY'], dataset_name)
         os.makedirs(dataset_path)
-        _extract_zip_files(dataset_zip_path, dataset_path)
-        delete_file(dataset_zip_path)
+        if app.config['KEEP_DATASET_ARCHIVES']:
+            dataset_archive.add(dataset_zip_path, dataset_path)
+        else:
+            _extract_zip_files(dataset_zip_path, dataset_path)
+            delete_file(dataset_zip_path)
         split_dataset("labels.txt")
+        if convert_to_tfrecord:
+            _convert_to_tfrecord_task(dataset_name, dataset_path, int(desired_image_size))
+            return dataset_name + " has been uploaded. Converting it to TFRecords."
         return dataset_name + " has been uploaded."
     return "An error occurred in uploading the dataset."
 
 
-def _extract_zip_files(src, dest_dir):
-    zip_ref = zipfile.ZipFile(src, 'r')
-    zip_ref.extractall(dest_dir)
-    zip_ref.close()
+def _convert_to_tfrecord_task(dataset_name, dataset_path, desired_image_size):
+    classes = dataset_utils.get_characters_from(app.config['CHARSET_FILE'])
+    conversion_task = multiprocessing.Process(target=convert_to_tfrecords,
+                                              args=(dataset_path, classes, desired_image_size),
+                                              kwargs={
+                                                  'examples_per_shard': app.config['TFRECORD_EXAMPLES_PER_SHARD'],
+                                                  'num_workers': app.config['NUM_PREPROCESSING_WORKERS']
+                                              })
+    conversion_task.name = "convert-{}".format(dataset_name)
+    conversion_task.start()
+    return conversion_task
+
+
+def _extract_zip_files(src, dest_dir, labels_filename='labels.txt'):
+    with zipfile.ZipFile(src, 'r') as zip_ref:
+        for member in zip_ref.infolist():
+            if member.filename == 'labels.txt':
+                with open(_create_path(dest_dir, labels_filename), 'wb') as f:
+                    f.write(zip_ref.read(member))
+            else:
+                zip_ref.extract(member, dest_dir)
+
+
+def append_dataset(dataset_name, dataset_zip):
+    dataset_path = get_dataset(dataset_name)
+    if not os.path.isdir(dataset_path) or not _allowed_zip_file(dataset_zip.filename):
+        return "An error occurred in appending to the dataset."
+    dataset_zip_path = _create_path(app.config['DATASET_DIRECTORY'], secure_filename(dataset_zip.filename))
+    dataset_zip.save(dataset_zip_path)
+    if not dataset_archive.has_member(dataset_zip_path, 'labels.txt'):
+        delete_file(dataset_zip_path)
+        return "The appended archive has no labels.txt."
+    appended_labels_filename = app.config['APPENDED_LABELS_FILENAME']
+    if dataset_archive.is_archived(dataset_path):
+        dataset_archive.add(dataset_zip_path, dataset_path, {'labels.txt': appended_labels_filename})
+    else:
+        _extract_zip_files(dataset_zip_path, dataset_path, labels_filename=appended_labels_filename)
+        delete_file(dataset_zip_path)
+    split_examples = _append_to_splits(dataset_path, _create_path(dataset_path, appended_labels_filename))
+    classes = dataset_utils.get_characters_from(app.config['CHARSET_FILE'])
+    dataset_manifest.update(dataset_path, classes, split_examples)
+    num_appended = sum(len(labels) for _, labels in split_examples.values())
+    if read_tfrecord_manifest(dataset_path) is not None:
+        _append_to_tfrecord_task(dataset_name, dataset_path, split_examples)
+        return "{} examples have been appended to {}. Appending them to its TFRecords.".format(num_appended,
+                                                                                            dataset_name)
+    return "{} examples have been appended to {}.".format(num_appended, dataset_name)
+
+
+def _append_to_splits(dataset_path, appended_labels_path):
+    split_info = dataset_split.read_split_info(dataset_path) or {
+        'split_name': dataset_split.TEST_SPLIT,
+        'labels_file': 'labels.txt',
+        'test_size': float(get('test_size')),
+        'seed': app.config['DATASET_SPLIT_SEED'],
+        'num_train_examples': 0,
+        'num_test_examples': 0
+    }
+    split_paths = OrderedDict([('train', _create_path(dataset_path, 'train.csv')),
+                               ('test', _create_path(dataset_path, 'test.csv'))])
+    split_offsets = {split_name: os.path.getsize(path) if os.path.exists(path) else 0
+                     for split_name, path in split_paths.items()}
+    excluded = _validate_labels_file(dataset_path, appended_labels_path, append=True)
+    num_train, num_test = dataset_split.split_labels_file(appended_labels_path,
+                                                          split_paths['train'],
+                                                          split_paths['test'],
+                                                          split_info['test_size'], split_info['seed'],
+                                                          dataset_split.TEST_SPLIT,
+                                                          append=True,
+                                                          excluded=excluded)
+    _append_file(appended_labels_path, _create_path(dataset_path, split_info['labels_file']))
+    delete_file(appended_labels_path)
+    split_info['num_train_examples'] += num_train
+    split_info['num_test_examples'] += num_test
+    dataset_split.write_split_info(dataset_path, split_info)
+    return OrderedDict((split_name, read_dataset_list(path, start_offset=split_offsets[split_name]))
+                       for split_name, path in split_paths.items())
+
+
+def _append_file(src, dest):
+    with open(dest, 'ab+') as f_out:
+        if f_out.tell() > 0:
+            f_out.seek(-1, os.SEEK_END)
+            if f_out.read(1) != b'\n':
+                f_out.write(b'\n')
+        with open(src, 'rb') as f_in:
+            shutil.copyfileobj(f_in, f_out)
+
+
+def _append_to_tfrecord_task(dataset_name, dataset_path, split_examples):
+    append_task = multiprocessing.Process(target=append_to_tfrecords,
+                                          args=(dataset_path, split_examples),
+                                          kwargs={
+                                              'examples_per_shard': app.config['TFRECORD_EXAMPLES_PER_SHARD'],
+                                              'num_workers': app.config['NUM_PREPROCESSING_WORKERS']
+                                          })
+    append_task.name = "append-{}".format(dataset_name)
+    append_task.start()
+    return append_task
 
 
 def get_dataset(dataset_name):
     return _create_path(app.config['DATASET_DIRECTORY'], dataset_name)
 
 
-def _get_number_of_lines(filename):
-    counter = 0
-    with open(filename) as f:
-        for i, l in enumerate(f):
-            counter = i
-    return counter + 1
-
-
 def get_dataset_list_with_amount_of_training_and_testing_data():
     dataset_list = []
     dataset_names = get_directory_list_from_config('DATASET_DIRECTORY')
+    classes = dataset_utils.get_characters_from(app.config['CHARSET_FILE'])
     for dataset_name in dataset_names:
         dataset_dict = OrderedDict()
-        dataset_path = get_dataset(dataset_name)
-        number_training_samples = _get_number_of_lines(_create_path(dataset_path, 'train.csv'))
-        number_testing_samples = _get_number_of_lines(_create_path(dataset_path, 'test.csv'))
+        manifest = dataset_manifest.get(get_dataset(dataset_name), classes)
+        splits = manifest['splits']
         dataset_dict['name'] = dataset_name
-        dataset_dict['num_training_examples'] = number_training_samples
-        dataset_dict['num_testing_examples'] = number_testing_samples
+        dataset_dict['num_training_examples'] = splits.get('train', {}).get('num_examples', 0)
+        dataset_dict['num_testing_examples'] = splits.get('test', {}).get('num_examples', 0)
+        dataset_dict['charset_coverage'] = manifest['charset_coverage']['coverage']
+        validation_report = dataset_validation.read_report(get_dataset(dataset_name))
+        dataset_dict['num_excluded_examples'] = validation_report['num_excluded'] if validation_report else 0
         dataset_list.append(dataset_dict)
     return dataset_list
 
@@ -93,21 +199,35 @@ def get_directory_list_from_config(directory_key):
     return directory_names
 
 
-def _create_labels_file(filename, features, labels):
-    with open(filename, 'w') as f:
-        writer = csv.writer(f, lineterminator='\n', delimiter=' ')
-        writer.writerows(zip(features, labels))
-
-
 def split_dataset(labels_file):
     dataset_path = _create_path(app.config['DATASET_DIRECTORY'], get('dataset_name'))
-    features, labels = read_dataset_list(_create_path(dataset_path,
-                                                      secure_filename(labels_file)))
-    x_train, x_test, y_train, y_test = train_test_split(features,
-                                                        labels,
-                                                        test_size=float(get('test_size')))
-    _create_labels_file(_create_path(dataset_path, 'train.csv'), x_train, y_train)
-    _create_labels_file(_create_path(dataset_path, 'test.csv'), x_test, y_test)
+    labels_path = _create_path(dataset_path, secure_filename(labels_file))
+    test_size = float(get('test_size'))
+    seed = app.config['DATASET_SPLIT_SEED']
+    excluded = _validate_labels_file(dataset_path, labels_path)
+    num_train, num_test = dataset_split.split_labels_file(labels_path,
+                                                          _create_path(dataset_path, 'train.csv'),
+                                                          _create_path(dataset_path, 'test.csv'),
+                                                          test_size, seed, dataset_split.TEST_SPLIT,
+                                                          excluded=excluded)
+    dataset_split.write_split_info(dataset_path, {
+        'split_name': dataset_split.TEST_SPLIT,
+        'labels_file': os.path.basename(labels_path),
+        'test_size': test_size,
+        'seed': seed,
+        'num_train_examples': num_train,
+        'num_test_examples': num_test
+    })
+    dataset_manifest.create(dataset_path, dataset_utils.get_characters_from(app.config['CHARSET_FILE']))
+
+
+def _validate_labels_file(dataset_path, labels_path, append=False):
+    return dataset_validation.validate_dataset(dataset_path, labels_path,
+                                               dataset_utils.get_characters_from(app.config['CHARSET_FILE']),
+                                               dataset_path,
+                                               num_workers=app.config['NUM_PREPROCESSING_WORKERS'],
+                                               chunk_size=app.config['PREPROCESSING_CHUNK_SIZE'],
+                                               append=append)
 
 
 def _create_path(*args):
@@ -122,14 +242,29 @@ def _get_layer(layer_index):
     layer = OrderedDict()
     layer["layer_type"] = get(_create_network_key(layer_index, "layer_type"))
     layer_type = layer["layer_type"]
-    if layer_type == GraphKeys.LayerTypes.CONV2D.value:
+    if layer_type in (GraphKeys.LayerTypes.CONV2D.value, GraphKeys.LayerTypes.STRIDED_CONV2D.value):
         layer["num_filters"] = int(get(_create_network_key(layer_index, "num_filters")))
-        layer["kernel_size"] = int(get(_create_network_key(layer_index, "kernel_size1")))
-        if get(_create_network_key(layer_index, "kernel_size2")):
-            layer["kernel_size"] = [layer["kernel_size"], int(get(_create_network_key(layer_index, "kernel_size2")))]
+        layer["kernel_size"] = _get_kernel_size(layer_index)
         layer["stride"] = int(get(_create_network_key(layer_index, "stride")))
         layer["padding"] = get(_create_network_key(layer_index, "padding"))
         layer["activation"] = get(_create_network_key(layer_index, "activation"))
+    elif layer_type == GraphKeys.LayerTypes.SEPARABLE_CONV2D.value:
+        layer["num_filters"] = int(get(_create_network_key(layer_index, "num_filters")))
+        layer["kernel_size"] = _get_kernel_size(layer_index)
+        layer["depth_multiplier"] = int(get(_create_network_key(layer_index, "depth_multiplier")))
+        layer["padding"] = get(_create_network_key(layer_index, "padding"))
+        layer["activation"] = get(_create_network_key(layer_index, "activation"))
+    elif layer_type == GraphKeys.LayerTypes.BOTTLENECK_BLOCK.value:
+        layer["num_filters"] = int(get(_create_network_key(layer_index, "num_filters")))
+        layer["kernel_size"] = _get_kernel_size(layer_index)
+        if request.form.get(_create_network_key(layer_index, "bottleneck_filters")):
+            layer["bottleneck_filters"] = int(get(_create_network_key(layer_index, "bottleneck_filters")))
+        layer["activation"] = get(_create_network_key(layer_index, "activation"))
+    elif layer_type == GraphKeys.LayerTypes.TEMPORAL_CONV.value:
+        layer["num_filters"] = int(get(_create_network_key(layer_index, "num_filters")))
+        layer["kernel_size"] = int(get(_create_network_key(layer_index, "kernel_size1")))
+        layer["dilation_rate"] = int(get(_create_network_key(layer_index, "dilation_rate")))
+        layer["activation"] = get(_create_network_key(layer_index, "activation"))
     elif layer_type == GraphKeys.LayerTypes.MAX_POOL2D.value:
         layer["pool_size"] = int(get(_create_network_key(layer_index, "pool_size")))
         layer["stride"] = int(get(_create_network_key(layer_index, "stride")))
@@ -142,11 +277,20 @@ def _get_layer(layer_index):
         layer["num_hidden"] = int(get(_create_network_key(layer_index, "num_hidden")))
         layer["cell_type"] = get(_create_network_key(layer_index, "cell_type"))
         layer["activation"] = get(_create_network_key(layer_index, "activation"))
+        layer["implementation"] = request.form.get(_create_network_key(layer_index, "implementation")) or \
+            GraphKeys.MDRNNImplementations.SEQUENTIAL.value
     elif layer_type == GraphKeys.LayerTypes.DROPOUT.value:
         layer["keep_prob"] = float(get(_create_network_key(layer_index, "keep_prob")))
     return layer
 
 
+def _get_kernel_size(layer_index):
+    kernel_size = int(get(_create_network_key(layer_index, "kernel_size1")))
+    if get(_create_network_key(layer_index, "kernel_size2")):
+        kernel_size = [kernel_size, int(get(_create_network_key(layer_index, "kernel_size2")))]
+    return kernel_size
+
+
 def get_architecture_file_contents(architecture_name):
     architecture_path = get_architecture_path(architecture_name)
     return json.load(open(architecture_path), object_pairs_hook=OrderedDict)
@@ -210,6 +354,10 @@ def request_connection(url):
 
 def save_model_as_json():
     architecture_dict = _generate_architecture_dict()
+    for layer in architecture_dict['network']:
+        if layer.get("implementation") == GraphKeys.MDRNNImplementations.BATCHED.value and \
+                layer["cell_type"] != GraphKeys.CellTypes.LSTM.value:
+            return "The batched MDRNN implementation only supports LSTM cells."
     architecture_name = get('architecture_name')
     architecture_path = get_architecture_path(architecture_name)
     _write_json(architecture_path, architecture_dict)
@@ -237,6 +385,10 @@ def getlist(param):
     return request.form.getlist(param)
 
 
+def _is_checked(param):
+    return param in request.form
+
+
 def stop_running(task):
     for running_task in multiprocessing.active_children():
         if running_task.name == task:
@@ -264,6 +416,10 @@ def _export_serving_model(model_name, input_name="features", output_names="outpu
     image_config = OrderedDict()
     image_config['image_width'] = run_params['desired_image_size']
     image_config['image_height'] = run_params['desired_image_size']
+    if run_params.get('variable_width'):
+        image_config['image_width'] = None
+        image_config['preserve_aspect_ratio'] = True
+        image_config['max_image_width'] = run_params.get('max_image_width')
     input_node['input_name'] = input_name
     input_node['input_shape'] = input_shape
     serving_model_config['input_nodes'] = [input_node]
@@ -319,8 +475,22 @@ def _retrain_task(model_name):
     return continue_training_task
 
 
+def _evict_dataset_caches():
+    dataset_cache.evict(app.config['DATASET_DIRECTORY'],
+                        max_size=app.config['DATASET_CACHE_MAX_SIZE'],
+                        max_age=app.config['DATASET_CACHE_MAX_AGE'])
+
+
 def run_learning_task(task):
+    _evict_dataset_caches()
     if task == 'training':
+        form_error = _get_decoder_form_error(get('architecture_name'))
+        if form_error:
+            return form_error
+        try:
+            input_options = _get_input_options()
+        except ValueError as e:
+            return str(e)
         dataset_name = get('dataset_name')
         model_name = "model-" + time.strftime("%Y%m%d-%H%M%S")
         checkpoint_dir = get_model_path(model_name)
@@ -331,12 +501,15 @@ def run_learning_task(task):
                                    int(get('num_epochs')),
                                    int(get('checkpoint_epochs')),
                                    int(get('batch_size')),
-                                   'charsets/chars.txt',
+                                   app.config['CHARSET_FILE'],
                                    float(get('learning_rate')),
                                    get('optimizer'),
                                    getlist('metrics'),
                                    get('loss'),
-                                   get('validation_size'))
+                                   get('validation_size'),
+                                   get('input_pipeline'),
+                                   input_options,
+                                   _get_decoder_options())
         _set_running_task_name(running_task, task, model_name)
     elif task == 'testing':
         running_task = _test_task(get('model_name'))
@@ -344,6 +517,143 @@ def run_learning_task(task):
     elif task == 'retrain':
         running_task = _retrain_task(get('model_name'))
         _set_running_task_name(running_task, task, get('model_name'))
+    return task + " has started."
+
+
+def _get_input_options():
+    input_options = OrderedDict()
+    input_options['variable_width'] = _is_checked('variable_width')
+    if input_options['variable_width']:
+        if get('input_pipeline') != GraphKeys.InputPipelines.STREAMING.value:
+            raise ValueError("Preserving the aspect ratio is only supported by the streaming input pipeline.")
+        if request.form.get('max_image_width'):
+            input_options['max_image_width'] = int(get('max_image_width'))
+        if request.form.get('width_bucket_boundaries'):
+            input_options['width_bucket_boundaries'] = _parse_int_list(get('width_bucket_boundaries'))
+    if request.form.get('bucket_by'):
+        input_options['bucket_by'] = get('bucket_by')
+    if request.form.get('label_bucket_boundaries'):
+        input_options['label_bucket_boundaries'] = _parse_int_list(get('label_bucket_boundaries'))
+    augmentation_options = _get_augmentation_options()
+    if augmentation_options['probabilities']:
+        input_options['augmentation'] = augmentation_options
+    if request.form.get('synthetic_corpus') and request.form.get('synthetic_ratio'):
+        input_options['synthetic'] = _get_synthetic_options()
+    datasets = _get_dataset_mix(get('dataset_name'))
+    if len(datasets) > 1:
+        input_options['datasets'] = datasets
+    return input_options
+
+
+def _get_dataset_mix(dataset_name):
+    dataset_names = [dataset_name] + sorted(name for name in get_directory_list_from_config('DATASET_DIRECTORY')
+                                            if name != dataset_name)
+    datasets = []
+    for name in dataset_names:
+        weight = request.form.get('dataset_weight_' + name)
+        weight = float(weight) if weight else (1.0 if name == dataset_name else 0.0)
+        if weight > 0:
+            datasets.append(OrderedDict([('name', name), ('dataset_dir', get_dataset(name)), ('weight', weight)]))
+    if not datasets or datasets[0]['name'] != dataset_name:
+        raise ValueError("The selected dataset needs a positive sampling weight.")
+    classes = dataset_utils.get_characters_from(app.config['CHARSET_FILE'])
+    for dataset in datasets:
+        _check_mixed_dataset(dataset['name'], dataset['dataset_dir'], classes)
+    return datasets
+
+
+def _check_mixed_dataset(dataset_name, dataset_dir, classes):
+    if not os.path.exists(_create_path(dataset_dir, "train.csv")):
+        raise ValueError(dataset_name + " has no training split.")
+    if app.config['PREFLIGHT_VALIDATION']:
+        return
+    unknown_characters = set(dataset_manifest.get(dataset_dir, classes)['character_counts']) - set(classes)
+    if unknown_characters:
+        raise ValueError(dataset_name + " has labels with characters outside the charset: " +
+                         ''.join(sorted(unknown_characters)))
+
+
+def _get_decoder_form_error(architecture_name):
+    output_layers = [request.form.get('output_layer') or
+                     get_architecture_file_contents(architecture_name).get('output_layer'),
+                     request.form.get('train_output_layer')]
+    if GraphKeys.OutputLayers.CTC_CONSTRAINED_DECODER.value in output_layers and \
+            not (request.form.get('decoder_lexicon') or request.form.get('decoder_corpus')):
+        return "The constrained decoder needs a decoder lexicon or a language model corpus."
+    return None
+
+
+def _get_decoder_options():
+    decoder_options = OrderedDict()
+    decoder_options['train_output_layer'] = request.form.get('train_output_layer') or \
+        GraphKeys.OutputLayers.CTC_GREEDY_DECODER.value
+    if request.form.get('beam_width'):
+        decoder_options['beam_width'] = int(get('beam_width'))
+    if request.form.get('metrics_every_n_steps'):
+        decoder_options['metrics_every_n_steps'] = int(get('metrics_every_n_steps'))
+    if request.form.get('output_layer'):
+        decoder_options['output_layer'] = get('output_layer')
+    if request.form.get('decoder_lexicon') or request.form.get('decoder_corpus'):
+        decoder_options['constrained_decoder'] = _get_constrained_decoder_options()
+    return decoder_options
+
+
+def _get_constrained_decoder_options():
+    constrained_decoder = OrderedDict()
+    for key, form_key in [('lexicon_file', 'decoder_lexicon'), ('corpus_file', 'decoder_corpus')]:
+        if request.form.get(form_key):
+            constrained_decoder[key] = os.path.abspath(
+                _create_path(app.config['DECODER_LEXICON_DIRECTORY'], secure_filename(get(form_key))))
+    if request.form.get('lm_order'):
+        constrained_decoder['lm_order'] = int(get('lm_order'))
+    if request.form.get('lm_weight'):
+        constrained_decoder['lm_weight'] = float(get('lm_weight'))
+    if request.form.get('insertion_bonus'):
+        constrained_decoder['insertion_bonus'] = float(get('insertion_bonus'))
+    if request.form.get('constrained_beam_width'):
+        constrained_decoder['beam_width'] = int(get('constrained_beam_width'))
+    return constrained_decoder
+
+
+def _get_synthetic_options():
+    corpus_file = _create_path(app.config['SYNTHETIC_CORPUS_DIRECTORY'], secure_filename(get('synthetic_corpus')))
+    if not os.path.isfile(corpus_file):
+        raise ValueError("The synthetic corpus " + get('synthetic_corpus') + " does not exist.")
+    synthetic_data.read_corpus(corpus_file, dataset_utils.get_characters_from(app.config['CHARSET_FILE']))
+    seed = request.form.get('synthetic_seed')
+    seed = int(seed) if seed else random.randint(0, 2 ** 31 - 1)
+    return synthetic_data.get_synthetic_params(corpus_file,
+                                               app.config['SYNTHETIC_FONTS_DIRECTORY'],
+                                               float(get('synthetic_ratio')),
+                                               seed)
+
+
+def get_synthetic_corpus_list():
+    if not os.path.isdir(app.config['SYNTHETIC_CORPUS_DIRECTORY']):
+        return []
+    return sorted(get_directory_list_from_config('SYNTHETIC_CORPUS_DIRECTORY'))
+
+
+def get_decoder_lexicon_list():
+    if not os.path.isdir(app.config['DECODER_LEXICON_DIRECTORY']):
+        return []
+    return sorted(name for name in get_directory_list_from_config('DECODER_LEXICON_DIRECTORY')
+                  if not name.startswith('.'))
+
+
+def _get_augmentation_options():
+    probabilities = OrderedDict()
+    for augmentation_name in get_enum_values(GraphKeys.Augmentations):
+        probability = request.form.get('augmentation_' + augmentation_name)
+        if probability:
+            probabilities[augmentation_name] = float(probability)
+    seed = request.form.get('augmentation_seed')
+    seed = int(seed) if seed else random.randint(0, 2 ** 31 - 1)
+    return augmentation.get_augmentation_params(probabilities, seed)
+
+
+def _parse_int_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
 
 
 def _set_running_task_name(running_task, task, checkpoint_dir):
@@ -362,7 +672,10 @@ def _train_task(architecture_name,
                 optimizer,
                 metrics,
                 loss,
-                validation_size):
+                validation_size,
+                input_pipeline,
+                input_options,
+                decoder_options):
     if validation_size:
         validation_size = float(validation_size)
     dataset_dir = get_dataset(dataset_name)
@@ -381,6 +694,14 @@ def _train_task(architecture_name,
     run_params['num_epochs'] = num_epochs
     run_params['learning_rate'] = learning_rate
     run_params['optimizer'] = optimizer
+    run_params['input_pipeline'] = input_pipeline
+    run_params['split_seed'] = app.config['DATASET_SPLIT_SEED']
+    run_params.update(input_options)
+    run_params.update(decoder_options)
+    run_params['num_preprocessing_workers'] = app.config['NUM_PREPROCESSING_WORKERS']
+    run_params['preprocessing_chunk_size'] = app.config['PREPROCESSING_CHUNK_SIZE']
+    run_params['num_synthetic_workers'] = app.config['NUM_SYNTHETIC_WORKERS']
+    run_params['preflight_validation'] = app.config['PREFLIGHT_VALIDATION']
     run_config_path = _create_path(checkpoint_dir, 'run_config.json')
     _write_json(run_config_path, run_params)
     task = multiprocessing.Process(target=train_model,
@@ -4,7 +4,7 @@ $(document).ready(function () {
     $('select').material_select();
 });
 
-function create_dynamic_layer_builder(layer_types, padding_types, cell_types, activation_functions){
+function create_dynamic_layer_builder(layer_types, padding_types, cell_types, activation_functions, mdrnn_implementations){
     function populate(selector, values) {
         $.each(values, function(index, value){
             $(selector).append($('<option>', {"value": value}).text(value))
@@ -40,6 +40,30 @@ function create_dynamic_layer_builder(layer_types, padding_types, cell_types, ac
                 "Activation": create_selector(create_network_layer_param("activation", layer_index), "Select activation", activation_functions)}
     };
 
+    var separable_conv2d_params = function(layer_index) {
+        return {"Num Filters": create_int_input_field(create_network_layer_param("num_filters", layer_index)),
+                "Kernel Size 1": create_int_input_field(create_network_layer_param("kernel_size1", layer_index)),
+                "Kernel Size 2": create_int_input_field(create_network_layer_param("kernel_size2", layer_index)).prop('required', false),
+                "Depth Multiplier": create_int_input_field(create_network_layer_param("depth_multiplier", layer_index)),
+                "Padding": create_selector(create_network_layer_param("padding", layer_index), "Select padding", padding_types),
+                "Activation": create_selector(create_network_layer_param("activation", layer_index), "Select activation", activation_functions)}
+    };
+
+    var bottleneck_block_params = function(layer_index) {
+        return {"Num Filters": create_int_input_field(create_network_layer_param("num_filters", layer_index)),
+                "Bottleneck Filters": create_int_input_field(create_network_layer_param("bottleneck_filters", layer_index)).prop('required', false),
+                "Kernel Size 1": create_int_input_field(create_network_layer_param("kernel_size1", layer_index)),
+                "Kernel Size 2": create_int_input_field(create_network_layer_param("kernel_size2", layer_index)).prop('required', false),
+                "Activation": create_selector(create_network_layer_param("activation", layer_index), "Select activation", activation_functions)}
+    };
+
+    var temporal_conv_params = function(layer_index) {
+        return {"Num Filters": create_int_input_field(create_network_layer_param("num_filters", layer_index)),
+                "Kernel Size": create_int_input_field(create_network_layer_param("kernel_size1", layer_index)),
+                "Dilation Rate": create_int_input_field(create_network_layer_param("dilation_rate", layer_index)),
+                "Activation": create_selector(create_network_layer_param("activation", layer_index), "Select activation", activation_functions)}
+    };
+
     var maxpool2d_params = function(layer_index) {
         return {"Pool size": create_int_input_field(create_network_layer_param("pool_size", layer_index)),
                 "Stride": create_int_input_field(create_network_layer_param("stride", layer_index)),
@@ -49,7 +73,8 @@ function create_dynamic_layer_builder(layer_types, padding_types, cell_types, ac
     var mdrnn_params = function(layer_index) {
         return {"Num Hidden": create_int_input_field(create_network_layer_param("num_hidden", layer_index)),
                 "Cell Type": create_selector(create_network_layer_param("cell_type", layer_index), "Select cell type", cell_types),
-                "Activation": create_selector(create_network_layer_param("activation", layer_index), "Select activation", activation_functions)}
+                "Activation": create_selector(create_network_layer_param("activation", layer_index), "Select activation", activation_functions),
+                "Implementation": create_selector(create_network_layer_param("implementation", layer_index), "Select implementation", mdrnn_implementations).prop('required', false)}
     };
 
     var birnn_params = function(layer_index) {
@@ -72,7 +97,11 @@ function create_dynamic_layer_builder(layer_types, padding_types, cell_types, ac
         "l2_normalize": function(layer_index){},
         "dropout": dropout_params,
         "collapse_to_rnn_dims": function(layer_index){},
-        "batch_norm": function(layer_index){}
+        "batch_norm": function(layer_index){},
+        "separable_conv2d": separable_conv2d_params,
+        "bottleneck_block": bottleneck_block_params,
+        "strided_conv2d": conv2d_params,
+        "temporal_conv": temporal_conv_params
     };
 
     $('#add-layer').click(function () {
@@ -2,6 +2,7 @@ from flask import request, render_template, flash, redirect, url_for, send_from_
 
 from trainer import app
 from trainer.backend import GraphKeys
+from trainer.controllers import append_dataset
 from trainer.controllers import package_model_files
 from trainer.controllers import delete_file
 from trainer.controllers import delete_folder
@@ -14,6 +15,8 @@ from trainer.controllers import get_enum_values
 from trainer.controllers import get_model_path
 from trainer.controllers import get_running_tasks
 from trainer.controllers import get_log
+from trainer.controllers import get_synthetic_corpus_list
+from trainer.controllers import get_decoder_lexicon_list
 from trainer.controllers import request_connection
 from trainer.controllers import run_learning_task
 from trainer.controllers import save_model_as_json
@@ -62,6 +65,7 @@ def create_network_architecture():
                            layer_types=get_enum_values(GraphKeys.LayerTypes),
                            padding_types=get_enum_values(GraphKeys.PaddingTypes),
                            cell_types=get_enum_values(GraphKeys.CellTypes),
+                           mdrnn_implementations=get_enum_values(GraphKeys.MDRNNImplementations),
                            activation_functions=get_enum_values(GraphKeys.ActivationFunctions),
                            output_layers=get_enum_values(GraphKeys.OutputLayers))
 
@@ -96,6 +100,17 @@ def dataset():
 def _get_dataset_list_and_details():
     return get_dataset_list_with_amount_of_training_and_testing_data()
 
+
+@app.route('/append_dataset/<dataset_name>', methods=['GET', 'POST'])
+def append_to_dataset(dataset_name):
+    if request.method == 'POST':
+        if 'dataset_zip' not in request.files or not request.files['dataset_zip']:
+            flash('No dataset zip file selected')
+            return redirect(request.url)
+        flash(append_dataset(dataset_name, request.files['dataset_zip']))
+        return redirect(url_for('dataset'))
+    return render_template("append_dataset_form.html", dataset_name=dataset_name)
+
 @app.route('/delete_dataset/<dataset_name>', methods=['POST'])
 def delete_dataset(dataset_name):
     delete_folder(get_dataset(dataset_name))
@@ -111,11 +126,17 @@ def _get_dataset_list():
 @app.route('/train')
 def train():
     return render_template("train.html",
-                           dataset_list=_get_dataset_list(),
+                           dataset_list=_get_dataset_list_and_details(),
                            network_architectures=_get_network_architectures(),
                            losses=get_enum_values(GraphKeys.Losses),
                            optimizers=get_enum_values(GraphKeys.Optimizers),
-                           metrics=get_enum_values(GraphKeys.Metrics))
+                           metrics=get_enum_values(GraphKeys.Metrics),
+                           input_pipelines=get_enum_values(GraphKeys.InputPipelines),
+                           batch_buckets=get_enum_values(GraphKeys.BatchBuckets),
+                           augmentations=get_enum_values(GraphKeys.Augmentations),
+                           synthetic_corpora=get_synthetic_corpus_list(),
+                           decoder_lexicons=get_decoder_lexicon_list(),
+                           output_layers=get_enum_values(GraphKeys.OutputLayers))
 
 
 @app.route('/retrain/<model_name>')
@@ -127,8 +148,7 @@ def retrain(model_name):
 @app.route('/tasks/<task>', methods=['GET', 'POST'])
 def tasks(task):
     if request.method == 'POST':
-        run_learning_task(task)
-        flash(task + " has started.")
+        flash(run_learning_task(task))
     running_tasks = get_running_tasks()
     return render_template('tasks.html', running_tasks=running_tasks)
 